@@ -1,8 +1,19 @@
+import asyncio
+import cProfile
+import functools
+import hashlib
 import json
 import math
 import os
+import queue
 import random
+import threading
+import time
+import tracemalloc
 import typing as t
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
 import click
@@ -11,6 +22,10 @@ import pandas as pd
 from PIL import Image
 
 DATE_FORMAT = "%Y%m%d-%H%M%S"
+RLE_MAGIC = "KNITRLE"
+RLE_VERSION = 1
+OUTPUT_FORMATS = {"bmp": ".bmp", "rle": ".rle"}
+MASK_RESAMPLING = ("nearest", "bilinear")
 
 
 class UnimplementedInputFileFormat(Exception):
@@ -58,6 +73,7 @@ def extract_pattern_data(filepath: str) -> t.Tuple[t.List[np.ndarray], t.List[st
     extraction_map = {
         ".txt": extract_pattern_data_from_text,
         ".xlsx": extract_pattern_data_from_excel,
+        ".rle": extract_pattern_data_from_rle,
     }
     extension = get_extension_from_path(filepath)
     try:
@@ -96,6 +112,12 @@ def extract_pattern_data_from_excel(
     return str_ops_matrices, names
 
 
+def extract_pattern_data_from_rle(
+    filepath: str,
+) -> t.Tuple[t.List[np.ndarray], t.List[str]]:
+    return [RLEPattern.load(filepath).decode()], [get_filename_from_path(filepath)]
+
+
 def get_2d_matrix_size_x(matrix: np.ndarray) -> int:
     return len(matrix[0])
 
@@ -136,11 +158,245 @@ def generate_image(
     return Image.fromarray(np.array(rgb_ops_matrix).astype("uint8"))
 
 
+def render_sheet(
+    operations_map: t.Dict[str, t.List[float]],
+    str_ops_matrix: np.ndarray,
+    image_width: int,
+    image_height: int,
+    output_format: str = "bmp",
+) -> t.Union[Image.Image, "RLEPattern"]:
+    if output_format == "rle":
+        return validate_rle_pattern(
+            operations_map,
+            tessellate_rle_pattern(str_ops_matrix, image_width, image_height),
+        )
+    total_str_ops_matrix = tessellate_with_unit(
+        str_ops_matrix, image_width, image_height
+    )
+    return generate_image(operations_map, total_str_ops_matrix)
+
+
+def render_pattern(
+    operations_map: t.Dict[str, t.List[float]],
+    str_ops_matrix: t.List[t.List[str]],
+    output_format: str = "bmp",
+) -> t.Union[Image.Image, "RLEPattern"]:
+    if output_format == "rle":
+        return validate_rle_pattern(operations_map, encode_rle_pattern(str_ops_matrix))
+    return generate_image(operations_map, str_ops_matrix)
+
+
+def get_run_lengths(values: np.ndarray) -> t.List[t.Tuple[int, int]]:
+    """Runs of equal values as (count, value) pairs"""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return []
+    starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    counts = np.diff(np.append(starts, len(values)))
+    return list(zip(counts.tolist(), values[starts].tolist()))
+
+
+def expand_run_lengths(runs: t.Sequence[t.Tuple[int, int]]) -> np.ndarray:
+    if not runs:
+        return np.zeros(0, dtype=int)
+    counts, values = zip(*runs)
+    return np.repeat(np.array(values, dtype=int), counts)
+
+
+class RLEPattern:
+    """Knit operations matrix as run-length encoded rows.
+
+    Every distinct row is stored once, as (count, code) runs of indices into
+    ``operations``. ``order`` holds the (count, row) runs of the machine bed
+    rows from first to last, so a tessellated pattern stores each unit row
+    once and its rows as a repeating sequence of indices."""
+
+    def __init__(
+        self,
+        operations: t.List[str],
+        width: int,
+        rows: t.List[t.List[t.Tuple[int, int]]],
+        order: t.List[t.Tuple[int, int]],
+    ):
+        self.operations = operations
+        self.width = width
+        self.rows = rows
+        self.order = order
+
+    @property
+    def height(self) -> int:
+        return sum(count for count, _ in self.order)
+
+    def decode(self) -> np.ndarray:
+        code_rows = np.array(
+            [expand_run_lengths(row) for row in self.rows], dtype=int
+        ).reshape(len(self.rows), self.width)
+        operations = np.array(self.operations, dtype=str)
+        return operations[code_rows[expand_run_lengths(self.order)]]
+
+    def save(self, filepath: str) -> None:
+        def runs(values: t.Sequence[t.Tuple[int, int]]) -> str:
+            return " ".join(f"{count}:{value}" for count, value in values)
+
+        with open(filepath, "w") as file:
+            file.write(f"{RLE_MAGIC} {RLE_VERSION}\n")
+            file.write(f"size {self.width} {self.height}\n")
+            file.write(f"operations {' '.join(self.operations)}\n")
+            file.writelines(f"row {runs(row)}\n" for row in self.rows)
+            file.write(f"order {runs(self.order)}\n")
+
+    @classmethod
+    def load(cls, filepath: str) -> "RLEPattern":
+        def runs(tokens: t.List[str]) -> t.List[t.Tuple[int, int]]:
+            return [
+                (int(count), int(value))
+                for count, value in (token.split(":") for token in tokens)
+            ]
+
+        with open(filepath, "r") as file:
+            if file.readline().split() != [RLE_MAGIC, str(RLE_VERSION)]:
+                raise InvalidPattern
+            width = height = 0
+            operations: t.List[str] = []
+            rows: t.List[t.List[t.Tuple[int, int]]] = []
+            order: t.List[t.Tuple[int, int]] = []
+            for line in file:
+                if not line.strip():
+                    continue
+                key, *tokens = line.split()
+                if key == "size":
+                    width, height = int(tokens[0]), int(tokens[1])
+                elif key == "operations":
+                    operations = tokens
+                elif key == "row":
+                    rows.append(runs(tokens))
+                elif key == "order":
+                    order = runs(tokens)
+        pattern = cls(operations, width, rows, order)
+        if pattern.height != height or any(
+            sum(count for count, _ in row) != width for row in rows
+        ):
+            raise InvalidPattern
+        return pattern
+
+
+def encode_rle_pattern(str_ops_matrix: t.Sequence[t.Sequence[str]]) -> RLEPattern:
+    """Encodes an operations matrix, with its distinct rows in order of first use"""
+    ops_matrix = np.asarray(str_ops_matrix).astype(str)
+    operations, codes = np.unique(ops_matrix, return_inverse=True)
+    codes = codes.reshape(ops_matrix.shape)
+    unique_rows, first, inverse = np.unique(
+        codes, axis=0, return_index=True, return_inverse=True
+    )
+    appearance = np.argsort(first)
+    rank = np.empty_like(appearance)
+    rank[appearance] = np.arange(len(appearance))
+    return RLEPattern(
+        operations.tolist(),
+        ops_matrix.shape[1],
+        [get_run_lengths(unique_rows[i]) for i in appearance],
+        get_run_lengths(rank[inverse.reshape(-1)]),
+    )
+
+
+def tessellate_rle_pattern(
+    unit: np.ndarray, image_width: int, image_height: int
+) -> RLEPattern:
+    """Encodes ``tessellate_with_unit(unit, image_width, image_height)`` from the
+    unit rows alone, without building the full matrix"""
+    multiplier_x = image_width // get_2d_matrix_size_x(unit)
+    multiplier_y = image_height // get_2d_matrix_size_y(unit)
+    rows = np.tile(unit, (1, multiplier_x))[
+        : min(image_height, get_2d_matrix_size_y(unit)), :image_width
+    ]
+    pattern = encode_rle_pattern(rows)
+    height = min(image_height, multiplier_y * len(unit))
+    pattern.order = get_run_lengths(
+        np.resize(expand_run_lengths(pattern.order), height)
+    )
+    return pattern
+
+
+def validate_rle_pattern(
+    operations_map: t.Dict[str, t.List[float]], pattern: RLEPattern
+) -> RLEPattern:
+    """Raises the errors of ``generate_image`` for operations without a color"""
+    for op in pattern.operations:
+        if op not in operations_map:
+            if op == "nan":
+                raise EmptyCellFound
+            raise UnknownKnitOperation(op=op)
+    return pattern
+
+
+def get_number_of_jobs(jobs: int) -> int:
+    if jobs < 1:
+        return os.cpu_count() or 1
+    return jobs
+
+
+class ImageWriter:
+    """Saves images on a background thread, so that encoding and disk writes
+    overlap with the rendering of the next images"""
+
+    def __init__(self, maxsize: int = 4):
+        self._queue: "queue.Queue[t.Optional[t.Tuple[Image.Image, str]]]" = (
+            queue.Queue(maxsize)
+        )
+        self._error: t.Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> "ImageWriter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        if exc_type is None and self._error is not None:
+            raise self._error
+
+    def save(self, image: Image.Image, out_path: str) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put((image, out_path))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue
+            image, out_path = item
+            try:
+                image.save(out_path)
+            except BaseException as exc:
+                self._error = exc
+
+
 def extract_rgb_matrix(filepath: str) -> np.ndarray:
     img = Image.open(filepath)
     return np.asarray(img)
 
 
+def extract_pattern_matrix(filepath: str) -> np.ndarray:
+    """RGB matrix of an image, or the operations matrix of an RLE pattern"""
+    if get_extension_from_path(filepath) == OUTPUT_FORMATS["rle"]:
+        return RLEPattern.load(filepath).decode()
+    return extract_rgb_matrix(filepath)
+
+
+def get_str_ops_matrix(
+    operations_map: t.Dict[str, t.List[float]], pattern_matrix: np.ndarray
+) -> t.List[t.List[str]]:
+    if pattern_matrix.dtype.kind == "U":
+        return pattern_matrix.tolist()
+    return get_str_ops_matrix_from_color_table(
+        get_color_table(operations_map), pattern_matrix
+    )
+
+
 def get_operation_from_rgb(
     operations_map: t.Dict[str, t.List[float]], color: t.List[float]
 ) -> str:
@@ -319,34 +575,113 @@ def process_ops_matrix_with_mask(
     map_hsv_matrix: t.List[t.List[t.Tuple[float, float, float]]],
     source_key: str,
     target_key: str,
+    seed: t.Optional[int] = None,
 ) -> t.List[t.List[str]]:
-    density_sets = set([val for row in map_hsv_matrix for _, _, val in row])
-    source_locations = [
-        (j, i)
-        for i, row in enumerate(str_ops_matrix)
-        for j, item in enumerate(row)
-        if item == source_key
-    ]
+    density_matrix = np.array(
+        [[val for _, _, val in row] for row in map_hsv_matrix], dtype=float
+    )
+    return process_ops_matrix_with_density(
+        str_ops_matrix, density_matrix, source_key, target_key, seed
+    )
 
-    def get_replacement_locations_for_density(
-        density: float,
-    ) -> t.List[t.Tuple[int, int]]:
-        candidates = [
-            xy for xy in source_locations if map_hsv_matrix[xy[1]][xy[0]][2] == density
-        ]
-        replacement_amount = math.floor((density / 100) * len(candidates))
-        return random.sample(candidates, replacement_amount)
 
-    replacements = [
-        loc
-        for density in density_sets
-        for loc in get_replacement_locations_for_density(density)
-    ]
-    for y, x in replacements:
-        str_ops_matrix[x][y] = target_key
+def process_ops_matrix_with_density(
+    str_ops_matrix: t.List[t.List[str]],
+    density_matrix: np.ndarray,
+    source_key: str,
+    target_key: str,
+    seed: t.Optional[int] = None,
+) -> t.List[t.List[str]]:
+    """Replaces floor(density / 100) of the source operations of every density
+    level with the target operation, picked at random.
+
+    Without a ``seed`` the generator is seeded from ``random``, which forked
+    workers reseed and ``random.seed`` makes reproducible"""
+    rows, columns = np.nonzero(np.asarray(str_ops_matrix) == source_key)
+    if len(rows) == 0:
+        return str_ops_matrix
+    densities, inverse, counts = np.unique(
+        density_matrix[rows, columns], return_inverse=True, return_counts=True
+    )
+    amounts = np.floor((densities / 100) * counts).astype(int)
+    # Shuffles the locations within each density level, then takes the first ones
+    rng = np.random.default_rng(random.getrandbits(64) if seed is None else seed)
+    order = np.lexsort((rng.random(len(rows)), inverse))
+    rank = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    replacements = order[rank < np.repeat(amounts, counts)]
+    for y, x in zip(rows[replacements].tolist(), columns[replacements].tolist()):
+        str_ops_matrix[y][x] = target_key
     return str_ops_matrix
 
 
+def extract_mask_density(filepath: str) -> np.ndarray:
+    """HSV value (0 to 100) of every pixel of a mask image of any color mode"""
+    rgb_matrix = np.asarray(Image.open(filepath).convert("RGB"))
+    return (rgb_matrix.max(axis=-1) / 255.0) * 100
+
+
+def resample_density_matrix(
+    density_matrix: np.ndarray, width: int, height: int, method: str = "nearest"
+) -> np.ndarray:
+    """Resamples a mask to the pattern grid, aligning the pixel centers.
+
+    Bilinear values are rounded to the 256 levels of the mask image, so the
+    number of density levels stays bounded."""
+    source_height, source_width = density_matrix.shape
+    if (source_width, source_height) == (width, height):
+        return density_matrix
+    ys = (np.arange(height) + 0.5) * (source_height / height) - 0.5
+    xs = (np.arange(width) + 0.5) * (source_width / width) - 0.5
+    if method == "nearest":
+        rows = np.clip(np.floor(ys + 0.5).astype(int), 0, source_height - 1)
+        columns = np.clip(np.floor(xs + 0.5).astype(int), 0, source_width - 1)
+        return density_matrix[rows[:, None], columns]
+    if method != "bilinear":
+        raise ValueError(f"Unknown resampling method: {method}")
+    y0 = np.clip(np.floor(ys).astype(int), 0, source_height - 1)
+    x0 = np.clip(np.floor(xs).astype(int), 0, source_width - 1)
+    y1 = np.minimum(y0 + 1, source_height - 1)
+    x1 = np.minimum(x0 + 1, source_width - 1)
+    wy = np.clip(ys - y0, 0.0, 1.0)[:, None]
+    wx = np.clip(xs - x0, 0.0, 1.0)
+    top = density_matrix[y0][:, x0] * (1 - wx) + density_matrix[y0][:, x1] * wx
+    bottom = density_matrix[y1][:, x0] * (1 - wx) + density_matrix[y1][:, x1] * wx
+    values = top * (1 - wy) + bottom * wy
+    return (np.round(values / 100 * 255) / 255.0) * 100
+
+
+def get_mask_hash(density_matrix: np.ndarray) -> str:
+    digest = hashlib.sha1(str(density_matrix.shape).encode())
+    digest.update(np.ascontiguousarray(density_matrix).tobytes())
+    return digest.hexdigest()
+
+
+def get_density_key(
+    mask_hash: str, width: int, height: int, method: str
+) -> t.Tuple[t.Hashable, ...]:
+    return ("density", mask_hash, width, height, method)
+
+
+def get_resampled_density_matrix(
+    cache: "LRUCache",
+    density_matrix: np.ndarray,
+    width: int,
+    height: int,
+    method: str = "nearest",
+    mask_hash: t.Optional[str] = None,
+) -> np.ndarray:
+    """Resampled mask, cached by mask hash, target size and method"""
+    key = get_density_key(
+        mask_hash or get_mask_hash(density_matrix), width, height, method
+    )
+    try:
+        return cache.get(key)
+    except KeyError:
+        value = resample_density_matrix(density_matrix, width, height, method)
+        cache.put(key, value)
+        return value
+
+
 def get_str_ops_matrix_from_rgb(
     operations_map: t.Dict[str, t.List[float]], rgb_matrix: np.ndarray
 ) -> t.List[t.List[str]]:
@@ -356,9 +691,525 @@ def get_str_ops_matrix_from_rgb(
     ]
 
 
+def get_pixel_count(matrix: t.Sequence[t.Sized]) -> int:
+    return get_2d_matrix_size_x(matrix) * get_2d_matrix_size_y(matrix)
+
+
+def get_color_table(
+    operations_map: t.Dict[str, t.List[float]]
+) -> t.Dict[t.Tuple[float, ...], str]:
+    """Maps each color to its operation, the first one like get_operation_from_rgb"""
+    color_table: t.Dict[t.Tuple[float, ...], str] = {}
+    for name, color in operations_map.items():
+        color_table.setdefault(tuple(color), name)
+    return color_table
+
+
+def get_str_ops_matrix_from_color_table(
+    color_table: t.Dict[t.Tuple[float, ...], str], rgb_matrix: np.ndarray
+) -> t.List[t.List[str]]:
+    try:
+        return [
+            [color_table[color] for color in map(tuple, row.tolist())]
+            for row in rgb_matrix
+        ]
+    except KeyError as exc:
+        raise UnknownColor(list(exc.args[0]))
+
+
+class Profiler:
+    """Records wall time, pixel throughput and optionally peak memory per
+    command stage.
+
+    Tracing memory allocations slows Python code down several times, so it is
+    only enabled with ``trace_memory``, and the wall times of such a run should
+    not be used for throughput. A disabled profiler records nothing, so
+    commands can mark their stages unconditionally."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        output_dir: str = "profiles",
+        use_cprofile: bool = False,
+        trace_memory: bool = False,
+    ):
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.use_cprofile = use_cprofile
+        self.trace_memory = trace_memory
+        self.report: t.Dict[str, t.Any] = {}
+
+    @contextmanager
+    def stage(self, name: str, pixels: int = 0) -> t.Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            peak_memory = None
+            if self.trace_memory:
+                _, peak_memory = tracemalloc.get_traced_memory()
+            self.report["stages"].append(
+                {
+                    "name": name,
+                    "wall_time_s": wall_time,
+                    "peak_memory_bytes": peak_memory,
+                    "pixels": pixels,
+                    "pixels_per_second": pixels / wall_time if wall_time else None,
+                }
+            )
+
+    @contextmanager
+    def command(self, command_path: str) -> t.Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        self.report = {
+            "command": command_path,
+            "started": strnow(),
+            "memory_traced": self.trace_memory,
+            "stages": [],
+        }
+        profile = cProfile.Profile() if self.use_cprofile else None
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.report["wall_time_s"] = time.perf_counter() - start
+            self.report["peak_memory_bytes"] = None
+            if self.trace_memory:
+                self.report["peak_memory_bytes"] = max(
+                    [stage["peak_memory_bytes"] for stage in self.report["stages"]]
+                    + [tracemalloc.get_traced_memory()[1]]
+                )
+                tracemalloc.stop()
+            self.write_report(profile)
+
+    def write_report(self, profile: t.Optional[cProfile.Profile] = None) -> str:
+        name = self.report["command"].replace(" ", "_")
+        out_path = get_output_path(
+            basefolder=self.output_dir,
+            subfolder="",
+            filename=f"{name}_{self.report['started']}.json",
+        )
+        if profile is not None:
+            stats_path = f"{os.path.splitext(out_path)[0]}.prof"
+            profile.dump_stats(stats_path)
+            self.report["cprofile"] = stats_path
+        with open(out_path, "w") as file:
+            json.dump(self.report, file, indent=4)
+        return out_path
+
+
+def get_profiler() -> Profiler:
+    ctx = click.get_current_context(silent=True)
+    profiler = ctx.find_object(Profiler) if ctx is not None else None
+    return profiler or Profiler()
+
+
+def profiled(func: t.Callable[..., t.Any]) -> t.Callable[..., t.Any]:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ctx = click.get_current_context()
+        command_path = ctx.command_path.split(" ", 1)[-1]
+        with get_profiler().command(command_path):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class LRUCache:
+    """Keeps the most recently used values up to a maximum number of entries"""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[t.Hashable, t.Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: t.Hashable) -> t.Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: t.Hashable, value: t.Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, key: t.Hashable, value: t.Any) -> None:
+        """Removes the entry of key if it still holds value"""
+        if self._data.get(key) is value:
+            del self._data[key]
+
+
+def get_file_key(filepath: str) -> t.Tuple[str, int, int]:
+    """Identifies a file version by path, modification time and size"""
+    stat = os.stat(filepath)
+    return (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+
+
+def render_sheet_job(
+    operations_map: t.Dict[str, t.List[float]],
+    str_ops_matrix: np.ndarray,
+    image_width: int,
+    image_height: int,
+    out_path: str,
+    output_format: str = "bmp",
+) -> str:
+    render_sheet(
+        operations_map, str_ops_matrix, image_width, image_height, output_format
+    ).save(out_path)
+    return out_path
+
+
+def per_row_job(
+    operations_map: t.Dict[str, t.List[float]],
+    str_ops_matrix: t.List[t.List[str]],
+    density_start: float,
+    density_end: float,
+    out_path: str,
+    output_format: str = "bmp",
+) -> str:
+    processed_str_ops_matrix = list(
+        process_ops_matrix_per_row(
+            density_start, density_end, str_ops_matrix, "front_back", "transfer"
+        )
+    )
+    render_pattern(operations_map, processed_str_ops_matrix, output_format).save(
+        out_path
+    )
+    return out_path
+
+
+def with_attractor_job(
+    operations_map: t.Dict[str, t.List[float]],
+    str_ops_matrix: t.List[t.List[str]],
+    transfer_percentage: int,
+    attractor_uv: t.Tuple[float, float],
+    out_path: str,
+    output_format: str = "bmp",
+) -> str:
+    processed_str_ops_matrix = process_ops_matrix_with_attractor(
+        str_ops_matrix, transfer_percentage, attractor_uv, "front_back", "transfer"
+    )
+    render_pattern(operations_map, processed_str_ops_matrix, output_format).save(
+        out_path
+    )
+    return out_path
+
+
+def with_mask_job(
+    operations_map: t.Dict[str, t.List[float]],
+    str_ops_matrix: t.List[t.List[str]],
+    density_matrix: np.ndarray,
+    out_path: str,
+    output_format: str = "bmp",
+) -> str:
+    processed_str_ops_matrix = process_ops_matrix_with_density(
+        str_ops_matrix, density_matrix, "front_back", "transfer"
+    )
+    render_pattern(operations_map, processed_str_ops_matrix, output_format).save(
+        out_path
+    )
+    return out_path
+
+
+def decode_image_job(
+    color_table: t.Dict[t.Tuple[float, ...], str], filepath: str
+) -> t.List[t.List[str]]:
+    pattern_matrix = extract_pattern_matrix(filepath)
+    if pattern_matrix.dtype.kind == "U":
+        return pattern_matrix.tolist()
+    return get_str_ops_matrix_from_color_table(color_table, pattern_matrix)
+
+
+def extract_mask(filepath: str) -> t.Tuple[np.ndarray, str]:
+    density_matrix = extract_mask_density(filepath)
+    return density_matrix, get_mask_hash(density_matrix)
+
+
+class JobServer:
+    """Runs knitting jobs sent as JSON lines over a local socket.
+
+    Color settings, decoded patterns and masks stay in an LRU cache keyed by
+    file version, and decoding, transforms and rendering run in a process pool,
+    so repeated small jobs skip the imports, file reads and decoding of a
+    fresh CLI process."""
+
+    COMMANDS = ("generate-from-source", "per-row", "with-attractor", "with-mask")
+
+    def __init__(self, jobs: int = 0, cache_size: int = 64):
+        self.executor = ProcessPoolExecutor(max_workers=get_number_of_jobs(jobs))
+        self.cache = LRUCache(cache_size)
+        self.count = 0
+
+    async def cached(
+        self, key: t.Hashable, func: t.Callable[..., t.Any], *args: t.Any
+    ) -> t.Any:
+        """Runs func(*args) in the process pool once per key.
+
+        The future is cached as soon as the call starts, so concurrent requests
+        for the same key wait for the same call instead of repeating it. Failed
+        calls are dropped from the cache and run again by the next request."""
+        try:
+            future = self.cache.get(key)
+        except KeyError:
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+            self.cache.put(key, future)
+        try:
+            # A cancelled request must not cancel the call other requests share
+            return await asyncio.shield(future)
+        except Exception:
+            self.cache.discard(key, future)
+            raise
+
+    def load_color_settings(
+        self, color_settings: str
+    ) -> t.Tuple[t.Dict[str, t.List[float]], t.Dict[t.Tuple[float, ...], str]]:
+        key = ("color_settings",) + get_file_key(color_settings)
+        try:
+            return self.cache.get(key)
+        except KeyError:
+            operations_map = get_dictionary_from_file(color_settings)
+            value = (operations_map, get_color_table(operations_map))
+            self.cache.put(key, value)
+            return value
+
+    def get_post_process_path(
+        self, filepath: str, output_dir: str, output_format: str
+    ) -> str:
+        name = get_filename_from_path(filepath)
+        extension = OUTPUT_FORMATS[output_format]
+        return get_output_path(
+            basefolder=output_dir,
+            subfolder="post-processed",
+            filename=f"{name}_edit_{strnow()}_{self.count}{extension}",
+        )
+
+    async def run(self, command: str, args: t.Dict[str, t.Any]) -> t.List[str]:
+        if command not in self.COMMANDS:
+            raise click.UsageError(f"Unknown command: {command}")
+        self.count += 1
+        loop = asyncio.get_running_loop()
+        color_settings = args.get(
+            "color_settings", os.path.join("input", "color_settings.json")
+        )
+        output_dir = args.get("output_dir", "output")
+        output_format = args.get("format", "bmp")
+        if output_format not in OUTPUT_FORMATS:
+            raise click.UsageError(f"Unknown output format: {output_format}")
+        operations_map, color_table = self.load_color_settings(color_settings)
+
+        if command == "generate-from-source":
+            input_file = args["input_file"]
+            str_ops_matrices, names = await self.cached(
+                ("pattern",) + get_file_key(input_file),
+                extract_pattern_data,
+                input_file,
+            )
+            futures = []
+            for name, str_ops_matrix in zip(names, str_ops_matrices):
+                image_width = args.get("image_width") or get_2d_matrix_size_x(
+                    str_ops_matrix
+                )
+                image_height = args.get("image_height") or get_2d_matrix_size_y(
+                    str_ops_matrix
+                )
+                out_path = get_output_path(
+                    basefolder=output_dir,
+                    subfolder=f"{image_width}x{image_height}",
+                    filename=f"{name[:251]}{OUTPUT_FORMATS[output_format]}",
+                )
+                futures.append(
+                    loop.run_in_executor(
+                        self.executor,
+                        render_sheet_job,
+                        operations_map,
+                        str_ops_matrix,
+                        image_width,
+                        image_height,
+                        out_path,
+                        output_format,
+                    )
+                )
+            return list(await asyncio.gather(*futures))
+
+        filepath = args["filepath"]
+        str_ops_matrix = await self.cached(
+            ("decoded",) + get_file_key(filepath) + get_file_key(color_settings),
+            decode_image_job,
+            color_table,
+            filepath,
+        )
+        out_path = self.get_post_process_path(filepath, output_dir, output_format)
+        if command == "per-row":
+            job_args: t.Tuple[t.Any, ...] = (
+                per_row_job,
+                operations_map,
+                str_ops_matrix,
+                args.get("density_start", 1.0),
+                args.get("density_end", 0.0),
+                out_path,
+            )
+        elif command == "with-attractor":
+            job_args = (
+                with_attractor_job,
+                operations_map,
+                str_ops_matrix,
+                args.get("transfer_percentage", 40),
+                (args.get("attractor_u", 0.5), args.get("attractor_v", 0.5)),
+                out_path,
+            )
+        else:
+            mask_path = args["mask_path"]
+            resampling = args.get("resampling", "nearest")
+            mask_density_matrix, mask_hash = await self.cached(
+                ("mask",) + get_file_key(mask_path), extract_mask, mask_path
+            )
+            width = get_2d_matrix_size_x(str_ops_matrix)
+            height = get_2d_matrix_size_y(str_ops_matrix)
+            density_matrix = await self.cached(
+                get_density_key(mask_hash, width, height, resampling),
+                resample_density_matrix,
+                mask_density_matrix,
+                width,
+                height,
+                resampling,
+            )
+            job_args = (
+                with_mask_job,
+                operations_map,
+                str_ops_matrix,
+                density_matrix,
+                out_path,
+            )
+        return [
+            await loop.run_in_executor(self.executor, *job_args, output_format)
+        ]
+
+    async def handle_request(self, line: bytes) -> t.Dict[str, t.Any]:
+        start = time.perf_counter()
+        response: t.Dict[str, t.Any] = {"id": None}
+        try:
+            request = json.loads(line)
+            response["id"] = request.get("id")
+            response["outputs"] = await self.run(
+                request.get("command"), request.get("args") or {}
+            )
+            response["ok"] = True
+        except Exception as exc:
+            response["ok"] = False
+            response["error"] = f"{type(exc).__name__}: {exc}"
+        response["seconds"] = time.perf_counter() - start
+        return response
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        async def respond(line: bytes) -> None:
+            response = await self.handle_request(line)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        # Only the running requests, so long-lived connections do not keep
+        # every finished task and response around
+        tasks: "t.Set[asyncio.Future[None]]" = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def serve(
+        self, host: str, port: int, unix_socket: t.Optional[str] = None
+    ) -> None:
+        if unix_socket:
+            server = await asyncio.start_unix_server(
+                self.handle_connection, path=unix_socket
+            )
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
 @click.group()
-def cli():
+@click.option(
+    "--profile/--no-profile",
+    envvar="KNIT_PROFILE",
+    default=False,
+    help=(
+        "Record wall time and pixel throughput per stage "
+        "and write them to a JSON report"
+    ),
+)
+@click.option(
+    "--profile-memory/--no-profile-memory",
+    envvar="KNIT_PROFILE_MEMORY",
+    default=False,
+    help=(
+        "Also trace the peak memory per stage. Tracing slows the stages down, "
+        "so the wall times of such a run are not representative."
+    ),
+)
+@click.option(
+    "--profile-dir",
+    type=click.Path(),
+    envvar="KNIT_PROFILE_DIR",
+    default="profiles",
+    help="Output directory to store the profiling reports in",
+)
+@click.option(
+    "--cprofile/--no-cprofile",
+    envvar="KNIT_CPROFILE",
+    default=False,
+    help="Also dump cProfile statistics next to each profiling report",
+)
+@click.pass_context
+def cli(
+    ctx: click.Context,
+    profile: bool,
+    profile_memory: bool,
+    profile_dir: str,
+    cprofile: bool,
+):
     """Knit pattern generator and processor CLI"""
+    ctx.obj = Profiler(
+        enabled=profile,
+        output_dir=profile_dir,
+        use_cprofile=cprofile,
+        trace_memory=profile_memory,
+    )
 
 
 @cli.command()
@@ -393,35 +1244,113 @@ def cli():
     default="output",
     help="Output directory to store the images in",
 )
+@click.option(
+    "--jobs",
+    type=int,
+    default=1,
+    help=(
+        "Number of worker processes rendering sheets in parallel. "
+        "Use 0 to run one worker per CPU core."
+    ),
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(sorted(OUTPUT_FORMATS)),
+    default="bmp",
+    help="Output format, a BMP image or a run-length encoded pattern (rle)",
+)
+@profiled
 def generate_from_source(
     input_file: str,
     color_settings: str,
     image_width: int,
     image_height: int,
     output_dir: str,
+    jobs: int,
+    output_format: str,
 ):
-    """Generates pattern from text or Excel file"""
+    """Generates pattern from text, Excel or RLE file"""
 
-    operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
-        color_settings
-    )
-    str_ops_matrices, names = extract_pattern_data(input_file)
+    profiler = get_profiler()
+    with profiler.stage("load"):
+        operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
+            color_settings
+        )
+        str_ops_matrices, names = extract_pattern_data(input_file)
 
+    out_paths = []
+    sizes = []
     for name, str_ops_matrix in zip(names, str_ops_matrices):
         unit_size_x = get_2d_matrix_size_x(str_ops_matrix)
         unit_size_y = get_2d_matrix_size_y(str_ops_matrix)
         current_image_width = image_width or unit_size_x
         current_image_height = image_height or unit_size_y
-        out_path = get_output_path(
-            basefolder=output_dir,
-            subfolder=f"{current_image_width}x{current_image_height}",
-            filename=f"{name[:251]}.bmp",
-        )
-        total_str_ops_matrix = tessellate_with_unit(
-            str_ops_matrix, current_image_width, current_image_height
+        out_paths.append(
+            get_output_path(
+                basefolder=output_dir,
+                subfolder=f"{current_image_width}x{current_image_height}",
+                filename=f"{name[:251]}{OUTPUT_FORMATS[output_format]}",
+            )
         )
-        image = generate_image(operations_map, total_str_ops_matrix)
-        image.save(os.path.join(out_path))
+        sizes.append((current_image_width, current_image_height))
+
+    jobs = min(get_number_of_jobs(jobs), len(str_ops_matrices))
+    pixels = sum(width * height for width, height in sizes)
+    with profiler.stage("render", pixels=pixels), ImageWriter() as writer:
+        if jobs <= 1:
+            images = (
+                render_sheet(operations_map, str_ops_matrix, *size, output_format)
+                for str_ops_matrix, size in zip(str_ops_matrices, sizes)
+            )
+            for image, out_path in zip(images, out_paths):
+                writer.save(image, out_path)
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                images = executor.map(
+                    render_sheet,
+                    [operations_map] * len(str_ops_matrices),
+                    str_ops_matrices,
+                    [width for width, _ in sizes],
+                    [height for _, height in sizes],
+                    [output_format] * len(str_ops_matrices),
+                )
+                for image, out_path in zip(images, out_paths):
+                    writer.save(image, out_path)
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", help="Host to listen on")
+@click.option("--port", type=int, default=8766, help="Port to listen on")
+@click.option(
+    "--unix-socket",
+    type=click.Path(),
+    default=None,
+    help="Listen on a Unix socket instead of host and port",
+)
+@click.option(
+    "--jobs",
+    type=int,
+    default=0,
+    help="Number of worker processes. Use 0 to run one worker per CPU core.",
+)
+@click.option(
+    "--cache-size",
+    type=int,
+    default=64,
+    help="Number of color settings, decoded patterns and masks kept in memory",
+)
+def serve(host: str, port: int, unix_socket: str, jobs: int, cache_size: int):
+    """Runs a job server for the generate and post-process commands"""
+
+    server = JobServer(jobs=jobs, cache_size=cache_size)
+    click.echo(f"Serving knitting jobs on {unix_socket or f'{host}:{port}'}")
+    try:
+        asyncio.run(server.serve(host, port, unix_socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
 
 
 @cli.group()
@@ -455,34 +1384,51 @@ def post_process():
     default="output",
     help="Output directory to store the images in",
 )
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(sorted(OUTPUT_FORMATS)),
+    default="bmp",
+    help="Output format, a BMP image or a run-length encoded pattern (rle)",
+)
+@profiled
 def per_row(
     filepath: str,
     color_settings: str,
     density_start: float,
     density_end: float,
     output_dir: str,
+    output_format: str,
 ):
     """Randomly distributes transfer operations per row based on
     density start and end factors"""
 
-    operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
-        color_settings
-    )
-    rgb_matrix = extract_rgb_matrix(filepath)
-    str_ops_matrix = get_str_ops_matrix_from_rgb(operations_map, rgb_matrix)
-
-    processed_str_ops_matrix = process_ops_matrix_per_row(
-        density_start, density_end, str_ops_matrix, "front_back", "transfer"
-    )
+    profiler = get_profiler()
+    with profiler.stage("load"):
+        operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
+            color_settings
+        )
+        pattern_matrix = extract_pattern_matrix(filepath)
+    pixels = get_pixel_count(pattern_matrix)
+    with profiler.stage("decode", pixels=pixels):
+        str_ops_matrix = get_str_ops_matrix(operations_map, pattern_matrix)
+    with profiler.stage("transform", pixels=pixels):
+        processed_str_ops_matrix = list(
+            process_ops_matrix_per_row(
+                density_start, density_end, str_ops_matrix, "front_back", "transfer"
+            )
+        )
 
     name = get_filename_from_path(filepath)
     out_path = get_output_path(
         basefolder=output_dir,
         subfolder="post-processed",
-        filename=f"{name}_edit_{strnow()}.bmp",
+        filename=f"{name}_edit_{strnow()}{OUTPUT_FORMATS[output_format]}",
     )
-    image = generate_image(operations_map, processed_str_ops_matrix)
-    image.save(os.path.join(out_path))
+    with profiler.stage("render", pixels=pixels):
+        image = render_pattern(operations_map, processed_str_ops_matrix, output_format)
+    with profiler.stage("save", pixels=pixels):
+        image.save(os.path.join(out_path))
 
 
 @post_process.command()
@@ -517,6 +1463,14 @@ def per_row(
     default="output",
     help="Output directory to store the images in",
 )
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(sorted(OUTPUT_FORMATS)),
+    default="bmp",
+    help="Output format, a BMP image or a run-length encoded pattern (rle)",
+)
+@profiled
 def with_attractor(
     filepath: str,
     color_settings: str,
@@ -524,35 +1478,43 @@ def with_attractor(
     attractor_u: float,
     attractor_v: float,
     output_dir: str,
+    output_format: str,
 ):
     """Randomly distributes transfer operations in the whole pattern based on
     attractor uv position and transfer replacement percentage"""
 
-    operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
-        color_settings
-    )
-    rgb_matrix = extract_rgb_matrix(filepath)
-    str_ops_matrix = get_str_ops_matrix_from_rgb(operations_map, rgb_matrix)
-    processed_str_ops_matrix = process_ops_matrix_with_attractor(
-        str_ops_matrix,
-        transfer_percentage,
-        (attractor_u, attractor_v),
-        "front_back",
-        "transfer",
-    )
+    profiler = get_profiler()
+    with profiler.stage("load"):
+        operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
+            color_settings
+        )
+        pattern_matrix = extract_pattern_matrix(filepath)
+    pixels = get_pixel_count(pattern_matrix)
+    with profiler.stage("decode", pixels=pixels):
+        str_ops_matrix = get_str_ops_matrix(operations_map, pattern_matrix)
+    with profiler.stage("transform", pixels=pixels):
+        processed_str_ops_matrix = process_ops_matrix_with_attractor(
+            str_ops_matrix,
+            transfer_percentage,
+            (attractor_u, attractor_v),
+            "front_back",
+            "transfer",
+        )
 
     name = get_filename_from_path(filepath)
     out_path = get_output_path(
         basefolder=output_dir,
         subfolder="post-processed",
-        filename=f"{name}_edit_{strnow()}.bmp",
+        filename=f"{name}_edit_{strnow()}{OUTPUT_FORMATS[output_format]}",
     )
-    image = generate_image(operations_map, processed_str_ops_matrix)
-    image.save(os.path.join(out_path))
+    with profiler.stage("render", pixels=pixels):
+        image = render_pattern(operations_map, processed_str_ops_matrix, output_format)
+    with profiler.stage("save", pixels=pixels):
+        image.save(os.path.join(out_path))
 
 
 @post_process.command()
-@click.argument("filepath", type=click.Path(exists=True))
+@click.argument("filepaths", nargs=-1, required=True, type=click.Path(exists=True))
 @click.argument("mask-path", type=click.Path(exists=True))
 @click.option(
     "--color-settings",
@@ -560,42 +1522,83 @@ def with_attractor(
     default=os.path.join("input", "color_settings.json"),
     help="Path to JSON file containing knit operations mapped to RGB values",
 )
+@click.option(
+    "--resampling",
+    type=click.Choice(MASK_RESAMPLING),
+    default="nearest",
+    help="Interpolation of masks whose size differs from the pattern size",
+)
 @click.option(
     "--output-dir",
     type=click.Path(),
     default="output",
     help="Output directory to store the images in",
 )
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(sorted(OUTPUT_FORMATS)),
+    default="bmp",
+    help="Output format, a BMP image or a run-length encoded pattern (rle)",
+)
+@profiled
 def with_mask(
-    filepath: str,
+    filepaths: t.Tuple[str, ...],
     mask_path: str,
     color_settings: str,
+    resampling: str,
     output_dir: str,
+    output_format: str,
 ):
-    """Distributes transfer operations in the whole pattern based on mask"""
-
-    operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
-        color_settings
-    )
-    rgb_matrix = extract_rgb_matrix(filepath)
-    str_ops_matrix = get_str_ops_matrix_from_rgb(operations_map, rgb_matrix)
-    mask_rgb_matrix = extract_rgb_matrix(mask_path)
-    mask_hsv_matrix = get_hsv_matrix(mask_rgb_matrix)
-    processed_str_ops_matrix = process_ops_matrix_with_mask(
-        str_ops_matrix,
-        mask_hsv_matrix,
-        "front_back",
-        "transfer",
-    )
-
-    name = get_filename_from_path(filepath)
-    out_path = get_output_path(
-        basefolder=output_dir,
-        subfolder="post-processed",
-        filename=f"{name}_edit_{strnow()}.bmp",
-    )
-    image = generate_image(operations_map, processed_str_ops_matrix)
-    image.save(os.path.join(out_path))
+    """Distributes transfer operations in the whole pattern based on mask.
+    The mask is resampled to the size of each pattern, so one mask can be
+    applied to several patterns of any size at once"""
+
+    profiler = get_profiler()
+    with profiler.stage("load"):
+        operations_map: t.Dict[str, t.List[float]] = get_dictionary_from_file(
+            color_settings
+        )
+        mask_density_matrix = extract_mask_density(mask_path)
+    mask_hash = get_mask_hash(mask_density_matrix)
+    density_cache = LRUCache()
+    for index, filepath in enumerate(filepaths):
+        with profiler.stage("load"):
+            pattern_matrix = extract_pattern_matrix(filepath)
+        pixels = get_pixel_count(pattern_matrix)
+        with profiler.stage("decode", pixels=pixels):
+            str_ops_matrix = get_str_ops_matrix(operations_map, pattern_matrix)
+        with profiler.stage("resample", pixels=pixels):
+            density_matrix = get_resampled_density_matrix(
+                density_cache,
+                mask_density_matrix,
+                get_2d_matrix_size_x(str_ops_matrix),
+                get_2d_matrix_size_y(str_ops_matrix),
+                resampling,
+                mask_hash,
+            )
+        with profiler.stage("transform", pixels=pixels):
+            processed_str_ops_matrix = process_ops_matrix_with_density(
+                str_ops_matrix,
+                density_matrix,
+                "front_back",
+                "transfer",
+            )
+
+        name = get_filename_from_path(filepath)
+        if len(filepaths) > 1:
+            name = f"{name}_{index}"
+        out_path = get_output_path(
+            basefolder=output_dir,
+            subfolder="post-processed",
+            filename=f"{name}_edit_{strnow()}{OUTPUT_FORMATS[output_format]}",
+        )
+        with profiler.stage("render", pixels=pixels):
+            image = render_pattern(
+                operations_map, processed_str_ops_matrix, output_format
+            )
+        with profiler.stage("save", pixels=pixels):
+            image.save(os.path.join(out_path))
 
 
 if __name__ == "__main__":
@@ -609,7 +1612,7 @@ if __name__ == "__main__":
     except UnimplementedInputFileFormat:
         click.echo(
             "Input file format not recognised. "
-            "Please use a .txt or .xlsx file for your input pattern(s)."
+            "Please use a .txt, .xlsx or .rle file for your input pattern(s)."
         )
     except EmptyCellFound:
         click.echo("No empty cells are allowed, please update your input pattern(s).")
@@ -22,8 +22,29 @@ Describe typical classes found in project
 
 from .surface_path_planner import SurfacePathPlanner
 from .planner_mesh import PlannerMesh
+from .instrumentation import Instrumentation
+from .layered_toolpath import LayeredToolpath
+from .frame_array import FrameArray
+from .geodesic import GeodesicSolver
+from .planner_archive import PlannerArchive
+from .node_index import NodeIndex
+from .workspace import Workspace
+from .path_metrics import PathMetrics
+from .path_engines import PathEngine, LowestAxisEngine, BoustrophedonEngine, SpaceFillingCurveEngine
 
 __all__ = [
    'SurfacePathPlanner',
-   'PlannerMesh'
+   'PlannerMesh',
+   'Instrumentation',
+   'LayeredToolpath',
+   'FrameArray',
+   'GeodesicSolver',
+   'PlannerArchive',
+   'NodeIndex',
+   'Workspace',
+   'PathMetrics',
+   'PathEngine',
+   'LowestAxisEngine',
+   'BoustrophedonEngine',
+   'SpaceFillingCurveEngine'
 ]
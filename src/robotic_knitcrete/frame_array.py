@@ -0,0 +1,104 @@
+from compas.geometry import Frame
+
+try:
+    import numpy as np
+except ImportError:
+    # IronPython inside Rhino
+    np = None
+
+__all__ = ['FrameArray']
+
+
+class FrameArray(object):
+    """The frames of many nodes as NumPy arrays instead of compas frames.
+
+    Row ``i`` belongs to ``keys[i]``: ``origins[i]`` is the frame origin and
+    ``orientations[i]`` holds the unit x-, y- and z-axis as its rows. Compas
+    frames are only created by :meth:`frame`, for the nodes a caller asks for.
+
+    Args:
+        keys (list): Node keys, one per row
+        origins (array-like): Array of shape ``(n, 3)``
+        orientations (array-like): Array of shape ``(n, 3, 3)``
+    """
+
+    def __init__(self, keys, origins, orientations):
+        if np is None:
+            raise ImportError('FrameArray requires NumPy')
+        self.keys = list(keys)
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+        self.origins = np.array(origins, dtype=float).reshape(-1, 3)
+        self.orientations = np.array(orientations, dtype=float).reshape(-1, 3, 3)
+
+    @classmethod
+    def from_normals(cls, keys, points, normals):
+        """Frames like :meth:`SurfacePathPlanner.set_node_frame`, in one pass over all normals.
+
+        The normals are flipped to point down, the x-axis is ``normal x Y``
+        and the y-axis ``normal x xaxis``.
+        """
+        return cls(keys, points, orientations_from_normals(normals))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    @property
+    def xaxes(self):
+        return self.orientations[:, 0]
+
+    @property
+    def yaxes(self):
+        return self.orientations[:, 1]
+
+    @property
+    def zaxes(self):
+        return self.orientations[:, 2]
+
+    def rows(self, keys):
+        return np.array([self.index[key] for key in keys], dtype=int)
+
+    def assign(self, keys, origins, orientations):
+        """Overwrites the rows of ``keys``, appending the keys that have no row yet."""
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        orientations = np.asarray(orientations, dtype=float).reshape(-1, 3, 3)
+        new = [key for key in keys if key not in self.index]
+        if new:
+            for key in new:
+                self.index[key] = len(self.keys)
+                self.keys.append(key)
+            self.origins = np.concatenate([self.origins, np.zeros((len(new), 3))])
+            self.orientations = np.concatenate([self.orientations, np.zeros((len(new), 3, 3))])
+        rows = self.rows(keys)
+        self.origins[rows] = origins
+        self.orientations[rows] = orientations
+
+    def translated(self, keys, offsets):
+        """Origins and orientations of ``keys`` moved by ``offsets`` along their z-axes.
+
+        Returns:
+            tuple: Arrays of shape ``(n, 3)`` and ``(n, 3, 3)``
+        """
+        rows = self.rows(keys)
+        offsets = np.asarray(offsets, dtype=float)
+        return self.origins[rows] + self.orientations[rows, 2] * offsets[:, None], self.orientations[rows]
+
+    def frame(self, key):
+        """The frame of one node as a :class:`compas.geometry.Frame`."""
+        i = self.index[key]
+        return Frame(self.origins[i].tolist(), self.orientations[i, 0].tolist(), self.orientations[i, 1].tolist())
+
+
+def orientations_from_normals(normals):
+    normals = np.array(normals, dtype=float).reshape(-1, 3)
+    normals[normals[:, 2] > 0] *= -1
+    xaxes = np.cross(normals, [0.0, 1.0, 0.0])
+    yaxes = np.cross(normals, xaxes)
+    xaxes /= np.linalg.norm(xaxes, axis=1)[:, None]
+    yaxes /= np.linalg.norm(yaxes, axis=1)[:, None]
+    zaxes = np.cross(xaxes, yaxes)
+    zaxes /= np.linalg.norm(zaxes, axis=1)[:, None]
+    yaxes = np.cross(zaxes, xaxes)
+    return np.stack([xaxes, yaxes, zaxes], axis=1)
@@ -0,0 +1,111 @@
+try:
+    import numpy as np
+except ImportError:
+    # IronPython inside Rhino
+    np = None
+
+try:
+    from scipy import sparse
+    from scipy.sparse.linalg import factorized
+except ImportError:
+    # IronPython inside Rhino, or CPython without SciPy
+    sparse = None
+
+__all__ = ['GeodesicSolver']
+
+
+class GeodesicSolver(object):
+    """Geodesic distances on a mesh with the heat method (Crane, Weischedel and Wardetzky, 2013).
+
+    The faces are split into triangles, and the cotangent Laplacian and
+    lumped mass matrix of the triangulation are built and factorized once.
+    Every call of :meth:`distances` then costs two sparse back-substitutions,
+    one for the heat flow from the sources and one for the Poisson equation
+    recovering the distances from its normalized gradient.
+
+    Args:
+        mesh (:class:`PlannerMesh`): The mesh, whose vertices must not move while the solver is used
+        time_factor (float): Diffusion time as a multiple of the squared mean edge length.
+            Larger values give smoother distances.
+    """
+
+    def __init__(self, mesh, time_factor=1.0):
+        if np is None or sparse is None:
+            raise ImportError('Geodesic distances require NumPy and SciPy')
+        self.keys = list(mesh.vertices())
+        self.index = dict((key, i) for i, key in enumerate(self.keys))
+        self.points = np.array([mesh.vertex_coordinates(key) for key in self.keys], dtype=float).reshape(-1, 3)
+        triangles = []
+        for face in mesh.faces():
+            corners = [self.index[vertex] for vertex in mesh.face_vertices(face)]
+            triangles.extend([corners[0], corners[i], corners[i + 1]] for i in range(1, len(corners) - 1))
+        self.triangles = np.array(triangles, dtype=int).reshape(-1, 3)
+
+        p = self.points[self.triangles]
+        # Edge k is opposite corner k, counterclockwise around the normal
+        self.edges = np.stack([p[:, 2] - p[:, 1], p[:, 0] - p[:, 2], p[:, 1] - p[:, 0]], axis=1)
+        normals = np.cross(self.edges[:, 2], -self.edges[:, 1])
+        double_areas = np.linalg.norm(normals, axis=1)
+        double_areas[double_areas == 0] = 1.0
+        self.normals = normals / double_areas[:, None]
+        self.double_areas = double_areas
+        # Cotangent of the angle at corner k, between the two edges meeting there
+        self.cotangents = np.stack([
+            np.einsum('ij,ij->i', self.edges[:, 2], -self.edges[:, 1]),
+            np.einsum('ij,ij->i', self.edges[:, 0], -self.edges[:, 2]),
+            np.einsum('ij,ij->i', self.edges[:, 1], -self.edges[:, 0]),
+        ], axis=1) / double_areas[:, None]
+
+        n = len(self.keys)
+        i = self.triangles[:, [1, 2, 0]].reshape(-1)
+        j = self.triangles[:, [2, 0, 1]].reshape(-1)
+        weights = 0.5 * self.cotangents.reshape(-1)
+        stiffness = sparse.coo_matrix(
+            (np.concatenate([-weights, -weights, weights, weights]),
+             (np.concatenate([i, j, i, j]), np.concatenate([j, i, i, j]))), shape=(n, n)).tocsc()
+        masses = np.bincount(self.triangles.reshape(-1), np.repeat(double_areas / 6.0, 3), n)
+        mass = sparse.diags(masses).tocsc()
+
+        lengths = np.linalg.norm(self.edges, axis=2)
+        self.time = time_factor * lengths.mean() ** 2
+        self.solve_heat = factorized(mass + self.time * stiffness)
+        # The Neumann Poisson problem only fixes distances up to a constant,
+        # a vanishing mass term keeps its matrix invertible
+        epsilon = 1e-8 * stiffness.diagonal().mean() / max(masses.mean(), 1e-300)
+        self.solve_poisson = factorized(stiffness + epsilon * mass)
+
+    def distances(self, sources):
+        """Geodesic distances of all vertices to the closest source vertex.
+
+        Args:
+            sources (list): Vertex keys, e.g. of supports or of the boundary
+
+        Returns:
+            numpy.ndarray: One distance per vertex, in the order of ``mesh.vertices()``
+        """
+        rows = [self.index[key] for key in sources]
+        if not rows:
+            raise ValueError('Geodesic distances need at least one source vertex.')
+        heat = np.zeros(len(self.keys))
+        heat[rows] = 1.0
+        u = self.solve_heat(heat)
+
+        # Normalized gradient of the heat per triangle, pointing away from the sources
+        gradients = np.einsum('tk,tkj->tj', u[self.triangles], np.cross(self.normals[:, None, :], self.edges))
+        gradients /= self.double_areas[:, None]
+        norms = np.linalg.norm(gradients, axis=1)
+        norms[norms == 0] = 1.0
+        field = -gradients / norms[:, None]
+
+        # Integrated divergence at each corner from the two edges leaving it
+        projections = np.einsum('tkj,tj->tk', self.edges, field)
+        cot = self.cotangents
+        divergence = 0.5 * np.stack([
+            cot[:, 2] * projections[:, 2] - cot[:, 1] * projections[:, 1],
+            cot[:, 0] * projections[:, 0] - cot[:, 2] * projections[:, 2],
+            cot[:, 1] * projections[:, 1] - cot[:, 0] * projections[:, 0],
+        ], axis=1)
+        totals = np.bincount(self.triangles.reshape(-1), divergence.reshape(-1), len(self.keys))
+
+        distances = self.solve_poisson(-totals)
+        return distances - distances[rows].min()
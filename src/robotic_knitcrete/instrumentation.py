@@ -0,0 +1,96 @@
+import json
+from contextlib import contextmanager
+
+try:
+    from time import perf_counter as clock
+except ImportError:
+    # IronPython 2.7
+    from time import clock
+
+__all__ = ['Instrumentation', 'OFF', 'STATS', 'TRACE']
+
+OFF = 0
+STATS = 1
+TRACE = 2
+
+
+class Instrumentation(object):
+    """Leveled counters, phase timers and trace events of a planner run.
+
+    At level ``OFF`` nothing is recorded and the hot loops only check
+    :attr:`enabled` once per run. ``STATS`` records counters and timers,
+    ``TRACE`` additionally keeps every step as an event and, with ``echo``,
+    prints it to the console like the planner used to.
+    """
+
+    def __init__(self, level=OFF, echo=False):
+        self.level = level
+        self.echo = echo
+        self.reset()
+
+    @property
+    def enabled(self):
+        return self.level > OFF
+
+    @property
+    def tracing(self):
+        return self.level >= TRACE
+
+    def reset(self):
+        self.counters = {}
+        self.timers = {}
+        self.events = []
+
+    def count(self, name, value=1):
+        if self.level > OFF:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def _timer(self, name):
+        start = clock()
+        try:
+            yield
+        finally:
+            timer = self.timers.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            timer['calls'] += 1
+            timer['seconds'] += clock() - start
+
+    def timer(self, name):
+        """Context manager adding the wall time of the block to the named phase."""
+        if self.level > OFF:
+            return self._timer(name)
+        return _NULL_CONTEXT
+
+    def trace(self, name, **data):
+        if self.level >= TRACE:
+            data['event'] = name
+            self.events.append(data)
+            if self.echo:
+                print(data)
+
+    @property
+    def data(self):
+        return {
+            'level': self.level,
+            'counters': dict(self.counters),
+            'timers': dict((name, dict(timer)) for name, timer in self.timers.items()),
+            'events': list(self.events),
+        }
+
+    def to_jsonstring(self, pretty=False):
+        return json.dumps(self.data, indent=4 if pretty else None, sort_keys=True)
+
+    def to_json(self, filepath, pretty=False):
+        with open(filepath, 'w') as f:
+            f.write(self.to_jsonstring(pretty))
+
+
+class _NullContext(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_CONTEXT = _NullContext()
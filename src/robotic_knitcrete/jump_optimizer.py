@@ -0,0 +1,201 @@
+import math
+from heapq import heappush, heapreplace
+
+from compas.geometry import KDTree
+
+__all__ = ['path_segments', 'order_segments', 'tour_length']
+
+
+def path_segments(path, neighbors):
+    """Splits a path into its continuous segments.
+
+    Args:
+        path (list): Node keys in print order
+        neighbors (callable): Returns the mesh neighbors of a node
+
+    Returns:
+        list: Lists of node keys, split wherever consecutive nodes are not neighbors
+    """
+    segments = []
+    for key in path:
+        if segments and key in neighbors(segments[-1][-1]):
+            segments[-1].append(key)
+        else:
+            segments.append([key])
+    return segments
+
+
+def order_segments(starts, ends, max_iterations=20, candidates=8):
+    """Orders and orients path segments to shorten the jumps between them.
+
+    The first segment stays in place. The others are chained by a
+    nearest-neighbor search over all segment ends, or kept in their given
+    order if that is shorter, then improved with 2-opt (reversing a run of
+    segments) and Or-opt (moving one segment) until no move shortens the
+    jumps or ``max_iterations`` passes are done. Both moves only try the
+    ``candidates`` segments with the closest ends. The jumps of the result are
+    therefore never longer than those of the given order.
+
+    Args:
+        starts (list): Start point of every segment
+        ends (list): End point of every segment
+
+    Returns:
+        list: ``(segment index, reversed)`` tuples in print order
+    """
+    count = len(starts)
+    if count < 2:
+        return [(i, False) for i in range(count)]
+
+    # Endpoint 2 * i is the start, 2 * i + 1 the end of segment i
+    points = [point for i in range(count) for point in (starts[i], ends[i])]
+    tree = KDTree(points)
+    tour = [(0, False)]
+    exclude = set([0, 1])
+    while len(tour) < count:
+        _, label, _ = tree.nearest_neighbor(exit_point(tour[-1], starts, ends), exclude)
+        segment, at_end = divmod(label, 2)
+        tour.append((segment, at_end == 1))
+        exclude.update((2 * segment, 2 * segment + 1))
+    given = [(i, False) for i in range(count)]
+    if tour_length(given, starts, ends) <= tour_length(tour, starts, ends):
+        tour = given
+
+    near = []
+    for label, labels in enumerate(nearest_labels(points, min(2 * count - 1, 2 * candidates + 1))):
+        segments = [other // 2 for other in labels]
+        near.append([other for i, other in enumerate(segments) if other != label // 2 and other not in segments[:i]])
+
+    for _ in range(max_iterations):
+        improved = two_opt(tour, starts, ends, near)
+        improved = or_opt(tour, starts, ends, near) or improved
+        if not improved:
+            break
+    return tour
+
+
+def nearest_labels(points, number):
+    """The indices of the ``number`` points closest to each point, closest first.
+
+    Sweeps outwards from each point along the points sorted by x and stops once
+    the x-distance alone exceeds the farthest of the closest points found.
+    """
+    order = sorted(range(len(points)), key=lambda i: points[i][0])
+    rank = [0] * len(points)
+    for r, i in enumerate(order):
+        rank[i] = r
+    result = []
+    for i, point in enumerate(points):
+        best = []
+        for step in (1, -1):
+            r = rank[i] + step
+            while 0 <= r < len(order):
+                j = order[r]
+                dx = points[j][0] - point[0]
+                if len(best) == number and dx * dx > -best[0][0]:
+                    break
+                d2 = dx * dx + (points[j][1] - point[1]) ** 2 + (points[j][2] - point[2]) ** 2
+                if len(best) < number:
+                    heappush(best, (-d2, j))
+                elif d2 < -best[0][0]:
+                    heapreplace(best, (-d2, j))
+                r += step
+        result.append([j for _, j in sorted(best, reverse=True)])
+    return result
+
+
+def distance(a, b):
+    return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+
+def entry_point(item, starts, ends):
+    segment, reverse = item
+    return ends[segment] if reverse else starts[segment]
+
+
+def exit_point(item, starts, ends):
+    segment, reverse = item
+    return starts[segment] if reverse else ends[segment]
+
+
+def exit_label(item):
+    segment, reverse = item
+    return 2 * segment if reverse else 2 * segment + 1
+
+
+def jump(a, b, starts, ends):
+    return distance(exit_point(a, starts, ends), entry_point(b, starts, ends))
+
+
+def tour_length(tour, starts, ends):
+    """Total length of the jumps between consecutive segments of a tour."""
+    return sum(jump(a, b, starts, ends) for a, b in zip(tour[:-1], tour[1:]))
+
+
+def flipped(item):
+    return item[0], not item[1]
+
+
+def two_opt(tour, starts, ends, near):
+    """Reverses runs of segments wherever that shortens the jumps, in place.
+
+    Reversing the run ``i..j`` joins the exit of segment ``i - 1`` to the old
+    exit of segment ``j``, so only segments near that exit are tried as ``j``.
+    """
+    improved = False
+    count = len(tour)
+    position = dict((item[0], k) for k, item in enumerate(tour))
+    for i in range(1, count):
+        for segment in near[exit_label(tour[i - 1])]:
+            j = position[segment]
+            if j < i:
+                continue
+            before = jump(tour[i - 1], tour[i], starts, ends)
+            after = distance(exit_point(tour[i - 1], starts, ends), exit_point(tour[j], starts, ends))
+            if j + 1 < count:
+                before += jump(tour[j], tour[j + 1], starts, ends)
+                after += distance(entry_point(tour[i], starts, ends), entry_point(tour[j + 1], starts, ends))
+            if after < before - 1e-12:
+                tour[i:j + 1] = [flipped(item) for item in reversed(tour[i:j + 1])]
+                position.update((item[0], k) for k, item in enumerate(tour[i:j + 1], i))
+                improved = True
+                break
+    return improved
+
+
+def or_opt(tour, starts, ends, near):
+    """Moves single segments next to a close segment where that shortens the jumps, in place."""
+    improved = False
+    position = dict((item[0], k) for k, item in enumerate(tour))
+    for segment in range(len(tour)):
+        i = position[segment]
+        if i == 0:
+            continue
+        item = tour[i]
+        removed = jump(tour[i - 1], item, starts, ends)
+        if i + 1 < len(tour):
+            removed += jump(item, tour[i + 1], starts, ends)
+            removed -= jump(tour[i - 1], tour[i + 1], starts, ends)
+        best = None
+        for other in set(near[2 * segment] + near[2 * segment + 1]):
+            # insert between tour[k - 1] and tour[k], right before or right after the close segment
+            for k in (position[other], position[other] + 1):
+                if k == 0 or k == i or k == i + 1:
+                    continue
+                for candidate in (item, flipped(item)):
+                    added = jump(tour[k - 1], candidate, starts, ends)
+                    if k < len(tour):
+                        added += jump(candidate, tour[k], starts, ends)
+                        added -= jump(tour[k - 1], tour[k], starts, ends)
+                    if added < removed - 1e-12 and (best is None or added < best[0]):
+                        best = (added, k, candidate)
+        if best is not None:
+            _, k, candidate = best
+            del tour[i]
+            if k > i:
+                k -= 1
+            tour.insert(k, candidate)
+            for index in range(min(i, k), max(i, k) + 1):
+                position[tour[index][0]] = index
+            improved = True
+    return improved
@@ -0,0 +1,74 @@
+try:
+    import numpy as np
+except ImportError:
+    # IronPython inside Rhino
+    np = None
+
+__all__ = ['pattern_face_index', 'operation_counts', 'operation_density']
+
+
+def pattern_face_index(mesh, width, height, face_keys=None, transpose=False):
+    """The face every pixel of a knit pattern falls on, for a mesh created with :meth:`PlannerMesh.from_surface`.
+
+    The pattern is stretched over the (u, v) grid of the mesh, with its
+    columns along u and its rows along v, or the other way round with
+    ``transpose``. Coarsened meshes are mapped through their ``u_lines`` and
+    ``v_lines``, so each face gets the pixel block of the grid cells it covers.
+
+    Args:
+        mesh (:class:`PlannerMesh`): Mesh with ``nu``, ``nv`` and face (u, v) attributes
+        width (int): Number of pattern columns
+        height (int): Number of pattern rows
+        face_keys (list): Faces to map, all in the order of ``mesh.faces()`` by default
+        transpose (bool): Runs the pattern rows along u instead of v
+
+    Returns:
+        numpy.ndarray: ``(height, width)`` positions in ``face_keys``, -1 for pixels on other faces
+    """
+    nu = mesh.attributes.get('nu')
+    nv = mesh.attributes.get('nv')
+    if nu is None or nv is None:
+        raise ValueError('Knit patterns can only be mapped on meshes created from a surface.')
+    face_keys = list(mesh.faces()) if face_keys is None else face_keys
+    grid = np.full((nu, nv), -1, dtype=int)
+    for i, key in enumerate(face_keys):
+        uv = mesh.face_uv(key)
+        if uv is not None:
+            grid[uv] = i
+    u_lines = np.asarray(mesh.attributes.get('u_lines') or range(nu + 1), dtype=float)
+    v_lines = np.asarray(mesh.attributes.get('v_lines') or range(nv + 1), dtype=float)
+    u_size, v_size = (height, width) if transpose else (width, height)
+    # Pixel centers in grid units, then the cell between the grid lines around them
+    u = np.searchsorted(u_lines, (np.arange(u_size) + 0.5) * (u_lines[-1] / u_size), side='right') - 1
+    v = np.searchsorted(v_lines, (np.arange(v_size) + 0.5) * (v_lines[-1] / v_size), side='right') - 1
+    index = grid[u[None, :], v[:, None]]
+    return index.T if transpose else index
+
+
+def operation_counts(index, str_ops_matrix, number_of_faces):
+    """Counts every knit operation per face in one binning pass.
+
+    Args:
+        index (numpy.ndarray): Face positions of the pixels from :func:`pattern_face_index`
+        str_ops_matrix (list): Operation names of the pattern, with the shape of ``index``
+        number_of_faces (int): Number of mapped faces
+
+    Returns:
+        tuple: The sorted operation names, and the ``(F, K)`` array of their counts per face
+    """
+    ops_matrix = np.asarray(str_ops_matrix).astype(str)
+    if ops_matrix.shape != index.shape:
+        raise ValueError('The pattern has {} pixels, the face index {}.'.format(ops_matrix.shape, index.shape))
+    operations, codes = np.unique(ops_matrix, return_inverse=True)
+    faces = index.reshape(-1)
+    mapped = faces >= 0
+    bins = faces[mapped] * len(operations) + codes.reshape(-1)[mapped]
+    counts = np.bincount(bins, minlength=number_of_faces * len(operations))
+    return operations.tolist(), counts.reshape(number_of_faces, len(operations))
+
+
+def operation_density(operations, counts, selected=('transfer', )):
+    """The share of the ``selected`` operations among the pixels of every face, 0 for faces without pixels."""
+    columns = [i for i, name in enumerate(operations) if name in selected]
+    totals = counts.sum(axis=1)
+    return counts[:, columns].sum(axis=1) / np.maximum(totals, 1).astype(float)
@@ -0,0 +1,137 @@
+from array import array
+
+from compas.geometry import Frame
+
+try:
+    import numpy as np
+except ImportError:
+    # IronPython inside Rhino
+    np = None
+
+__all__ = ['LayeredToolpath']
+
+
+class LayeredToolpath(object):
+    """Tool frames of all layers of a planned path, sharing one set of base frames.
+
+    Between layers only the offset of the nozzle along the frame z-axis changes,
+    so the path, the base frames, the nozzle distances and the layer thicknesses
+    are stored once as flat arrays in path order. The tool frames of a layer are
+    generated on demand, either one layer at a time with :meth:`layers` or for
+    all layers at once with :meth:`tool_origins_numpy`.
+
+    Args:
+        path (list): Node keys in path order
+        origins (list): Base frame origins, one ``[x, y, z]`` per node
+        xaxes (list): Base frame x-axes
+        yaxes (list): Base frame y-axes
+        distances (list): Nozzle distance per node
+        thicknesses (list): Layer thickness per node
+        velocities (list): Velocity per node
+        num_layers (int): Number of layers
+    """
+
+    def __init__(self, path, origins, xaxes, yaxes, distances, thicknesses, velocities, num_layers):
+        self.path = list(path)
+        self.origins = array('d', [c for xyz in origins for c in xyz])
+        self.xaxes = array('d', [c for xyz in xaxes for c in xyz])
+        self.yaxes = array('d', [c for xyz in yaxes for c in xyz])
+        self.distances = array('d', distances)
+        self.thicknesses = array('d', thicknesses)
+        self.velocities = array('d', velocities)
+        self.num_layers = num_layers
+        self._zaxes = None
+
+    def __len__(self):
+        return len(self.path)
+
+    @classmethod
+    def from_network(cls, network, num_layers, frames=None):
+        """Collects the base frames and per-node parameters along ``network.path``.
+
+        Args:
+            frames (:class:`FrameArray`): Base frames of the nodes, instead of their ``frame`` attributes
+        """
+        if frames is not None:
+            path = list(network.path)
+            rows = frames.rows(path)
+            origins, xaxes, yaxes = frames.origins[rows].tolist(), frames.xaxes[rows].tolist(), frames.yaxes[rows].tolist()
+        else:
+            path = [key for key in network.path if network.node_attribute(key, 'frame') is not None]
+            frames = [network.node_attribute(key, 'frame') for key in path]
+            origins = [frame.point for frame in frames]
+            xaxes = [frame.xaxis for frame in frames]
+            yaxes = [frame.yaxis for frame in frames]
+        return cls(path,
+                   origins,
+                   xaxes,
+                   yaxes,
+                   [network.node_attribute(key, 'distance') for key in path],
+                   [network.node_attribute(key, 'thickness') for key in path],
+                   [network.node_attribute(key, 'velocity') for key in path],
+                   num_layers)
+
+    @property
+    def zaxes(self):
+        if self._zaxes is None:
+            x, y = self.xaxes, self.yaxes
+            zaxes = array('d', [0.0]) * len(x)
+            for i in range(0, len(x), 3):
+                zaxes[i] = x[i + 1] * y[i + 2] - x[i + 2] * y[i + 1]
+                zaxes[i + 1] = x[i + 2] * y[i] - x[i] * y[i + 2]
+                zaxes[i + 2] = x[i] * y[i + 1] - x[i + 1] * y[i]
+            self._zaxes = zaxes
+        return self._zaxes
+
+    def offsets(self, n_layer):
+        """Offsets of the nozzle along the frame z-axis for one layer."""
+        factor = float(n_layer) / self.num_layers
+        return array('d', [-(d + t * factor) for d, t in zip(self.distances, self.thicknesses)])
+
+    def tool_origins(self, n_layer):
+        """Tool frame origins of one layer as a flat ``[x0, y0, z0, x1, ...]`` array."""
+        origins = array('d', self.origins)
+        z = self.zaxes
+        for i, offset in enumerate(self.offsets(n_layer)):
+            j = 3 * i
+            origins[j] += z[j] * offset
+            origins[j + 1] += z[j + 1] * offset
+            origins[j + 2] += z[j + 2] * offset
+        return origins
+
+    def tool_origins_numpy(self, layers=None):
+        """Tool frame origins of all layers in one vectorized pass.
+
+        Returns:
+            numpy.ndarray: Array of shape ``(len(layers), len(path), 3)``
+        """
+        if np is None:
+            raise ImportError('tool_origins_numpy requires NumPy')
+        layers = np.asarray(range(self.num_layers) if layers is None else layers, dtype=float)
+        origins = np.frombuffer(self.origins, dtype=float).reshape(-1, 3)
+        zaxes = np.frombuffer(self.zaxes, dtype=float).reshape(-1, 3)
+        distances = np.frombuffer(self.distances, dtype=float)
+        thicknesses = np.frombuffer(self.thicknesses, dtype=float)
+        offsets = -(distances[None, :] + thicknesses[None, :] * (layers[:, None] / self.num_layers))
+        return origins[None, :, :] + zaxes[None, :, :] * offsets[:, :, None]
+
+    def tool_frame(self, index, n_layer):
+        """The tool frame of the node at ``index`` along the path in one layer."""
+        j = 3 * index
+        factor = float(n_layer) / self.num_layers
+        offset = -(self.distances[index] + self.thicknesses[index] * factor)
+        z = self.zaxes
+        point = [self.origins[j + k] + z[j + k] * offset for k in range(3)]
+        return Frame(point, self.xaxes[j:j + 3], self.yaxes[j:j + 3])
+
+    def layer(self, n_layer):
+        """Generates the tool frames of one layer in path order."""
+        origins = self.tool_origins(n_layer)
+        for i in range(len(self.path)):
+            j = 3 * i
+            yield Frame(origins[j:j + 3], self.xaxes[j:j + 3], self.yaxes[j:j + 3])
+
+    def layers(self, layers=None):
+        """Streams ``(n_layer, tool frames)`` layer by layer, keeping one layer in memory."""
+        for n_layer in (range(self.num_layers) if layers is None else layers):
+            yield n_layer, self.layer(n_layer)
@@ -0,0 +1,118 @@
+from bisect import bisect_left, insort
+
+__all__ = ['NodeIndex']
+
+
+class NodeIndex(object):
+    """Secondary indexes over the node attributes of a network.
+
+    Nodes are bucketed by the value of each indexed attribute (for example
+    ``number_of_neighbors``), and every bucket keeps its nodes sorted by the
+    indexed coordinates. The sorted orders are built lazily on the first query
+    and then kept up to date node by node, so corner and extreme-node queries
+    cost a dictionary lookup and a bisection instead of a scan of the network.
+
+    Ties are resolved in node insertion order, like a scan over ``network.nodes()``.
+
+    Args:
+        network (:class:`compas.datastructures.Network`): The indexed network
+        attributes (tuple): Attributes indexed by equality
+        axes (tuple): Attributes indexed by sorted order
+    """
+
+    def __init__(self, network, attributes=('number_of_neighbors',), axes=('x', 'y', 'z')):
+        self.network = network
+        self.attributes = tuple(attributes)
+        self.axes = tuple(axes)
+        self.clear()
+
+    def clear(self):
+        self._rank = {}
+        self._values = {}
+        self._buckets = dict((name, {}) for name in self.attributes)
+        self._orders = {}
+
+    def __contains__(self, key):
+        return key in self._rank
+
+    def __len__(self):
+        return len(self._rank)
+
+    def _read(self, key):
+        names = self.attributes + self.axes
+        return dict(zip(names, self.network.node_attributes(key, names)))
+
+    def add(self, key):
+        """Indexes a node, or re-indexes it if it was indexed before."""
+        if key in self._rank:
+            self.update(key)
+            return
+        self._index(key, len(self._rank))
+
+    def update(self, key):
+        """Re-reads the attributes of a node after they changed on the network."""
+        rank = self._rank[key]
+        self._unindex(key)
+        self._index(key, rank)
+
+    def remove(self, key):
+        self._unindex(key)
+
+    def _index(self, key, rank):
+        self._rank[key] = rank
+        values = self._values[key] = self._read(key)
+        for name in self.attributes:
+            self._buckets[name].setdefault(values[name], set()).add(key)
+        for (name, value, axis), order in self._orders.items():
+            if name is None or values[name] == value:
+                insort(order, (values[axis], rank, key))
+
+    def _unindex(self, key):
+        values = self._values.pop(key)
+        rank = self._rank.pop(key)
+        for name in self.attributes:
+            self._buckets[name][values[name]].discard(key)
+        for (name, value, axis), order in self._orders.items():
+            if name is None or values[name] == value:
+                del order[bisect_left(order, (values[axis], rank, key))]
+
+    def order(self, axis, name=None, value=None):
+        """Nodes as ``(value, rank, key)`` sorted by ``axis``, optionally within one bucket."""
+        index = (name, value, axis)
+        if index not in self._orders:
+            if name is None:
+                keys = self._rank
+            else:
+                keys = self._buckets[name].get(value, ())
+            self._orders[index] = sorted((self._values[key][axis], self._rank[key], key) for key in keys)
+        return self._orders[index]
+
+    def supports(self, conditions, orientation):
+        return orientation in self.axes and len(conditions) <= 1 and all(name in self.attributes for name in conditions)
+
+    def query(self, conditions, orientation, func=0, idx=0):
+        """Finds a node the way :meth:`SurfacePathPlanner.get_node` does.
+
+        Args:
+            conditions (dict): At most one indexed attribute and its value
+            orientation (str): The indexed axis to sort by
+            func (int): 0 for the minimum, 1 for the maximum, 2 for the ``idx``-th value
+            idx (int): Position in the sorted values if ``func`` is 2
+
+        Returns:
+            The first node in insertion order with the selected value, or None
+        """
+        if conditions:
+            (name, value), = conditions.items()
+            order = self.order(orientation, name, value)
+        else:
+            order = self.order(orientation)
+        if not order:
+            return None
+        if func == 0:
+            return order[0][2]
+        if func == 1:
+            fval = order[-1][0]
+        else:
+            fval = order[idx][0]
+        return order[bisect_left(order, (fval, ))][2]
@@ -0,0 +1,156 @@
+import math
+
+__all__ = [
+    'PathEngine',
+    'LowestAxisEngine',
+    'BoustrophedonEngine',
+    'SpaceFillingCurveEngine',
+    'hilbert_index',
+    'morton_index'
+]
+
+
+class PathEngine(object):
+    """Base class of the path planning engines.
+
+    An engine returns the plannable node keys in print order, which
+    :meth:`SurfacePathPlanner.plan_path` turns into a path. Consecutive nodes
+    that are not mesh neighbors become interruptions, so engines can be
+    compared with :meth:`SurfacePathPlanner.select_path`.
+    """
+
+    name = 'engine'
+
+    def order(self, planner):
+        """Returns the node keys of ``planner.network`` in print order."""
+        raise NotImplementedError
+
+    def plannable(self, planner):
+        return [key for key in planner.network.nodes() if not planner.network.node_attribute(key, 'skip')]
+
+
+class LowestAxisEngine(PathEngine):
+    """The greedy neighbor walk of :meth:`SurfacePathPlanner.lowest_axis_path`."""
+
+    def __init__(self, orientation='x', alternate=False, inverse=False):
+        self.orientation = orientation
+        self.alternate = alternate
+        self.inverse = inverse
+        self.name = 'lowest_axis[{}{}{}]'.format(orientation, '-alternate' if alternate else '', '-inverse' if inverse else '')
+
+    def order(self, planner):
+        planner.lowest_axis_path(self.orientation, self.alternate, self.inverse)
+        return planner.network.path
+
+
+class BoustrophedonEngine(PathEngine):
+    """Back and forth rows over the (u, v) grid of a mesh created with :meth:`PlannerMesh.from_surface`.
+
+    Args:
+        direction (str): 'u' prints rows of constant u, 'v' rows of constant v
+        reverse (bool): Starts from the last row instead of the first
+    """
+
+    def __init__(self, direction='u', reverse=False):
+        self.direction = direction
+        self.reverse = reverse
+        self.name = 'boustrophedon[{}{}]'.format(direction, '-reverse' if reverse else '')
+
+    def order(self, planner):
+        mesh = planner.mesh
+        nu = mesh.attributes.get('nu')
+        nv = mesh.attributes.get('nv')
+        if nu is None or nv is None:
+            raise ValueError('The boustrophedon engine needs a mesh created from a surface.')
+        grid = {}
+        for key in self.plannable(planner):
+            uv = mesh.face_uv(key)
+            if uv is not None:
+                grid[uv] = key
+        rows, columns = (nu, nv) if self.direction == 'u' else (nv, nu)
+        row_range = range(rows - 1, -1, -1) if self.reverse else range(rows)
+        order = []
+        for n, row in enumerate(row_range):
+            column_range = range(columns) if n % 2 == 0 else range(columns - 1, -1, -1)
+            for column in column_range:
+                uv = (row, column) if self.direction == 'u' else (column, row)
+                key = grid.get(uv)
+                if key is not None:
+                    order.append(key)
+        return order
+
+
+class SpaceFillingCurveEngine(PathEngine):
+    """Orders the node positions along a Hilbert or Morton (Z-order) curve, for meshes without (u, v) structure.
+
+    The node coordinates are projected on the two axes with the largest extent
+    (or the given ``axes``) and snapped to a square grid of ``2**order`` cells
+    per side, by default about two cells per node along each side. The nodes
+    are then bucketed by their curve index in one linear pass; only grids with
+    more than 16 cells per node, from a large ``order``, are sorted instead.
+
+    Args:
+        curve (str): 'hilbert' or 'morton'
+        axes (str): Two of 'x', 'y', 'z', e.g. 'xy'
+        order (int): Number of bits per grid axis
+    """
+
+    def __init__(self, curve='hilbert', axes=None, order=None):
+        if curve not in ('hilbert', 'morton'):
+            raise ValueError('Unknown space-filling curve: {}'.format(curve))
+        self.curve = curve
+        self.axes = axes
+        self.grid_order = order
+        self.name = '{}{}'.format(curve, '[{}]'.format(axes) if axes else '')
+
+    def order(self, planner):
+        keys = self.plannable(planner)
+        if not keys:
+            return []
+        points = [planner.network.node_coordinates(key) for key in keys]
+        if self.axes:
+            a, b = ['xyz'.index(axis) for axis in self.axes]
+        else:
+            extents = [max(p[i] for p in points) - min(p[i] for p in points) for i in range(3)]
+            a, b = sorted(sorted(range(3), key=lambda i: -extents[i])[:2])
+        order = self.grid_order or min(16, max(1, int(math.ceil(math.log(2 * math.sqrt(len(keys)), 2)))))
+        side = 1 << order
+        amin, bmin = min(p[a] for p in points), min(p[b] for p in points)
+        scale = (side - 1) / max(max(p[a] for p in points) - amin, max(p[b] for p in points) - bmin, 1e-12)
+        index = hilbert_index if self.curve == 'hilbert' else morton_index
+        cells = [index(order, int((p[a] - amin) * scale), int((p[b] - bmin) * scale)) for p in points]
+        if side * side > 16 * len(keys):
+            return [key for _, _, key in sorted(zip(cells, range(len(keys)), keys))]
+        buckets = [None] * (side * side)
+        for cell, key in zip(cells, keys):
+            if buckets[cell] is None:
+                buckets[cell] = [key]
+            else:
+                buckets[cell].append(key)
+        return [key for bucket in buckets if bucket is not None for key in bucket]
+
+
+def hilbert_index(order, x, y):
+    """Distance of cell (x, y) along the Hilbert curve filling a ``2**order`` square."""
+    n = 1 << order
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def morton_index(order, x, y):
+    """Distance of cell (x, y) along the Morton (Z-order) curve by bit interleaving."""
+    d = 0
+    for i in range(order):
+        d |= ((x >> i) & 1) << (2 * i) | ((y >> i) & 1) << (2 * i + 1)
+    return d
@@ -0,0 +1,203 @@
+from array import array
+from bisect import bisect_right
+
+from compas.geometry import distance_point_point
+
+__all__ = ['PathMetrics']
+
+
+class PathMetrics(object):
+    """Cumulative material volume, deposition time and travel along a planned path.
+
+    The per-target values are summed up once into prefix arrays, so the
+    totals between any two targets are the difference of two entries. The
+    targets are numbered through all layers, ``layer * len(path) + i`` for
+    the node ``path[i]``, and every layer starts again at the first node. A
+    move between consecutive targets that are not mesh neighbors is a jump;
+    its length is counted both in the travel and separately.
+
+    Ranges are half-open like slices: ``volume(i, j)`` is the volume of the
+    targets ``i`` to ``j - 1``, and ``length(i, j)`` the travel from target
+    ``i`` to target ``j - 1``.
+
+    Args:
+        path (list): Node keys in path order
+        volumes (list): Material volume per node
+        times (list): Deposition time per node
+        lengths (list): Distance from every node to the next one, ``len(path) - 1`` values
+        jumps (list): Whether the move to the next node is a jump, ``len(path) - 1`` values
+        return_length (float): Distance from the last node back to the first one
+        return_jump (bool): Whether the move back to the first node is a jump
+        num_layers (int): Number of layers
+    """
+
+    def __init__(self, path, volumes, times, lengths, jumps, return_length=0.0, return_jump=True, num_layers=1):
+        self.path = list(path)
+        self.num_layers = num_layers
+        self.return_length = return_length
+        self.return_jump = bool(return_jump) and len(self.path) > 1
+        lengths = list(lengths)
+        jumps = list(jumps)
+        if len(jumps) != len(lengths):
+            raise ValueError('Expected one jump flag per move, got {} for {} moves.'.format(len(jumps), len(lengths)))
+        self.volume_sums = self._prefix_sums(volumes)
+        self.time_sums = self._prefix_sums(times)
+        # Lengths up to a target, one entry per node
+        self.length_sums = self._prefix_sums(lengths)
+        self.jump_length_sums = self._prefix_sums(length if jump else 0.0 for length, jump in zip(lengths, jumps))
+        self.jump_counts = array('i', [0])
+        for jump in jumps:
+            self.jump_counts.append(self.jump_counts[-1] + (1 if jump else 0))
+        if len(self.length_sums) != max(len(self.path), 1) or len(self.volume_sums) != len(self.path) + 1:
+            raise ValueError('Expected one volume and time per node and one length per move.')
+
+    def __len__(self):
+        return len(self.path) * self.num_layers
+
+    @staticmethod
+    def _prefix_sums(values):
+        sums = array('d', [0.0])
+        total = 0.0
+        for value in values:
+            total += value
+            sums.append(total)
+        return sums
+
+    @classmethod
+    def from_network(cls, network, flowrate, scale=1.0, num_layers=1):
+        """Collects the node volumes and the moves along ``network.path``.
+
+        The volume of a node is its ``area`` times its ``thickness``, and its
+        deposition time the volume over the flowrate, the time the nozzle
+        needs to cross the node at the velocity of
+        :meth:`SurfacePathPlanner.set_node_velocity`.
+
+        Args:
+            flowrate (float): Material flowrate in l/hr
+            scale (float): Scale of the node coordinates, as for the node areas
+        """
+        path = list(network.path)
+        volumes = [network.node_attribute(key, 'area') * network.node_attribute(key, 'thickness') for key in path]
+        rate = flowrate / 60.0
+        times = [volume / rate for volume in volumes]
+        points = [network.node_coordinates(key) for key in path]
+        lengths = [scale * distance_point_point(a, b) for a, b in zip(points[:-1], points[1:])]
+        jumps = [following not in network.node_attribute(current, 'neighbors')
+                 for current, following in zip(path[:-1], path[1:])]
+        if path:
+            return_length = scale * distance_point_point(points[-1], points[0])
+            return_jump = path[0] not in network.node_attribute(path[-1], 'neighbors')
+        else:
+            return_length, return_jump = 0.0, False
+        return cls(path, volumes, times, lengths, jumps, return_length, return_jump, num_layers)
+
+    def _split(self, index):
+        n = len(self.path)
+        if index < 0 or index > len(self):
+            raise IndexError('Target {} is outside of the {} targets of the path.'.format(index, len(self)))
+        if index == len(self):
+            return self.num_layers - 1, n
+        return divmod(index, n)
+
+    def _range(self, start, stop):
+        stop = len(self) if stop is None else stop
+        if stop < start:
+            raise ValueError('The range ends at target {} before it starts at {}.'.format(stop, start))
+        return start, stop
+
+    def _cumulative(self, sums, index):
+        """Sum of the per-node ``sums`` over the targets before ``index``."""
+        layer, i = self._split(index)
+        return layer * sums[-1] + sums[i]
+
+    def _travel_to(self, sums, return_value, index):
+        """Sum of the per-move ``sums`` from the first target to target ``index``, an existing target."""
+        layer, i = divmod(index, len(self.path))
+        return layer * (sums[-1] + return_value) + sums[i]
+
+    def _moves(self, sums, return_value, start, stop):
+        start, stop = self._range(start, stop)
+        if stop - start < 2:
+            return 0.0
+        return self._travel_to(sums, return_value, stop - 1) - self._travel_to(sums, return_value, start)
+
+    def volume(self, start=0, stop=None):
+        """Material volume of the targets ``start`` to ``stop - 1``, of all targets by default."""
+        start, stop = self._range(start, stop)
+        return self._cumulative(self.volume_sums, stop) - self._cumulative(self.volume_sums, start)
+
+    def time(self, start=0, stop=None):
+        """Deposition time of the targets ``start`` to ``stop - 1``."""
+        start, stop = self._range(start, stop)
+        return self._cumulative(self.time_sums, stop) - self._cumulative(self.time_sums, start)
+
+    def length(self, start=0, stop=None):
+        """Travel from target ``start`` to target ``stop - 1``, jumps included."""
+        return self._moves(self.length_sums, self.return_length, start, stop)
+
+    def jump_length(self, start=0, stop=None):
+        """Travel across jumps from target ``start`` to target ``stop - 1``."""
+        return self._moves(self.jump_length_sums, self.return_length if self.return_jump else 0.0, start, stop)
+
+    def jumps(self, start=0, stop=None):
+        """Number of jumps from target ``start`` to target ``stop - 1``."""
+        return int(self._moves(self.jump_counts, 1 if self.return_jump else 0, start, stop))
+
+    def target_at_volume(self, volume):
+        """The first target that is not fully printed with ``volume`` of material, e.g. to plan a pump refill.
+
+        Returns:
+            int: A target index, ``len(self)`` if the volume suffices for all targets
+        """
+        total = self.volume_sums[-1]
+        if total <= 0.0 or volume >= total * self.num_layers:
+            return len(self)
+        layer = int(volume // total)
+        rest = volume - layer * total
+        return layer * len(self.path) + bisect_right(self.volume_sums, rest) - 1
+
+    def batches(self, volume):
+        """Splits the targets into consecutive batches of at most ``volume`` of material each.
+
+        A single target larger than ``volume`` gets a batch of its own.
+
+        Returns:
+            list: The first target of every batch
+        """
+        if volume <= 0.0:
+            raise ValueError('The batch volume has to be positive.')
+        starts = []
+        start = 0
+        while start < len(self):
+            starts.append(start)
+            stop = self.target_at_volume(self._cumulative(self.volume_sums, start) + volume)
+            start = max(stop, start + 1)
+        return starts
+
+    def layer_report(self):
+        """Volume, time and travel of every layer, with running totals for material batching.
+
+        The move from the end of a layer to the start of the next one is
+        counted in the earlier layer.
+
+        Returns:
+            list: One dict per layer
+        """
+        n = len(self.path)
+        report = []
+        for layer in range(self.num_layers if n else 0):
+            start, stop = layer * n, (layer + 1) * n
+            end = min(stop + 1, len(self))
+            report.append({
+                'layer': layer,
+                'start': start,
+                'targets': n,
+                'volume': self.volume(start, stop),
+                'time': self.time(start, stop),
+                'length': self.length(start, end),
+                'jump_length': self.jump_length(start, end),
+                'jumps': self.jumps(start, end),
+                'cumulative_volume': self.volume(0, stop),
+                'cumulative_time': self.time(0, stop),
+            })
+        return report
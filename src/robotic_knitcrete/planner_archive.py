@@ -0,0 +1,301 @@
+import json
+import math
+import os
+
+from compas.colors import Color, ColorMap
+from compas.geometry import Frame
+
+from .frame_array import FrameArray, np
+from .layered_toolpath import LayeredToolpath
+from .planner_mesh import PlannerMesh
+from .toolpath_exporter import Target, quaternion_from_axes
+
+__all__ = ['PlannerArchive', 'save_planner']
+
+ARCHIVE_VERSION = 1
+MANIFEST = 'planner.json'
+NODE_FIELDS = ['thickness', 'radius', 'area', 'velocity', 'distance']
+
+
+def save_planner(planner, path):
+    """Saves the state of a planner as NumPy columns.
+
+    A path ending in ``.npz`` is written as a single uncompressed archive,
+    any other path as a directory of ``.npy`` files next to a JSON manifest,
+    which :meth:`PlannerArchive.load` can memory-map.
+
+    Args:
+        planner (:class:`SurfacePathPlanner`): The planner to save
+        path (str): A ``.npz`` file or a directory
+    """
+    if np is None:
+        raise ImportError('Saving a planner requires NumPy')
+    columns, meta = planner_columns(planner)
+    if path.endswith('.npz'):
+        columns['manifest'] = np.array(json.dumps(meta))
+        np.savez(path, **columns)
+        return
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name, column in columns.items():
+        np.save(os.path.join(path, name + '.npy'), column)
+    with open(os.path.join(path, MANIFEST), 'w') as f:
+        json.dump(meta, f, indent=4, sort_keys=True)
+
+
+def planner_columns(planner):
+    mesh = planner.mesh
+    network = planner.network
+    columns = {}
+
+    vertices = list(mesh.vertices())
+    columns['vertex_keys'] = np.array(vertices, dtype=np.int64)
+    columns['vertex_xyz'] = np.array([mesh.vertex_coordinates(key) for key in vertices], dtype=float).reshape(-1, 3)
+    columns['vertex_rgb'] = np.array([mesh.vertex_attributes(key, 'rgb') for key in vertices], dtype=float).reshape(-1, 3)
+    faces = list(mesh.faces())
+    face_vertices = np.full((len(faces), 4), -1, dtype=np.int64)
+    face_uv = np.full((len(faces), 2), -1, dtype=np.int64)
+    for i, key in enumerate(faces):
+        corners = mesh.face_vertices(key)
+        face_vertices[i, :len(corners)] = corners
+        uv = mesh.face_uv(key)
+        if uv is not None:
+            face_uv[i] = uv
+    columns['face_keys'] = np.array(faces, dtype=np.int64)
+    columns['face_vertices'] = face_vertices
+    columns['face_uv'] = face_uv
+    field_indices = planner.field_indices or {}
+    columns['field_indices'] = np.array([field_indices.get(key, -1) for key in faces], dtype=np.int64)
+
+    nodes = list(network.nodes())
+    columns['node_keys'] = np.array(nodes, dtype=np.int64)
+    columns['node_xyz'] = np.array([network.node_coordinates(key) for key in nodes], dtype=float).reshape(-1, 3)
+    columns['node_normal'] = np.array([network.node_attributes(key, ['vx', 'vy', 'vz']) for key in nodes], dtype=float).reshape(-1, 3)
+    columns['node_rgb'] = np.array([network.node_attribute(key, 'color').rgb for key in nodes], dtype=float).reshape(-1, 3)
+    columns['node_skip'] = np.array([bool(network.node_attribute(key, 'skip')) for key in nodes], dtype=bool)
+    for name in NODE_FIELDS:
+        columns['node_' + name] = np.array([network.node_attribute(key, name) or 0.0 for key in nodes], dtype=float)
+    offsets = [0]
+    neighbors = []
+    for key in nodes:
+        neighbors.extend(network.node_attribute(key, 'neighbors'))
+        offsets.append(len(neighbors))
+    columns['neighbor_offsets'] = np.array(offsets, dtype=np.int64)
+    columns['neighbor_keys'] = np.array(neighbors, dtype=np.int64)
+
+    for name in ('frame', 'tool_frame'):
+        origins, orientations = node_frames(planner, nodes, name)
+        columns[name + '_origins'] = origins
+        columns[name + '_orientations'] = orientations
+
+    columns['path'] = np.array(network.path, dtype=np.int64)
+    columns['skipped_faces'] = np.array(sorted(planner.skipped_faces), dtype=np.int64)
+    columns['thickness_map'] = np.array(planner.thickness_map or [], dtype=float)
+    colors = planner.color_map.colors if planner.color_map is not None else []
+    columns['color_map'] = np.array([color.rgb for color in colors], dtype=float).reshape(-1, 3)
+
+    meta = {
+        'version': ARCHIVE_VERSION,
+        'mesh_name': mesh.name,
+        'mesh_attributes': dict((key, value) for key, value in mesh.attributes.items() if key != 'name'),
+        'fabrication_parameters': planner.fabrication_parameters,
+        'layer_parameters': planner.layer_parameters,
+        'batch_frames': planner.batch_frames,
+        'has_color_map': planner.color_map is not None,
+        'has_thickness_map': planner.thickness_map is not None,
+        'has_field_indices': planner.field_indices is not None,
+    }
+    return columns, meta
+
+
+def node_frames(planner, nodes, name):
+    """Frames of the nodes as arrays, NaN for nodes without one."""
+    origins = np.full((len(nodes), 3), np.nan)
+    orientations = np.full((len(nodes), 3, 3), np.nan)
+    if planner.batch_frames:
+        frames = planner.frames if name == 'frame' else planner.tool_frames
+        if frames is not None:
+            known = [i for i, key in enumerate(nodes) if key in frames]
+            rows = frames.rows([nodes[i] for i in known])
+            origins[known] = frames.origins[rows]
+            orientations[known] = frames.orientations[rows]
+        return origins, orientations
+    for i, key in enumerate(nodes):
+        frame = planner.network.node_attribute(key, name)
+        if frame is not None:
+            origins[i] = frame.point
+            orientations[i] = [frame.xaxis, frame.yaxis, frame.zaxis]
+    return origins, orientations
+
+
+class PlannerArchive(object):
+    """A saved planner state, read column by column.
+
+    Columns of a directory archive are memory-mapped, so opening an archive
+    and streaming its path or targets does not build any mesh, network or
+    compas frame. :meth:`to_planner` restores a full :class:`SurfacePathPlanner`.
+
+    Args:
+        columns (dict): NumPy arrays by name
+        meta (dict): The manifest
+    """
+
+    def __init__(self, columns, meta):
+        self.columns = columns
+        self.meta = meta
+        self._rows = None
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Opens an archive written by :func:`save_planner`.
+
+        Args:
+            path (str): A ``.npz`` file or an archive directory
+            mmap (bool): Memory-maps the columns of a directory archive
+        """
+        if np is None:
+            raise ImportError('Loading a planner requires NumPy')
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                columns = dict(data)
+            meta = json.loads(str(columns.pop('manifest')))
+        else:
+            with open(os.path.join(path, MANIFEST)) as f:
+                meta = json.load(f)
+            columns = {}
+            for filename in os.listdir(path):
+                if filename.endswith('.npy'):
+                    columns[filename[:-4]] = np.load(os.path.join(path, filename), mmap_mode='r' if mmap else None)
+        if meta.get('version') != ARCHIVE_VERSION:
+            raise ValueError('Unsupported planner archive version: {}'.format(meta.get('version')))
+        return cls(columns, meta)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def path(self):
+        return self.columns['path']
+
+    def rows(self, keys):
+        """Node rows of the given node keys."""
+        if self._rows is None:
+            node_keys = self.columns['node_keys']
+            order = np.argsort(node_keys, kind='stable')
+            self._rows = (node_keys[order], order)
+        sorted_keys, order = self._rows
+        return order[np.searchsorted(sorted_keys, np.asarray(keys))]
+
+    def toolpath(self, num_layers=None):
+        """The :class:`LayeredToolpath` of the saved path and node parameters.
+
+        Args:
+            num_layers (int): Defaults to the layers of the last fabrication parameter calculation
+        """
+        if num_layers is None:
+            num_layers = (self.meta['layer_parameters'] or {}).get('num_layers', 1)
+        rows = self.rows(self.path)
+        rows = rows[~np.isnan(self.columns['frame_origins'][rows, 0])]
+        orientations = self.columns['frame_orientations'][rows]
+        return LayeredToolpath(self.columns['node_keys'][rows].tolist(),
+                               self.columns['frame_origins'][rows].tolist(),
+                               orientations[:, 0].tolist(),
+                               orientations[:, 1].tolist(),
+                               self.columns['node_distance'][rows].tolist(),
+                               self.columns['node_thickness'][rows].tolist(),
+                               self.columns['node_velocity'][rows].tolist(),
+                               num_layers)
+
+    def targets(self):
+        """Streams the saved tool frames along the path like :func:`network_targets`."""
+        n_layer = (self.meta['layer_parameters'] or {}).get('n_layer', 0)
+        origins = self.columns['tool_frame_origins']
+        orientations = self.columns['tool_frame_orientations']
+        xyz = self.columns['node_xyz']
+        velocities = self.columns['node_velocity']
+        index = 0
+        for node, row in zip(self.path.tolist(), self.rows(self.path).tolist()):
+            origin = origins[row].tolist()
+            if math.isnan(origin[0]):
+                continue
+            x, y, z = orientations[row].tolist()
+            qw, qx, qy, qz = quaternion_from_axes(x, y, z)
+            distance = math.sqrt(sum((a - b) ** 2 for a, b in zip(origin, xyz[row].tolist())))
+            yield Target(n_layer, index, node, origin[0], origin[1], origin[2], qw, qx, qy, qz, float(velocities[row]), distance)
+            index += 1
+
+    def to_planner(self):
+        """Restores the mesh, network, path, maps and parameters into a new :class:`SurfacePathPlanner`."""
+        from .surface_path_planner import SurfacePathPlanner
+        columns = self.columns
+        planner = SurfacePathPlanner()
+        planner.fabrication_parameters.update(self.meta['fabrication_parameters'])
+        planner.layer_parameters = self.meta['layer_parameters']
+        if self.meta['has_thickness_map']:
+            planner.thickness_map = columns['thickness_map'].tolist()
+        if self.meta['has_color_map']:
+            planner.color_map = ColorMap([Color(*rgb) for rgb in columns['color_map'].tolist()])
+
+        mesh = PlannerMesh(name=self.meta['mesh_name'])
+        mesh.attributes.update(self.meta['mesh_attributes'])
+        for key, xyz, rgb in zip(columns['vertex_keys'].tolist(), columns['vertex_xyz'].tolist(), columns['vertex_rgb'].tolist()):
+            mesh.add_vertex(key, x=xyz[0], y=xyz[1], z=xyz[2], r=rgb[0], g=rgb[1], b=rgb[2])
+        for key, corners, uv in zip(columns['face_keys'].tolist(), columns['face_vertices'].tolist(), columns['face_uv'].tolist()):
+            attr = {'u': uv[0], 'v': uv[1]} if uv[0] >= 0 else {}
+            mesh.add_face([vertex for vertex in corners if vertex >= 0], fkey=key, attr_dict=attr)
+        planner.set_quad_mesh(mesh)
+        if self.meta['has_field_indices']:
+            planner.field_indices = dict((key, n) for key, n in zip(columns['face_keys'].tolist(), columns['field_indices'].tolist()) if n >= 0)
+
+        network = planner.network
+        offsets = columns['neighbor_offsets'].tolist()
+        neighbor_keys = columns['neighbor_keys'].tolist()
+        fields = [columns['node_' + name].tolist() for name in NODE_FIELDS]
+        frame_origins = columns['frame_origins']
+        tool_origins = columns['tool_frame_origins']
+        for i, key in enumerate(columns['node_keys'].tolist()):
+            xyz = columns['node_xyz'][i].tolist()
+            normal = columns['node_normal'][i].tolist()
+            color = Color(*columns['node_rgb'][i].tolist())
+            neighbors = neighbor_keys[offsets[i]:offsets[i + 1]]
+            attr = {
+                'x': xyz[0], 'y': xyz[1], 'z': xyz[2],
+                'vx': normal[0], 'vy': normal[1], 'vz': normal[2],
+                'r': color.rgb255[0], 'g': color.rgb255[1], 'b': color.rgb255[2],
+                'color': color,
+                'skip': bool(columns['node_skip'][i]),
+                'neighbors': neighbors,
+                'number_of_neighbors': len(neighbors),
+            }
+            attr.update((name, values[i]) for name, values in zip(NODE_FIELDS, fields))
+            if not self.meta['batch_frames']:
+                if not math.isnan(frame_origins[i, 0]):
+                    attr['frame'] = self.frame(i, 'frame')
+                if not math.isnan(tool_origins[i, 0]):
+                    attr['tool_frame'] = self.frame(i, 'tool_frame')
+            network.add_node(key=key, attr_dict=attr)
+            planner.node_index.add(key)
+        path = columns['path'].tolist()
+        network.path = path
+        for current, following in zip(path[:-1], path[1:]):
+            network.add_edge(current, following)
+        planner.skipped_faces = set(columns['skipped_faces'].tolist())
+
+        if self.meta['batch_frames']:
+            planner.batch_frames = True
+            planner.frames = self.frame_array('frame')
+            planner.tool_frames = self.frame_array('tool_frame')
+        return planner
+
+    def frame(self, row, name='frame'):
+        origin = self.columns[name + '_origins'][row].tolist()
+        x, y, _ = self.columns[name + '_orientations'][row].tolist()
+        return Frame(origin, x, y)
+
+    def frame_array(self, name):
+        known = ~np.isnan(self.columns[name + '_origins'][:, 0])
+        if not known.any():
+            return None
+        return FrameArray(self.columns['node_keys'][known].tolist(),
+                          self.columns[name + '_origins'][known],
+                          self.columns[name + '_orientations'][known])
@@ -1,5 +1,8 @@
+import math
+from array import array
+
 from compas.datastructures import Mesh
-from compas.geometry import distance_point_point
+from compas.geometry import angle_vectors, distance_point_point
 from itertools import product
 from compas.colors import Color
 
@@ -7,7 +10,7 @@ class PlannerMesh(Mesh):
     def __init__(self, name=None, default_vertex_attributes=None, default_edge_attributes=None, default_face_attributes=None):
         _default_vertex_attributes = {'x': 0.0, 'y': 0.0, 'z': 0.0, 'r':0.0, 'g':0.0, 'b':0.0}
         _default_edge_attributes = {}
-        _default_face_attributes = {}
+        _default_face_attributes = {'u': None, 'v': None}
         if default_vertex_attributes:
             _default_vertex_attributes.update(default_vertex_attributes)
         if default_edge_attributes:
@@ -61,7 +64,134 @@ class PlannerMesh(Mesh):
             (i + 1) * (nv + 1) + j + 1,
             i * (nv + 1) + j + 1
         ] for i, j in product(range(nu), range(nv))]
-        return cls.from_vertices_and_faces(vertices, faces)
+        mesh = cls.from_vertices_and_faces(vertices, faces)
+        mesh.attributes.update({'nu': nu, 'nv': nv})
+        for key, (i, j) in zip(mesh.faces(), product(range(nu), range(nv))):
+            mesh.face_attributes(key, ['u', 'v'], [i, j])
+        return mesh
+
+    def face_uv(self, key):
+        """The (u, v) grid index of a face of a mesh created with :meth:`from_surface`, or None."""
+        u, v = self.face_attributes(key, ['u', 'v'])
+        if u is None or v is None:
+            return None
+        return u, v
+
+    def coarsened(self, angle=5.0, color_tolerance=0.05, max_span=8):
+        """A coarser quad grid of a mesh created with :meth:`from_surface`.
+
+        Grid lines of constant u and v are dropped where the faces on both
+        sides have nearly the same normal and color, and kept where the
+        surface bends or the thickness color changes. Whole lines are removed,
+        so the result is still a conforming quad grid with valid neighbors,
+        areas and (u, v) indices.
+
+        This is not local coarsening: a line is kept along its whole length
+        if it is needed anywhere. A flat region only gets fewer, larger faces
+        where the lines crossing it are flat everywhere, and a flat half next
+        to a curved half is still split by every u line of the curved half
+        when the two halves meet along v.
+
+        Args:
+            angle (float): Largest normal turn in degrees merged into one face
+            color_tolerance (float): Largest face color change (0 to 1 per channel) merged into one face
+            max_span (int): Largest number of faces of this mesh merged along u or v
+
+        Returns:
+            :class:`PlannerMesh`: The coarse mesh. It keeps the vertex keys of
+            this mesh, and its ``u_lines`` and ``v_lines`` attributes hold the
+            kept grid lines.
+        """
+        nu = self.attributes.get('nu')
+        nv = self.attributes.get('nv')
+        grid = {}
+        for key in self.faces():
+            uv = self.face_uv(key)
+            if uv is not None:
+                grid[uv] = key
+        if nu is None or nv is None or len(grid) != nu * nv:
+            raise ValueError('Only complete grids created from a surface can be coarsened.')
+
+        corners = {}
+        normals = {}
+        colors = {}
+        for (i, j), key in grid.items():
+            vertices = self.face_vertices(key)
+            for corner, vertex in zip([(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1)], vertices):
+                corners[corner] = vertex
+            normals[i, j] = self.face_normal(key)
+            rgb = [self.vertex_attributes(vertex, 'rgb') for vertex in vertices]
+            colors[i, j] = [sum(channel) / (255.0 * len(rgb)) for channel in zip(*rgb)]
+
+        def change(a, b):
+            return (math.degrees(angle_vectors(normals[a], normals[b])),
+                    max(abs(x - y) for x, y in zip(colors[a], colors[b])))
+
+        def kept_lines(size, changes):
+            lines = [0]
+            turn = variation = 0.0
+            for line in range(1, size):
+                line_turn, line_variation = changes(line)
+                if (turn + line_turn <= angle and variation + line_variation <= color_tolerance and
+                        line + 1 - lines[-1] <= max_span):
+                    turn += line_turn
+                    variation += line_variation
+                else:
+                    lines.append(line)
+                    turn = variation = 0.0
+            lines.append(size)
+            return lines
+
+        def changes_across(pairs):
+            values = [change(a, b) for a, b in pairs]
+            return max(value[0] for value in values), max(value[1] for value in values)
+
+        u_lines = kept_lines(nu, lambda i: changes_across(((i - 1, j), (i, j)) for j in range(nv)))
+        v_lines = kept_lines(nv, lambda j: changes_across(((i, j - 1), (i, j)) for i in range(nu)))
+
+        mesh = self.__class__()
+        mesh.attributes.update(self.attributes)
+        mesh.attributes.update({'nu': len(u_lines) - 1, 'nv': len(v_lines) - 1, 'u_lines': u_lines, 'v_lines': v_lines})
+        for i in u_lines:
+            for j in v_lines:
+                vertex = corners[i, j]
+                mesh.add_vertex(vertex, attr_dict=self.vertex_attributes(vertex))
+        for u, (i0, i1) in enumerate(zip(u_lines, u_lines[1:])):
+            for v, (j0, j1) in enumerate(zip(v_lines, v_lines[1:])):
+                mesh.add_face([corners[i0, j0], corners[i1, j0], corners[i1, j1], corners[i0, j1]],
+                              attr_dict={'u': u, 'v': v})
+        return mesh
+
+    def covered_faces(self, coarse):
+        """The faces of this mesh inside each face of a mesh created from it with :meth:`coarsened`.
+
+        Args:
+            coarse (:class:`PlannerMesh`): The coarse mesh
+
+        Returns:
+            dict: Lists of face keys of this mesh by coarse face key
+        """
+        grid = dict((self.face_uv(key), key) for key in self.faces())
+        u_lines = coarse.attributes['u_lines']
+        v_lines = coarse.attributes['v_lines']
+        covered = {}
+        for key in coarse.faces():
+            u, v = coarse.face_uv(key)
+            covered[key] = [grid[i, j] for i in range(u_lines[u], u_lines[u + 1])
+                            for j in range(v_lines[v], v_lines[v + 1])]
+        return covered
+
+    def submesh(self, faces):
+        """A mesh of the given faces that keeps their vertex and face keys and attributes."""
+        mesh = self.__class__()
+        mesh.attributes.update(self.attributes)
+        for face in faces:
+            vertices = self.face_vertices(face)
+            for vertex in vertices:
+                if not mesh.has_vertex(vertex):
+                    mesh.add_vertex(vertex, attr_dict=self.vertex_attributes(vertex))
+            mesh.add_face(vertices, fkey=face, attr_dict=self.face_attributes(face))
+        return mesh
 
     def vertex_color(self, key, color_type='rgb'):
         color = Color.from_rgb255(
@@ -80,3 +210,23 @@ class PlannerMesh(Mesh):
         b = (vtx_colors[0].b + vtx_colors[1].b + vtx_colors[2].b + vtx_colors[3].b)/4
         face_color = Color(r,g,b)
         return face_color
+
+    def face_adjacency_arrays(self):
+        """Face adjacency in compressed sparse row form.
+
+        Returns
+        -------
+        tuple
+            ``keys``, the face keys in iteration order, and the integer arrays
+            ``offsets`` and ``indices``. The neighbors of ``keys[i]`` are
+            ``keys[j] for j in indices[offsets[i]:offsets[i + 1]]``, in the
+            order of :meth:`face_neighbors`.
+        """
+        keys = list(self.faces())
+        index = dict((key, i) for i, key in enumerate(keys))
+        offsets = array('i', [0])
+        indices = array('i')
+        for key in keys:
+            indices.extend(index[nbr] for nbr in self.face_neighbors(key))
+            offsets.append(len(indices))
+        return keys, offsets, indices
@@ -0,0 +1,373 @@
+"""A local planning daemon that keeps :class:`SurfacePathPlanner` sessions warm.
+
+Grasshopper rebuilds its planner on every solution. The daemon instead holds
+one planner per session and takes requests as JSON lines over a local TCP or
+Unix socket. Mesh and parameter deltas update the session in place, every
+pipeline stage is only run again when its inputs changed, and ``plan``
+returns only the targets that changed since the previous response.
+
+Start it with::
+
+    python -m robotic_knitcrete.planning_service --port 8765
+
+and talk to it from Grasshopper with :class:`PlanningClient`.
+"""
+import argparse
+import hashlib
+import json
+import socket
+import threading
+import uuid
+
+try:
+    import socketserver
+except ImportError:
+    # IronPython 2.7
+    import SocketServer as socketserver
+
+from compas.colors import Color
+
+from .path_engines import BoustrophedonEngine, LowestAxisEngine, SpaceFillingCurveEngine
+from .planner_mesh import PlannerMesh
+from .toolpath_exporter import network_targets
+
+__all__ = ['PlanningSession', 'PlanningService', 'PlanningClient', 'serve']
+
+ENGINES = {
+    'lowest_axis': LowestAxisEngine,
+    'boustrophedon': BoustrophedonEngine,
+    'space_filling_curve': SpaceFillingCurveEngine,
+}
+
+
+def fingerprint(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class PlanningSession(object):
+    """One planner kept in memory, with the inputs its stages were last run with.
+
+    Stages run in order: ``nodes`` (network nodes from the mesh), ``path``
+    (path engine, region planning and jump optimization) and ``fabrication``
+    (fabrication parameters of one layer). Each stage stores the key of its
+    inputs and is skipped while the key stays the same.
+    """
+
+    def __init__(self):
+        self.planner = new_planner()
+        self.lock = threading.Lock()
+        self.mesh_key = None
+        self.mesh_version = 0
+        self.path_version = 0
+        self.engine = {'name': 'lowest_axis'}
+        self.options = {'regions': False, 'optimize_jumps': False}
+        self.layer = None
+        self.stage_keys = {}
+        self.sent_path = None
+        self.sent_targets = {}
+
+    def set_mesh(self, data=None, vertices=None, faces=None, colors=None, attributes=None):
+        """Replaces the mesh, given as compas mesh ``data`` or as vertex, face and color lists.
+
+        Returns:
+            bool: False if the mesh is the one the session already has
+        """
+        key = fingerprint([data, vertices, faces, colors, attributes])
+        if key == self.mesh_key:
+            return False
+        if data is not None:
+            mesh = PlannerMesh.from_data(data)
+        else:
+            mesh = PlannerMesh.from_vertices_and_faces(vertices, faces)
+            for vertex, rgb in zip(mesh.vertices(), colors or []):
+                mesh.vertex_attributes(vertex, 'rgb', rgb)
+        mesh.attributes.update(attributes or {})
+        self.planner = new_planner(self.planner)
+        self.planner.set_quad_mesh(mesh)
+        self.mesh_key = key
+        self.mesh_version += 1
+        return True
+
+    def update_mesh(self, vertex_coordinates=None, vertex_colors=None, skip=None):
+        """Applies vertex and skip deltas, which the next :meth:`plan` repairs the path for with :meth:`SurfacePathPlanner.replan`.
+
+        Args:
+            vertex_coordinates (dict): ``[x, y, z]`` by vertex key
+            vertex_colors (dict): ``[r, g, b]`` (0-255) by vertex key
+            skip (dict): True or False by face key
+        """
+        planner = self.planner
+        for vertex, xyz in (vertex_coordinates or {}).items():
+            planner.set_vertex_coordinates(int(vertex), xyz)
+        for vertex, rgb in (vertex_colors or {}).items():
+            planner.set_vertex_color(int(vertex), rgb)
+        for face, value in (skip or {}).items():
+            planner.set_face_skip([int(face)], value)
+        self.mesh_key = None
+
+    def set_parameters(self, fabrication=None, thickness_map=None, colors=None, layer=None, engine=None,
+                       regions=None, optimize_jumps=None):
+        """Updates the parameters the following :meth:`plan` calls run with.
+
+        Args:
+            fabrication (dict): Entries of :attr:`SurfacePathPlanner.fabrication_parameters`
+            thickness_map (list): Thicknesses for :meth:`SurfacePathPlanner.set_thickness_map`
+            colors (list): ``[r, g, b]`` (0-255) colors for :meth:`SurfacePathPlanner.set_color_map`
+            layer (dict): ``num_layers``, ``n_layer``, ``scale`` and optionally ``measured``
+            engine (dict): ``name`` of the path engine in :data:`ENGINES` and its arguments
+            regions (bool): Plans disconnected regions separately
+            optimize_jumps (bool): Shortens the jumps between path segments
+        """
+        planner = self.planner
+        if fabrication:
+            planner.set_fabrication_parameters(**fabrication)
+        if thickness_map is not None:
+            planner.set_thickness_map(thickness_map)
+        if colors is not None:
+            planner.set_color_map([Color.from_rgb255(*rgb) for rgb in colors])
+        if layer is not None:
+            self.layer = dict(layer)
+        if engine is not None:
+            self.engine = dict(engine)
+        if regions is not None:
+            self.options['regions'] = regions
+        if optimize_jumps is not None:
+            self.options['optimize_jumps'] = optimize_jumps
+
+    def path_engine(self):
+        arguments = dict(self.engine)
+        name = arguments.pop('name')
+        if name not in ENGINES:
+            raise ValueError('Unknown path engine: {}'.format(name))
+        return ENGINES[name](**arguments)
+
+    def run_stage(self, name, key, func):
+        """Runs ``func`` unless the stage already ran with the same key."""
+        if self.stage_keys.get(name) == key:
+            return False
+        func()
+        self.stage_keys[name] = key
+        # Later stages depend on this one
+        stages = ['nodes', 'path', 'fabrication']
+        for later in stages[stages.index(name) + 1:]:
+            self.stage_keys.pop(later, None)
+        return True
+
+    def plan(self, full=False):
+        """Runs the stages whose inputs changed and returns the changed targets.
+
+        Args:
+            full (bool): Returns the path and all targets instead of the changes
+
+        Returns:
+            dict: ``stages`` (which stages ran), ``path`` (only if it changed),
+            ``targets`` (target values by node key, see :class:`Target`),
+            ``removed`` (nodes no longer on the path) and the ``report`` of
+            :meth:`SurfacePathPlanner.path_report`
+        """
+        planner = self.planner
+        if planner.mesh is None:
+            raise ValueError('The session has no mesh yet.')
+        ran = {}
+        ran['nodes'] = self.run_stage('nodes', self.mesh_version, planner.set_network_nodes)
+        ran['replan'] = bool(planner.dirty_faces or planner.skip_edits)
+        if ran['replan']:
+            planner.replan()
+        ran['path'] = self.run_stage('path', fingerprint([self.engine, self.options]), self.plan_path)
+        if self.layer is not None:
+            key = fingerprint([self.path_version, self.layer, planner.fabrication_parameters, planner.thickness_map])
+            ran['fabrication'] = self.run_stage('fabrication', key, lambda: planner.calculate_fabrication_parameters(**self.layer))
+
+        if full:
+            self.sent_path = None
+            self.sent_targets = {}
+        result = {'stages': ran, 'report': planner.path_report()}
+        if planner.network.path != self.sent_path:
+            result['path'] = self.sent_path = list(planner.network.path)
+        targets = {}
+        for target in network_targets(planner):
+            values = list(target[3:])
+            if self.sent_targets.get(target.node) != values:
+                targets[target.node] = values
+                self.sent_targets[target.node] = values
+        on_path = set(planner.network.path)
+        result['removed'] = [node for node in self.sent_targets if node not in on_path]
+        for node in result['removed']:
+            del self.sent_targets[node]
+        result['targets'] = targets
+        return result
+
+    def plan_path(self):
+        planner = self.planner
+        engine = self.path_engine()
+        if self.options['regions']:
+            planner.plan_regions(engine)
+        else:
+            planner.plan_path(engine)
+        if self.options['optimize_jumps']:
+            planner.optimize_jumps()
+        self.path_version += 1
+
+
+def new_planner(previous=None):
+    """A new planner with the parameters and maps of ``previous``."""
+    from .surface_path_planner import SurfacePathPlanner
+    planner = SurfacePathPlanner()
+    if previous is not None:
+        planner.fabrication_parameters.update(previous.fabrication_parameters)
+        planner.color_map = previous.color_map
+        planner.thickness_map = previous.thickness_map
+        planner.batch_frames = previous.batch_frames
+        planner.instrumentation = previous.instrumentation
+    return planner
+
+
+class PlanningService(object):
+    """Dispatches JSON requests to planning sessions.
+
+    A request is ``{"id": ..., "op": ..., "session": ..., "params": {...}}``.
+    ``op`` is ``open``, ``close``, ``sessions`` or a :class:`PlanningSession`
+    method (``set_mesh``, ``update_mesh``, ``set_parameters``, ``plan``).
+    Responses carry the request ``id``, ``ok`` and a ``result`` or ``error``.
+    """
+
+    OPERATIONS = ('set_mesh', 'update_mesh', 'set_parameters', 'plan')
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def handle(self, request):
+        response = {'id': request.get('id')}
+        try:
+            response['result'] = self.dispatch(request.get('op'), request.get('session'), request.get('params') or {})
+            response['ok'] = True
+        except Exception as e:
+            response['ok'] = False
+            response['error'] = '{}: {}'.format(type(e).__name__, e)
+        return response
+
+    def dispatch(self, op, session_id, params):
+        if op == 'open':
+            session_id = params.get('session') or uuid.uuid4().hex
+            with self.lock:
+                self.sessions.setdefault(session_id, PlanningSession())
+            return {'session': session_id}
+        if op == 'close':
+            with self.lock:
+                return {'closed': self.sessions.pop(session_id, None) is not None}
+        if op == 'sessions':
+            return {'sessions': sorted(self.sessions)}
+        if op not in self.OPERATIONS:
+            raise ValueError('Unknown operation: {}'.format(op))
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise KeyError('Unknown session: {}'.format(session_id))
+        with session.lock:
+            return getattr(session, op)(**params)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+            except ValueError as e:
+                response = {'id': None, 'ok': False, 'error': 'ValueError: {}'.format(e)}
+            else:
+                response = self.server.service.handle(request)
+            self.wfile.write((json.dumps(response, default=str) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(host='127.0.0.1', port=8765, unix_socket=None, service=None):
+    """Serves a :class:`PlanningService` until interrupted.
+
+    Args:
+        unix_socket (str): Path of a Unix socket to listen on instead of ``host`` and ``port``
+    """
+    if unix_socket:
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+        server = Server(unix_socket, RequestHandler)
+    else:
+        server = ThreadingTCPServer((host, port), RequestHandler)
+    server.service = service or PlanningService()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    return server
+
+
+class PlanningClient(object):
+    """A blocking client for the planning daemon, usable from IronPython inside Grasshopper.
+
+    Args:
+        host (str): Host of a TCP daemon
+        port (int): Port of a TCP daemon
+        unix_socket (str): Path of a Unix socket daemon instead
+        session (str): Reopens a named session, e.g. one per Grasshopper definition
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, unix_socket=None, session=None, timeout=60.0):
+        if unix_socket:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(unix_socket)
+        else:
+            self.socket = socket.create_connection((host, port), timeout)
+        self.file = self.socket.makefile('rb')
+        self.count = 0
+        self.session = self.request('open', session=session)['session']
+
+    def request(self, op, **params):
+        self.count += 1
+        message = {'id': self.count, 'op': op, 'session': getattr(self, 'session', None), 'params': params}
+        self.socket.sendall((json.dumps(message) + '\n').encode('utf-8'))
+        response = json.loads(self.file.readline().decode('utf-8'))
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def set_mesh(self, mesh=None, **kwargs):
+        """Sends a compas mesh, or ``vertices``, ``faces`` and ``colors`` lists."""
+        if mesh is not None:
+            kwargs['data'] = mesh.data
+        return self.request('set_mesh', **kwargs)
+
+    def update_mesh(self, **deltas):
+        return self.request('update_mesh', **deltas)
+
+    def set_parameters(self, **parameters):
+        return self.request('set_parameters', **parameters)
+
+    def plan(self, full=False):
+        return self.request('plan', full=full)
+
+    def close(self):
+        try:
+            self.request('close')
+        finally:
+            self.file.close()
+            self.socket.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serves SurfacePathPlanner sessions on a local socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', help='Listens on a Unix socket instead of host and port')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.unix_socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+import atexit
+import os
+import sys
+
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except ImportError:
+    # IronPython inside Rhino
+    ProcessPoolExecutor = None
+
+from .planner_mesh import PlannerMesh
+
+__all__ = ['connected_components', 'plan_region', 'plan_regions', 'worker_processes', 'shared_executor',
+           'shutdown_executors']
+
+_EXECUTORS = {}
+
+
+def connected_components(keys, offsets, indices, include, connected=None):
+    """Splits the included faces of a CSR face adjacency into connected components.
+
+    Args:
+        keys (list): Face keys, see :meth:`PlannerMesh.face_adjacency_arrays`
+        offsets (array): CSR offsets
+        indices (array): CSR neighbor indices
+        include (callable): Returns True for the faces that are planned
+        connected (callable): Optional test whether two neighboring face keys belong to the same region
+
+    Returns:
+        list: Lists of face keys, largest component first, in face order within each component
+    """
+    seen = bytearray(len(keys))
+    for i, key in enumerate(keys):
+        if not include(key):
+            seen[i] = 1
+    components = []
+    for root in range(len(keys)):
+        if seen[root]:
+            continue
+        seen[root] = 1
+        stack = [root]
+        component = []
+        while stack:
+            i = stack.pop()
+            component.append(i)
+            for j in range(offsets[i], offsets[i + 1]):
+                k = indices[j]
+                if seen[k] or (connected is not None and not connected(keys[i], keys[k])):
+                    continue
+                seen[k] = 1
+                stack.append(k)
+        components.append([keys[i] for i in sorted(component)])
+    components.sort(key=lambda component: -len(component))
+    return components
+
+
+def plan_region(data, engine):
+    """Plans the path over one region, given as the data of its :meth:`PlannerMesh.submesh`.
+
+    Runs in a worker process, so it only takes and returns plain data.
+
+    Returns:
+        list: The face keys of the region in print order
+    """
+    from .surface_path_planner import SurfacePathPlanner
+    planner = SurfacePathPlanner()
+    planner.set_quad_mesh(PlannerMesh.from_data(data))
+    planner.set_network_nodes()
+    planner.plan_path(engine)
+    return planner.network.path
+
+
+def worker_processes():
+    """Whether regions can be planned in worker processes, which IronPython does not have."""
+    return ProcessPoolExecutor is not None and sys.platform != 'cli'
+
+
+def shared_executor(processes=None):
+    """A process pool with ``processes`` workers that is kept for later calls.
+
+    Starting workers and importing compas in them costs more than planning a
+    few small regions, so the pools are created once per worker count and
+    reused until :func:`shutdown_executors` or the end of the interpreter.
+    """
+    if not worker_processes():
+        raise ImportError('Worker processes are not available inside Rhino')
+    processes = processes or os.cpu_count() or 1
+    executor = _EXECUTORS.get(processes)
+    if executor is None:
+        executor = _EXECUTORS[processes] = ProcessPoolExecutor(processes)
+    return executor
+
+
+def shutdown_executors():
+    """Shuts down the pools of :func:`shared_executor`."""
+    while _EXECUTORS:
+        _, executor = _EXECUTORS.popitem()
+        executor.shutdown()
+
+
+atexit.register(shutdown_executors)
+
+
+def plan_regions(meshes, engine, processes=None, executor=None):
+    """Plans every region mesh with ``engine``, in parallel where worker processes are available.
+
+    Args:
+        meshes (list): Region meshes, see :meth:`PlannerMesh.submesh`
+        engine (PathEngine): The engine used for every region; it has to be picklable
+        processes (int): Number of worker processes of the :func:`shared_executor`, None for
+            one per CPU, 1 to plan in this process
+        executor (concurrent.futures.Executor): Runs the regions instead of the shared pool
+
+    Returns:
+        list: The print order of every region, in the order of ``meshes``
+    """
+    data = [mesh.data for mesh in meshes]
+    if executor is None:
+        # IronPython has neither worker processes nor os.cpu_count
+        if not worker_processes() or len(data) < 2 or (processes or os.cpu_count() or 1) == 1:
+            return [plan_region(item, engine) for item in data]
+        executor = shared_executor(processes)
+    futures = [executor.submit(plan_region, item, engine) for item in data]
+    return [future.result() for future in futures]
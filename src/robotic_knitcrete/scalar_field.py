@@ -0,0 +1,51 @@
+try:
+    import numpy as np
+except ImportError:
+    # IronPython inside Rhino
+    np = None
+
+__all__ = ['normalize', 'face_vertex_indices', 'vertex_to_face', 'face_to_vertex', 'map_indices']
+
+
+def normalize(values, vmin=None, vmax=None):
+    """Scales values linearly to ``[0, 1]``, clipping at ``vmin`` and ``vmax`` (the data range by default)."""
+    values = np.asarray(values, dtype=float)
+    vmin = np.nanmin(values) if vmin is None else vmin
+    vmax = np.nanmax(values) if vmax is None else vmax
+    if vmax <= vmin:
+        return np.zeros_like(values)
+    return np.clip((values - vmin) / (vmax - vmin), 0.0, 1.0)
+
+
+def face_vertex_indices(mesh, vertex_keys=None, face_keys=None):
+    """The vertex rows of every face as an ``(F, k)`` array, padded with -1 for faces with fewer corners."""
+    vertex_keys = list(mesh.vertices()) if vertex_keys is None else vertex_keys
+    face_keys = list(mesh.faces()) if face_keys is None else face_keys
+    row = dict((key, i) for i, key in enumerate(vertex_keys))
+    corners = [mesh.face_vertices(key) for key in face_keys]
+    indices = np.full((len(face_keys), max(len(c) for c in corners) if corners else 0), -1, dtype=int)
+    for i, vertices in enumerate(corners):
+        indices[i, :len(vertices)] = [row[vertex] for vertex in vertices]
+    return indices
+
+
+def vertex_to_face(values, indices):
+    """Averages per-vertex values over the corners of every face, like :meth:`PlannerMesh.face_color`."""
+    values = np.asarray(values, dtype=float)
+    valid = indices >= 0
+    return np.where(valid, values[indices], 0.0).sum(axis=1) / valid.sum(axis=1)
+
+
+def face_to_vertex(values, indices, number_of_vertices):
+    """Averages per-face values over the faces around every vertex."""
+    values = np.asarray(values, dtype=float)
+    valid = indices >= 0
+    rows = indices[valid]
+    totals = np.bincount(rows, np.broadcast_to(values[:, None], indices.shape)[valid], number_of_vertices)
+    counts = np.bincount(rows, minlength=number_of_vertices)
+    return totals / np.maximum(counts, 1)
+
+
+def map_indices(normalized, size):
+    """Indices into a map of ``size`` entries for values in ``[0, 1]``."""
+    return np.rint(np.asarray(normalized) * (size - 1)).astype(int)
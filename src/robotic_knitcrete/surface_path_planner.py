@@ -1,6 +1,20 @@
 import math
+from array import array
 
 from compas.utilities import linspace
+from .instrumentation import Instrumentation, STATS
+from .frame_array import FrameArray, np, orientations_from_normals
+from .layered_toolpath import LayeredToolpath
+from .node_index import NodeIndex
+from .path_engines import LowestAxisEngine
+from .jump_optimizer import order_segments, path_segments
+from .geodesic import GeodesicSolver
+from .path_metrics import PathMetrics
+from .knit_pattern import operation_counts, operation_density, pattern_face_index
+from .scalar_field import face_to_vertex, face_vertex_indices, map_indices, normalize, vertex_to_face
+from .region_planner import connected_components, plan_regions
+from .planner_archive import PlannerArchive, save_planner
+from .toolpath_exporter import export_targets, network_targets, toolpath_targets
 from .planner_mesh import PlannerMesh
 from compas.datastructures import Network
 from compas.geometry import Frame, Vector, Point
@@ -39,22 +53,116 @@ class SurfacePathPlanner():
         }
         self.color_map=None
         self.thickness_map=None
+        self.instrumentation = Instrumentation()
+        self.layer_parameters = None
+        self.dirty_faces = set()
+        self.skip_edits = {}
+        self.skipped_faces = set()
+        self.adjacency = None
+        self.pattern_indices = {}
+        self.geodesic_solver = None
+        self.metrics = {}
+        self.node_index = NodeIndex(self.network)
+        self.batch_frames = False
+        self.frames = None
+        self.tool_frames = None
+        self.field_indices = None
 
     def set_quad_mesh(self, mesh):
         self.mesh = mesh
+        self._reset_mesh_caches()
         return self.mesh
 
     def set_quad_mesh_from_rhinomesh(self, rhinomesh):
         self.mesh = PlannerMesh.from_rhinomesh(rhinomesh)
+        self._reset_mesh_caches()
         return self.mesh
 
     def create_quad_mesh_from_surface(self, surface, nu, nv):
         self.mesh = PlannerMesh.from_surface(surface, nu, nv)
+        self._reset_mesh_caches()
         return self.mesh
 
+    def coarsen_mesh(self, angle=5.0, color_tolerance=0.05, max_span=8):
+        """Replaces the mesh with a coarser grid that drops whole u and v lines, see :meth:`PlannerMesh.coarsened`.
+
+        Painted field indices are carried over to the coarse faces.
+        Call it before :meth:`set_network_nodes`, so the network is built on the coarse faces.
+        """
+        fine = self.mesh
+        field_indices = self.field_indices
+        self.mesh = fine.coarsened(angle, color_tolerance, max_span)
+        self._reset_mesh_caches()
+        if field_indices is not None:
+            # Coarse faces keep the mean index of the painted faces they cover
+            self.field_indices = {}
+            for face, faces in fine.covered_faces(self.mesh).items():
+                indices = [field_indices[key] for key in faces if key in field_indices]
+                if indices:
+                    self.field_indices[face] = int(round(float(sum(indices)) / len(indices)))
+        return self.mesh
+
+    def _reset_mesh_caches(self):
+        """Forgets everything derived from the previous mesh."""
+        self.adjacency = None
+        self.pattern_indices = {}
+        self.geodesic_solver = None
+        self.metrics = {}
+        self.field_indices = None
+        self.frames = None
+        self.tool_frames = None
+        self.node_index.clear()
+
+    def set_instrumentation(self, level=STATS, echo=False):
+        """Records counters and phase timers of the following planner runs.
+
+        Args:
+            level (int): ``OFF``, ``STATS`` or ``TRACE`` from :mod:`robotic_knitcrete.instrumentation`
+            echo (bool): Prints the trace events to the console
+        """
+        self.instrumentation = Instrumentation(level, echo)
+        return self.instrumentation
+
+    def set_batch_frames(self, enabled=True):
+        """Keeps frames and tool frames in :class:`FrameArray` objects instead of per-node compas frames.
+
+        The base frames of all nodes are then computed in one vectorized pass
+        from their normals when first needed, and the tool frames of every
+        :meth:`calculate_fabrication_parameters` call in another. The ``frame``
+        and ``tool_frame`` node attributes stay empty; :meth:`node_frame` and
+        :meth:`node_tool_frame` convert single rows to compas frames on request.
+        Requires NumPy.
+        """
+        if enabled and np is None:
+            raise ImportError('Batched frames require NumPy')
+        self.batch_frames = enabled
+        self.frames = None
+        self.tool_frames = None
+
+    def save(self, path):
+        """Saves the mesh, network, path, maps and parameters, see :func:`robotic_knitcrete.planner_archive.save_planner`."""
+        with self.instrumentation.timer('save'):
+            save_planner(self, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Restores a planner saved with :meth:`save` without replanning.
+
+        To only stream the saved path or targets, open the :class:`PlannerArchive` directly.
+        """
+        return PlannerArchive.load(path, mmap).to_planner()
+
     def set_network_nodes(self):
-        for index in self.mesh.faces():
-            self.add_node(index)
+        with self.instrumentation.timer('set_network_nodes'):
+            for index in self.mesh.faces():
+                self.add_node(index)
+            self.adjacency = self.mesh.face_adjacency_arrays()
+
+    def face_adjacency(self):
+        """The CSR face adjacency of the mesh, built once per mesh."""
+        if self.adjacency is None:
+            self.adjacency = self.mesh.face_adjacency_arrays()
+        return self.adjacency
 
     def add_node(self, index, attr_dict={}, **kwattr):
         point = self.mesh.face_center(index)
@@ -79,9 +187,14 @@ class SurfacePathPlanner():
         })
         attr_dict.update(**kwattr)
         self.network.add_node(key=index, attr_dict=attr_dict)
+        self.node_index.add(index)
+        if self.frames is not None:
+            self.update_frames([index])
 
     def add_edge(self, start, end):
         new_edge = self.network.add_edge(start, end)
+        if self.batch_frames:
+            return
         # if self.network.node_attribute(key=start, name='frame') is None:
         #     self.set_node_frame_from_edge(start, new_edge)
         # self.set_node_frame_from_edge(end, new_edge)
@@ -108,6 +221,36 @@ class SurfacePathPlanner():
         self.network.node_attribute(key=node, name='frame', value=frame)
         return frame
 
+    def frame_array(self):
+        """The base frames of all nodes as a :class:`FrameArray`, computed on first use."""
+        if self.frames is None:
+            keys = list(self.network.nodes())
+            points = [self.network.node_coordinates(key) for key in keys]
+            normals = [self.network.node_attributes(key, ['vx', 'vy', 'vz']) for key in keys]
+            self.frames = FrameArray.from_normals(keys, points, normals)
+        return self.frames
+
+    def update_frames(self, nodes):
+        """Recomputes the base frames of nodes whose position or normal changed."""
+        if self.frames is not None:
+            points = [self.network.node_coordinates(key) for key in nodes]
+            normals = [self.network.node_attributes(key, ['vx', 'vy', 'vz']) for key in nodes]
+            self.frames.assign(nodes, points, orientations_from_normals(normals))
+
+    def node_frame(self, node):
+        """The base frame of a node, from the frame array if frames are batched."""
+        if self.batch_frames:
+            return self.frame_array().frame(node)
+        return self.network.node_attribute(node, 'frame')
+
+    def node_tool_frame(self, node):
+        """The tool frame of a node, or None if it was not calculated."""
+        if self.batch_frames:
+            if self.tool_frames is None or node not in self.tool_frames:
+                return None
+            return self.tool_frames.frame(node)
+        return self.network.node_attribute(node, 'tool_frame')
+
     def get_node(self, **kwargs):
         """
         **kwargs can include any of the following:
@@ -121,14 +264,17 @@ class SurfacePathPlanner():
             'idx' : 0
         }
         attr_dict.update(kwargs)
-        print(attr_dict)
         conditions = {}
         func_dict = {0:min,1:max,2:sorted}
         func = func_dict[attr_dict['func']]
         for key, value in kwargs.items():
             if key in self.network.default_node_attributes.keys():
                 conditions.update({key:value})
-        print(conditions)
+        self.instrumentation.count('node_queries')
+        self.instrumentation.trace('get_node', query=attr_dict, conditions=conditions)
+        # The index answers queries on the attributes it holds, as long as it covers every node
+        if len(self.node_index) == len(self.network.node) and self.node_index.supports(conditions, attr_dict['orientation']):
+            return self.node_index.query(conditions, attr_dict['orientation'], attr_dict['func'], attr_dict['idx'])
         # if 'orientation' not in locals():
         #     orientation = None
         # if 'index' not in locals():
@@ -137,7 +283,7 @@ class SurfacePathPlanner():
         nodes = list(self.network.nodes_where(conditions))
         if nodes != []:
             vals = [self.network.node_attribute(key=k, name=attr_dict['orientation']) for k in nodes]
-            print(vals)
+            self.instrumentation.trace('get_node_values', values=vals)
             fval = func(vals)
             if isinstance(fval, list):
                 fval = fval[attr_dict['idx']]
@@ -158,8 +304,21 @@ class SurfacePathPlanner():
         if self.network == None:
             self.set_network_nodes()
 
-        n = 0 # Number of interruptions        
+        with self.instrumentation.timer('find_start'):
+            current = self.start_node(orientation, alternate, inverse)
+        # Getting the starting point
+        self.instrumentation.trace('start', node=current)
+        self.metrics = {}
+        with self.instrumentation.timer('walk'):
+            n = self.axis_walk(current, orientation, alternate)
+        return self.network, n
+
+    def start_node(self, orientation, alternate=False, inverse=False):
+        """Finds the corner node the path starts from and skips the corners it must not reach."""
         current = self.get_node(number_of_neighbors=2, orientation=orientation, func=2, idx=0)
+        if current is None:
+            # Regions without a corner face, e.g. a single face or a ring, start at their lowest node
+            return self.get_node(orientation=orientation)
         if alternate and not inverse:
             opp_corner = self.get_node(number_of_neighbors=2, orientation=orientation, func=2, idx=3)
             self.network.node_attribute(key=opp_corner, name='skip', value=True)
@@ -189,30 +348,68 @@ class SurfacePathPlanner():
                     for k in list(neighbornodes.keys()):
                         if k != current:
                             self.network.node_attribute(key=k, name='skip', value=True)
-            
-        # Getting the starting point
-        print(current)
+        return current
+
+    def axis_walk(self, current, orientation, alternate=False):
+        """Walks from ``current`` to the lowest free neighbor until all nodes are connected.
+
+        The neighbors of each node are scanned in place on the CSR face adjacency,
+        so choosing the next node does not build any temporary containers.
+
+        Returns:
+            int: Number of interruptions (jumps to the closest free node)
+        """
+        instrumentation = self.instrumentation
+        recording = instrumentation.enabled
+        tracing = instrumentation.tracing
+        keys, offsets, indices = self.face_adjacency()
+        position = dict((key, i) for i, key in enumerate(keys))
+        values = array('d', [self.network.node_attribute(key, orientation) for key in keys])
+        visited = bytearray(len(keys))
+        skip = bytearray(len(keys))
+        for i, key in enumerate(keys):
+            if self.network.connected_edges(key):
+                visited[i] = 1
+            if self.network.node_attribute(key, 'skip'):
+                skip[i] = 1
+        n = 0 # Number of interruptions
         # Path finding process
-        for index in self.mesh.faces():
+        for _ in range(len(keys)):
             # Look for the neighbor with the lowest x/y/z
             self.network.path.append(current)
-            neighbornodes = {}
-            for i in self.network.node_attribute(key=current, name='neighbors'):
-                if len(self.network.connected_edges(key=i))==0:
-                    if self.network.node_attribute(key=i, name='skip')==False and alternate == True:
-                        neighbornodes.update({i:self.network.node_attribute(key=i, name=orientation)})
-                    elif alternate == False:
-                        neighbornodes.update({i:self.network.node_attribute(key=i, name=orientation)})
+            c = position[current]
+            visited[c] = 1
+            start, end = offsets[c], offsets[c + 1]
+            if recording:
+                instrumentation.count('steps')
+                instrumentation.count('neighbor_evaluations', end - start)
+            # Lowest and second lowest value among the free neighbors
+            free = 0
+            lowest = second = float('inf')
+            for j in range(start, end):
+                i = indices[j]
+                if visited[i] or (alternate and skip[i]):
+                    continue
+                free += 1
+                if values[i] < lowest:
+                    lowest, second = values[i], lowest
+                elif values[i] < second:
+                    second = values[i]
             # If neighbors found then find the closest one based on orientation
-            if neighbornodes != {}:
-                if len(list(neighbornodes.keys()))>2:
-                    following = list(neighbornodes.keys())[list(neighbornodes.values()).index(sorted(list(neighbornodes.values()))[1])]
-                else:
-                    following = list(neighbornodes.keys())[list(neighbornodes.values()).index(min(list(neighbornodes.values())))]
-                if alternate == True:
-                    for k in list(neighbornodes.keys()):
-                        if k != following:
-                            self.network.node_attribute(key=k, name='skip', value=True)
+            if free:
+                target = second if free > 2 else lowest
+                for j in range(start, end):
+                    i = indices[j]
+                    if not (visited[i] or (alternate and skip[i])) and values[i] == target:
+                        break
+                if alternate:
+                    for k in range(start, end):
+                        other = indices[k]
+                        if other != i and not (visited[other] or skip[other]):
+                            skip[other] = 1
+                            self.network.node_attribute(key=keys[other], name='skip', value=True)
+                following = keys[i]
+                visited[i] = 1
                 # Draw a line between the current and following face centerpoints
                 self.add_edge(current, following)
             # If the face doesn't have free neighbors
@@ -222,19 +419,188 @@ class SurfacePathPlanner():
                     # Move to the closest available face centerpoint
                     following = self.move_to_closest(current)
                     if following == current:
-                        return self.network, n
+                        return n
                     # Draw a line between the current and the following face
                     self.add_edge(current, following)
+                    visited[position[following]] = 1
                     n += 1
+                    if recording:
+                        instrumentation.count('jumps')
+                else:
+                    # Every node is connected
+                    return n
             current = following
-            print(current)
-        return self.network, n
+            if tracing:
+                instrumentation.trace('step', node=current)
+        return n
+
+    def plan_path(self, engine=None):
+        """Plans a new path with a path engine from :mod:`robotic_knitcrete.path_engines`.
+
+        Args:
+            engine (PathEngine): Defaults to the lowest x-axis walk
+
+        Returns:
+            tuple: The network and the number of interruptions
+        """
+        engine = engine or LowestAxisEngine()
+        self.reset_path()
+        with self.instrumentation.timer('plan_path'):
+            order = engine.order(self)
+            if not self.network.path:
+                self.connect_path(order)
+        return self.network, self.count_interruptions()
+
+    def select_path(self, engines):
+        """Plans with every engine and keeps the path with the fewest interruptions, then the shortest travel.
+
+        Returns:
+            list: One report per engine, see :meth:`path_report`, best first
+        """
+        reports = []
+        for i, engine in enumerate(engines):
+            self.plan_path(engine)
+            report = self.path_report()
+            report['engine'] = engine.name
+            reports.append((report['interruptions'], report['travel'], i, report))
+        reports.sort(key=lambda item: item[:3])
+        self.plan_path(engines[reports[0][2]])
+        return [report for _, _, _, report in reports]
+
+    def regions(self, by_color=False):
+        """The connected components of the faces that are not skipped.
+
+        Args:
+            by_color (bool): Also separates neighboring faces of different colors
+
+        Returns:
+            list: Lists of face keys, largest region first
+        """
+        keys, offsets, indices = self.face_adjacency()
+        connected = None
+        if by_color:
+            connected = lambda a, b: self.node_color(a) == self.node_color(b)
+        return connected_components(keys, offsets, indices, lambda key: key not in self.skipped_faces, connected)
+
+    def plan_regions(self, engine=None, processes=None, by_color=False, max_iterations=20, executor=None):
+        """Plans every region of :meth:`regions` on its own, in parallel, and merges the sub-paths.
+
+        Each region is copied into a :meth:`PlannerMesh.submesh` and planned with
+        ``engine`` in a worker process. The workers are kept between calls, see
+        :func:`robotic_knitcrete.region_planner.shared_executor`. The sub-paths are then chained like the
+        segments of :meth:`optimize_jumps`, keeping the largest region first.
+        Inside Rhino, where there are no worker processes, and on a single CPU
+        the regions are planned one after another.
+
+        Args:
+            engine (PathEngine): Defaults to the lowest x-axis walk
+            processes (int): Number of worker processes, None for one per CPU
+            by_color (bool): Plans color zones as separate regions
+            executor (concurrent.futures.Executor): Plans the regions instead of the shared worker processes
+
+        Returns:
+            tuple: The network and the number of interruptions
+        """
+        engine = engine or LowestAxisEngine()
+        self.reset_path()
+        with self.instrumentation.timer('plan_regions'):
+            regions = self.regions(by_color)
+            self.instrumentation.count('regions', len(regions))
+            paths = plan_regions([self.mesh.submesh(region) for region in regions], engine, processes, executor)
+            starts = [self.network.node_coordinates(path[0]) for path in paths]
+            ends = [self.network.node_coordinates(path[-1]) for path in paths]
+            order = []
+            for index, reverse in order_segments(starts, ends, max_iterations):
+                order.extend(reversed(paths[index]) if reverse else paths[index])
+            self.connect_path(order)
+        return self.network, self.count_interruptions()
+
+    def optimize_jumps(self, max_iterations=20):
+        """Reorders and reverses the continuous segments of the path to shorten the jumps between them.
+
+        The path is split wherever consecutive nodes are not mesh neighbors, the
+        segments are chained by :func:`robotic_knitcrete.jump_optimizer.order_segments`
+        and the network is reconnected in the new order. The first segment keeps its place.
+
+        Returns:
+            dict: :meth:`path_report` ``before`` and ``after`` the optimization
+        """
+        before = self.path_report()
+        with self.instrumentation.timer('optimize_jumps'):
+            segments = path_segments(self.network.path, lambda key: self.network.node_attribute(key, 'neighbors'))
+            starts = [self.network.node_coordinates(segment[0]) for segment in segments]
+            ends = [self.network.node_coordinates(segment[-1]) for segment in segments]
+            order = []
+            for index, reverse in order_segments(starts, ends, max_iterations):
+                order.extend(reversed(segments[index]) if reverse else segments[index])
+            if order != self.network.path:
+                for u, v in list(self.network.edges()):
+                    self.network.delete_edge(u, v)
+                self.connect_path(order)
+        return {'before': before, 'after': self.path_report()}
+
+    def reset_path(self):
+        """Removes the path and its edges, and the skip flags of earlier planning runs."""
+        for u, v in list(self.network.edges()):
+            self.network.delete_edge(u, v)
+        self.network.path = []
+        self.metrics = {}
+        for key in self.network.nodes():
+            self.network.node_attribute(key, 'skip', key in self.skipped_faces)
+
+    def connect_path(self, order):
+        """Makes ``order`` the path of the network and connects consecutive nodes."""
+        self.network.path = list(order)
+        self.metrics = {}
+        if len(order) == 1 and not self.batch_frames:
+            self.set_node_frame(order[0])
+        for current, following in zip(order[:-1], order[1:]):
+            self.add_edge(current, following)
+
+    def path_report(self):
+        """Length of the path, its non-printing travel across interruptions and their number."""
+        length = travel = 0.0
+        n = 0
+        for current, following in zip(self.network.path[:-1], self.network.path[1:]):
+            d = distance_point_point(self.network.node_coordinates(current), self.network.node_coordinates(following))
+            length += d
+            if following not in self.network.node_attribute(current, 'neighbors'):
+                travel += d
+                n += 1
+        return {'nodes': len(self.network.path), 'length': length, 'travel': travel, 'interruptions': n}
+
+    def path_metrics(self, num_layers=None, scale=None):
+        """Prefix sums of volume, deposition time and travel along the path, see :class:`PathMetrics`.
+
+        The metrics are kept until the path, the node parameters or the
+        fabrication parameters change, so repeated range queries cost O(1).
+
+        Args:
+            num_layers (int): Number of layers, by default those of the last
+                :meth:`calculate_fabrication_parameters` or 1
+            scale (float): Scale of the node coordinates, by default the one of the
+                last :meth:`calculate_fabrication_parameters` or 1.0
+
+        Returns:
+            :class:`PathMetrics`
+        """
+        parameters = self.layer_parameters or {}
+        num_layers = num_layers or parameters.get('num_layers', 1)
+        scale = scale or parameters.get('scale', 1.0)
+        metrics = self.metrics.get((num_layers, scale))
+        if metrics is None or len(metrics.path) != len(self.network.path):
+            with self.instrumentation.timer('path_metrics'):
+                metrics = PathMetrics.from_network(self.network, self.fabrication_parameters['material_flowrate'],
+                                                   scale, num_layers)
+            self.metrics[num_layers, scale] = metrics
+        return metrics
 
     def move_to_closest(self, current):
         current_point = Point.from_data(self.network.node_coordinates(key=current))
         distances = {}
         nodes = [key for key in self.network.nodes() if len(self.network.connected_edges(key))==0]
-        # print(nodes)
+        self.instrumentation.count('nearest_neighbor_queries')
+        self.instrumentation.count('nearest_neighbor_candidates', len(nodes))
         for j in nodes:
             if self.network.node_attribute(key=j, name='skip') == False:
                 d = distance_point_point(current_point, Point.from_data(self.network.node_coordinates(key=j)))
@@ -242,7 +608,7 @@ class SurfacePathPlanner():
         if len(list(distances.keys())) == 0:
             return current
         min_d = min(distances.values())
-        following = distances.keys()[distances.values().index(min_d)]
+        following = list(distances.keys())[list(distances.values()).index(min_d)]
         return following
 
     def set_fabrication_parameters(self, *args, **kwargs):
@@ -253,6 +619,7 @@ class SurfacePathPlanner():
         self.fabrication_parameters.update(args)
         for key, value in kwargs.items():
             self.fabrication_parameters[key] = value
+        self.metrics = {}
 
     def set_color_map(self, colors=None, color_map=None, rangetype="full"):
         if colors is not None:
@@ -269,6 +636,135 @@ class SurfacePathPlanner():
                 color_map = ColorMap(raw_colors)
         self.color_map = color_map
 
+    def paint_scalar_field(self, values, on='vertex', vmin=None, vmax=None):
+        """Paints the mesh vertex colors from a scalar field, e.g. stresses or curvature, through the color map.
+
+        The values are scaled to ``[0, 1]`` between ``vmin`` and ``vmax`` and
+        looked up in :attr:`color_map` and :attr:`thickness_map` in one
+        vectorized pass. Per-face fields are averaged to the vertices for the
+        colors, per-vertex fields to the faces for the thicknesses, which
+        :meth:`set_node_thickness` then uses instead of matching colors. Faces
+        whose color or thickness changed are marked dirty for :meth:`replan`.
+
+        Args:
+            values (list): One value per vertex or face, in the order of ``mesh.vertices()`` or ``mesh.faces()``
+            on (str): 'vertex' or 'face'
+            vmin (float): Value painted with the first color, the field minimum by default
+            vmax (float): Value painted with the last color, the field maximum by default
+
+        Returns:
+            numpy.ndarray: The thickness of every face, or None without a thickness map
+        """
+        if np is None:
+            raise ImportError('Painting scalar fields requires NumPy')
+        if self.color_map is None:
+            raise ValueError('Set a color map with set_color_map first.')
+        with self.instrumentation.timer('paint_scalar_field'):
+            vertex_keys = list(self.mesh.vertices())
+            face_keys = list(self.mesh.faces())
+            indices = face_vertex_indices(self.mesh, vertex_keys, face_keys)
+            if on == 'vertex':
+                vertex_values = normalize(values, vmin, vmax)
+                face_values = vertex_to_face(vertex_values, indices)
+            elif on == 'face':
+                face_values = normalize(values, vmin, vmax)
+                vertex_values = face_to_vertex(face_values, indices, len(vertex_keys))
+            else:
+                raise ValueError('Scalar fields are given per vertex or per face, not per {}'.format(on))
+
+            colors = np.array([color.rgb255 for color in self.color_map.colors])
+            rgb = colors[map_indices(vertex_values, len(colors))]
+            defaults = self.mesh.default_vertex_attributes
+            attributes = [self.mesh.vertex[key] for key in vertex_keys]
+            old = np.array([[attr.get(name, defaults[name]) for name in 'rgb'] for attr in attributes])
+            changed = (old != rgb).any(axis=1)
+            for i in np.flatnonzero(changed).tolist():
+                attributes[i]['r'], attributes[i]['g'], attributes[i]['b'] = rgb[i].tolist()
+            # Index -1 pads faces with fewer corners and picks the appended False
+            dirty = set(face_keys[i] for i in np.flatnonzero(np.append(changed, False)[indices].any(axis=1)).tolist())
+
+            thicknesses = None
+            if self.thickness_map:
+                field_indices = map_indices(face_values, len(self.thickness_map))
+                previous = self.field_indices or {}
+                self.field_indices = dict(zip(face_keys, field_indices.tolist()))
+                dirty.update(face for face, n in self.field_indices.items() if previous.get(face) != n)
+                thicknesses = np.asarray(self.thickness_map, dtype=float)[field_indices]
+            elif self.field_indices is not None:
+                # Without a thickness map the new colors decide the thicknesses again
+                dirty.update(self.field_indices)
+                self.field_indices = None
+            self.mark_dirty(face for face in dirty if face in self.network.node)
+            self.instrumentation.count('painted_vertices', int(changed.sum()))
+        return thicknesses
+
+    def set_thickness_from_pattern(self, str_ops_matrix, operations=('transfer', ), vmin=None, vmax=None,
+                                   transpose=False):
+        """Paints thicknesses and colors from the density of knit operations on every face.
+
+        Each face is mapped to its block of pattern pixels through its (u, v)
+        grid index, see :func:`robotic_knitcrete.knit_pattern.pattern_face_index`.
+        The index is computed once per mesh and pattern size. The share of
+        ``operations`` among the pixels of each face is then painted with
+        :meth:`paint_scalar_field`, so the densest faces get the last entry of
+        the thickness map.
+
+        Args:
+            str_ops_matrix (list): Operation names of the knit pattern, one row per machine course
+            operations (tuple): Operations counted for the density
+            vmin (float): Density painted with the first color and thickness, the lowest by default
+            vmax (float): Density painted with the last color and thickness, the highest by default
+            transpose (bool): Runs the pattern rows along u instead of v
+
+        Returns:
+            numpy.ndarray: The thickness of every face, or None without a thickness map
+        """
+        if np is None:
+            raise ImportError('Mapping knit patterns requires NumPy')
+        with self.instrumentation.timer('set_thickness_from_pattern'):
+            height, width = len(str_ops_matrix), len(str_ops_matrix[0])
+            face_keys = list(self.mesh.faces())
+            key = (width, height, transpose)
+            if key not in self.pattern_indices:
+                self.pattern_indices[key] = pattern_face_index(self.mesh, width, height, face_keys, transpose)
+            names, counts = operation_counts(self.pattern_indices[key], str_ops_matrix, len(face_keys))
+            density = operation_density(names, counts, operations)
+        return self.paint_scalar_field(density, on='face', vmin=vmin, vmax=vmax)
+
+    def geodesic_distances(self, sources=None):
+        """Geodesic distances of all mesh vertices to the closest source vertex, see :class:`GeodesicSolver`.
+
+        The solver is factorized on the first call and reused until the mesh
+        or its vertex coordinates change.
+
+        Args:
+            sources (list): Vertex keys, e.g. of the supports, the mesh boundary by default
+
+        Returns:
+            numpy.ndarray: One distance per vertex, in the order of ``mesh.vertices()``
+        """
+        if self.geodesic_solver is None:
+            with self.instrumentation.timer('factorize_geodesics'):
+                self.geodesic_solver = GeodesicSolver(self.mesh)
+        if sources is None:
+            sources = self.mesh.vertices_on_boundary()
+        with self.instrumentation.timer('geodesic_distances'):
+            return self.geodesic_solver.distances(sources)
+
+    def paint_geodesic_field(self, sources=None, vmin=None, vmax=None):
+        """Grades colors and thicknesses by the geodesic distance from the sources with :meth:`paint_scalar_field`.
+
+        Args:
+            sources (list): Vertex keys, e.g. of the supports, the mesh boundary by default
+            vmin (float): Distance painted with the first color and thickness, 0 by default
+            vmax (float): Distance painted with the last color and thickness, the largest by default
+
+        Returns:
+            numpy.ndarray: The thickness of every face, or None without a thickness map
+        """
+        distances = self.geodesic_distances(sources)
+        return self.paint_scalar_field(distances, on='vertex', vmin=0.0 if vmin is None else vmin, vmax=vmax)
+
     def set_thickness_map(self, thicknesses):
         thickness_map = []
         if len(thicknesses)==2:
@@ -282,21 +778,125 @@ class SurfacePathPlanner():
         elif len(thicknesses)>3:
             thickness_map.extend(thicknesses)
         self.thickness_map = thickness_map
+        if self.field_indices is not None:
+            # The painted indices point into the previous map, the faces fall back to their colors
+            self.mark_dirty(face for face in self.field_indices if face in self.network.node)
+            self.field_indices = None
+        self.metrics = {}
 
     def calculate_fabrication_parameters(self, num_layers, n_layer, scale, measured=True):
-        nodes = [key for key in self.network.nodes() if len(self.network.connected_edges(key))!=0]
+        self.layer_parameters = {'num_layers':num_layers, 'n_layer':n_layer, 'scale':scale, 'measured':measured}
+        with self.instrumentation.timer('calculate_fabrication_parameters'):
+            nodes = [key for key in self.network.nodes() if len(self.network.connected_edges(key))!=0]
+            self.calculate_node_fabrication_parameters(nodes, num_layers, n_layer, scale, measured)
+
+    def calculate_layers(self, num_layers, scale, measured=True):
+        """Calculates the fabrication parameters of all layers at once.
+
+        Area, thickness, nozzle distance and velocity do not change between layers,
+        so they are set on the nodes once, and the tool frames of every layer are
+        derived from the shared base frames by the returned toolpath.
+
+        Returns:
+            :class:`LayeredToolpath`
+        """
+        self.metrics = {}
+        with self.instrumentation.timer('calculate_layers'):
+            if self.batch_frames:
+                nodes = list(self.network.path)
+            else:
+                nodes = [key for key in self.network.path if self.network.node_attribute(key, 'frame') is not None]
+            for node in nodes:
+                self.set_node_area_radius(node, scale)
+                self.set_node_thickness(node, num_layers)
+                self.network.node_attribute(key=node, name='distance', value=self.node_distance(node, measured))
+                self.set_node_velocity(node)
+            return LayeredToolpath.from_network(self.network, num_layers, self.frame_array() if self.batch_frames else None)
+
+    def export_toolpath(self, filepath, toolpath=None, layers=None, **kwargs):
+        """Streams the robot targets to a file, see :func:`robotic_knitcrete.toolpath_exporter.export_targets`.
+
+        Args:
+            filepath (str): A ``.csv``, ``.jsonl``, ``.bin``, ``.mod`` (RAPID) or ``.src`` (KRL) file
+            toolpath (:class:`LayeredToolpath`): Layers from :meth:`calculate_layers`; without
+                it the layer of the last :meth:`calculate_fabrication_parameters` is written
+            layers (list): Layer numbers of ``toolpath`` to write, all by default
+
+        Returns:
+            int: Number of written targets
+        """
+        with self.instrumentation.timer('export_toolpath'):
+            if toolpath is None:
+                targets = network_targets(self)
+            else:
+                targets = toolpath_targets(toolpath, layers)
+            return export_targets(targets, filepath, **kwargs)
+
+    def calculate_node_fabrication_parameters(self, nodes, num_layers, n_layer, scale, measured=True):
+        self.metrics = {}
         for node in nodes:
             self.set_node_area_radius(node, scale)
             self.set_node_thickness(node, num_layers)
-            self.set_node_distance(node, num_layers, n_layer, measured)
+            if self.batch_frames:
+                self.network.node_attribute(key=node, name='distance', value=self.node_distance(node, measured))
+            else:
+                self.set_node_distance(node, num_layers, n_layer, measured)
             self.set_node_velocity(node)
+        if self.batch_frames:
+            self.set_tool_frames(nodes, num_layers, n_layer)
+
+    def set_tool_frames(self, nodes, num_layers, n_layer):
+        """Offsets the base frames of nodes along their z-axes in one pass, like :meth:`set_node_distance`."""
+        if not nodes:
+            return
+        factor = float(n_layer) / num_layers
+        offsets = [-(distance + thickness * factor) for distance, thickness in
+                   (self.network.node_attributes(node, ['distance', 'thickness']) for node in nodes)]
+        origins, orientations = self.frame_array().translated(nodes, offsets)
+        if self.tool_frames is None:
+            self.tool_frames = FrameArray(nodes, origins, orientations)
+        else:
+            self.tool_frames.assign(nodes, origins, orientations)
+
+    def check_workspace(self, workspace, toolpath=None, layers=None):
+        """Flags the path nodes whose tool frames the robot cannot reach, see :class:`Workspace`.
+
+        Args:
+            workspace (:class:`Workspace`): Envelopes and nozzle limits
+            toolpath (:class:`LayeredToolpath`): Checks all its layers instead of the last calculated tool frames
+            layers (list): Layer numbers of ``toolpath`` to check, all by default
+
+        Returns:
+            numpy.ndarray: True for every violating node in ``network.path`` order,
+            one row per layer for a toolpath
+        """
+        if toolpath is not None:
+            return workspace.check_toolpath(toolpath, layers)
+        path = list(self.network.path)
+        if self.batch_frames:
+            if self.tool_frames is None or any(node not in self.tool_frames for node in path):
+                raise ValueError('Calculate the fabrication parameters before checking the workspace.')
+            rows = self.tool_frames.rows(path)
+            origins, zaxes = self.tool_frames.origins[rows], self.tool_frames.zaxes[rows]
+            frames = self.frame_array()
+            bases = frames.origins[frames.rows(path)]
+        else:
+            tool_frames = [self.network.node_attribute(node, 'tool_frame') for node in path]
+            if any(frame is None for frame in tool_frames):
+                raise ValueError('Calculate the fabrication parameters before checking the workspace.')
+            origins = np.array([frame.point for frame in tool_frames], dtype=float).reshape(-1, 3)
+            zaxes = np.array([frame.zaxis for frame in tool_frames], dtype=float).reshape(-1, 3)
+            bases = np.array([self.network.node_attribute(node, 'frame').point for node in path],
+                             dtype=float).reshape(-1, 3)
+        with self.instrumentation.timer('check_workspace'):
+            return workspace.violations(origins, zaxes, np.linalg.norm(origins - bases, axis=1))
 
     def set_node_area_radius(self, node, scale):
         area = self.mesh.face_area(node)
         self.network.node_attribute(key=node, name='area', value=(scale**2)*area)
         self.network.node_attribute(key=node, name='radius', value=scale*math.sqrt(area/math.pi))
 
-    def set_node_distance(self, node, num_layers, n_layer, measured=True):
+    def node_distance(self, node, measured=True):
         radius = self.network.node_attribute(key=node, name='radius')
         if measured:
             drange = self.fabrication_parameters['measured_distances']
@@ -304,8 +904,10 @@ class SurfacePathPlanner():
         else:
             drange = self.fabrication_parameters['distance_range']
             rrange = self.fabrication_parameters['radius_range']
+        return ((drange[1]-drange[0])/(rrange[1]-rrange[0]))*radius
 
-        distance = ((drange[1]-drange[0])/(rrange[1]-rrange[0]))*radius
+    def set_node_distance(self, node, num_layers, n_layer, measured=True):
+        distance = self.node_distance(node, measured)
         distance_thickness = self.network.node_attribute(key=node, name='thickness')*(n_layer/num_layers)
         self.network.node_attribute(key=node, name='distance', value=distance)
         frame = self.network.node_attribute(node, 'frame')
@@ -314,13 +916,17 @@ class SurfacePathPlanner():
         self.network.node_attribute(key=node, name='tool_frame', value=tool_frame)
 
     def set_node_thickness(self, node, num_layers):
-        node_color = self.network.node_attribute(node, 'color').rgb255
-        n=0
-        while n < 255:
-            ncol = self.network.node_attribute(n, 'color').rgb255
-            if ncol == node_color:
-                break
-            n+=1
+        if self.field_indices is not None and node in self.field_indices:
+            # Painted with paint_scalar_field
+            n = self.field_indices[node]
+        else:
+            node_color = self.network.node_attribute(node, 'color').rgb255
+            n=0
+            while n < 255:
+                ncol = self.network.node_attribute(n, 'color').rgb255
+                if ncol == node_color:
+                    break
+                n+=1
         t = self.thickness_map[n]
         self.network.node_attribute(key=node, name='thickness', value=t/num_layers)
 
@@ -329,5 +935,180 @@ class SurfacePathPlanner():
         velocity = self.network.node_attribute(key=node, name='radius')/(volume/(self.fabrication_parameters['material_flowrate']/60))
         self.network.node_attribute(key=node, name='velocity', value=velocity)
     
+    # ==========================================================================
+    # Incremental replanning
+    # ==========================================================================
+
+    def mark_dirty(self, faces):
+        """Marks faces whose node attributes have to be recomputed by :meth:`replan`."""
+        self.dirty_faces.update(faces)
+        self.metrics = {}
+
+    def set_vertex_color(self, vertex, rgb255):
+        """Repaints a mesh vertex and marks the faces around it as dirty.
+
+        Painted field indices of these faces are dropped, so their thickness
+        follows the new color.
+        """
+        self.mesh.vertex_attributes(vertex, ['r', 'g', 'b'], rgb255)
+        faces = self.mesh.vertex_faces(vertex)
+        if self.field_indices is not None:
+            for face in faces:
+                self.field_indices.pop(face, None)
+        self.mark_dirty(faces)
+
+    def set_vertex_coordinates(self, vertex, xyz):
+        """Moves a mesh vertex and marks the faces around it as dirty."""
+        self.mesh.vertex_attributes(vertex, 'xyz', xyz)
+        self.geodesic_solver = None
+        self.mark_dirty(self.mesh.vertex_faces(vertex))
+
+    def set_face_skip(self, faces, skip=True):
+        """Excludes faces from the path (or includes them again) on the next :meth:`replan`."""
+        for face in faces:
+            self.skip_edits[face] = skip
+        self.mark_dirty(faces)
+
+    def replan(self):
+        """Updates the dirty nodes and splices a locally repaired path into ``network.path``.
+
+        Only the dirty faces are read from the mesh again. Skipped faces are cut out
+        of the path and their neighbors joined, re-included faces are inserted next
+        to an adjacent path node. If fabrication parameters were calculated before,
+        they are recalculated for the affected nodes with the same layer parameters.
+
+        Returns:
+            tuple: The network and the number of interruptions along the repaired path
+        """
+        if self.mesh is None:
+            raise ValueError
+        self.metrics = {}
+        with self.instrumentation.timer('replan'):
+            dirty = set(self.dirty_faces)
+            lookup = self.thickness_lookup()
+            for face in dirty:
+                self.update_node(face)
+            self.instrumentation.count('dirty_nodes', len(dirty))
+
+            removed = [face for face, skip in self.skip_edits.items() if skip]
+            added = [face for face, skip in self.skip_edits.items() if not skip]
+            self.skipped_faces.update(removed)
+            self.skipped_faces.difference_update(added)
+            self.remove_from_path(removed)
+            inserted = self.insert_into_path(added)
+            dirty.update(inserted)
+            self.dirty_faces = set()
+            self.skip_edits = {}
+
+            if self.layer_parameters is not None:
+                # set_node_thickness looks colors up by node key, so recoloring
+                # one of those nodes changes the thickness of all nodes sharing a color
+                new_lookup = self.thickness_lookup()
+                changed = set(color for color in set(lookup) | set(new_lookup) if lookup.get(color) != new_lookup.get(color))
+                if changed:
+                    dirty.update(node for node in self.network.path if self.node_color(node) in changed)
+                nodes = [node for node in dirty if len(self.network.connected_edges(node))!=0]
+                self.calculate_node_fabrication_parameters(nodes, **self.layer_parameters)
+        return self.network, self.count_interruptions()
+
+    def update_node(self, face):
+        """Reads the geometry and color of a face from the mesh into its node."""
+        point = self.mesh.face_center(face)
+        normal = self.mesh.face_normal(face)
+        color = self.mesh.face_color(face)
+        self.network.node_attributes(face, ['x', 'y', 'z'], point)
+        self.network.node_attributes(face, ['vx', 'vy', 'vz'], normal)
+        self.network.node_attributes(face, ['r', 'g', 'b'], color.rgb255)
+        self.network.node_attribute(face, 'color', color)
+        if self.batch_frames:
+            self.update_frames([face])
+        elif self.network.node_attribute(face, 'frame') is not None:
+            self.set_node_frame(face)
+        self.node_index.update(face)
+
+    def remove_from_path(self, nodes):
+        """Cuts nodes out of the path and joins the nodes before and after them."""
+        nodes = set(node for node in nodes if len(self.network.connected_edges(node))!=0)
+        for node in nodes:
+            self.network.node_attribute(node, 'skip', True)
+        if not nodes:
+            return
+        path = []
+        for index, node in enumerate(self.network.path):
+            if node in nodes:
+                if path and index + 1 < len(self.network.path) and self.network.path[index + 1] not in nodes:
+                    self.add_edge(path[-1], self.network.path[index + 1])
+                continue
+            path.append(node)
+        for node in nodes:
+            for u, v in self.network.connected_edges(node):
+                self.network.delete_edge(u, v)
+        self.network.path = path
+        self.instrumentation.count('removed_nodes', len(nodes))
+
+    def insert_into_path(self, nodes):
+        """Inserts nodes into the path next to an adjacent path node.
+
+        Insertions between two path neighbors of the node are preferred, as they
+        do not add interruptions.
+
+        Returns:
+            list: The inserted nodes
+        """
+        inserted = []
+        for node in nodes:
+            self.network.node_attribute(node, 'skip', False)
+            if len(self.network.connected_edges(node))!=0 or node in self.network.path:
+                continue
+            if not self.network.path:
+                self.network.path.append(node)
+                inserted.append(node)
+                continue
+            position = dict((key, index) for index, key in enumerate(self.network.path))
+            neighbors = set(self.network.node_attribute(node, 'neighbors'))
+            candidates = [position[key] for key in neighbors if key in position]
+            if not candidates:
+                point = self.network.node_coordinates(node)
+                candidates = [min(range(len(self.network.path)),
+                                  key=lambda i: distance_point_point(point, self.network.node_coordinates(self.network.path[i])))]
+            index = candidates[0]
+            for i in candidates:
+                if i + 1 == len(self.network.path) or self.network.path[i + 1] in neighbors:
+                    index = i
+                    break
+            self.splice_into_path(node, index)
+            inserted.append(node)
+        self.instrumentation.count('inserted_nodes', len(inserted))
+        return inserted
+
+    def splice_into_path(self, node, index):
+        """Inserts a node into the path after the node at ``index``."""
+        previous = self.network.path[index]
+        if index + 1 < len(self.network.path):
+            following = self.network.path[index + 1]
+            if self.network.has_edge(previous, following):
+                self.network.delete_edge(previous, following)
+            self.add_edge(previous, node)
+            self.add_edge(node, following)
+        else:
+            self.add_edge(previous, node)
+        self.network.path.insert(index + 1, node)
+
+    def thickness_lookup(self):
+        """Maps each color to the thickness map index :meth:`set_node_thickness` picks for it."""
+        lookup = {}
+        for n in range(255):
+            if n in self.network.node:
+                lookup.setdefault(tuple(self.node_color(n)), n)
+        return lookup
+
+    def count_interruptions(self):
+        """Counts the consecutive path nodes that are not neighbors on the mesh."""
+        n = 0
+        for current, following in zip(self.network.path[:-1], self.network.path[1:]):
+            if following not in self.network.node_attribute(current, 'neighbors'):
+                n += 1
+        return n
+
     def node_color(self, node, color_type='rgb'):
         return self.network.node_attribute(node, 'color').rgb255
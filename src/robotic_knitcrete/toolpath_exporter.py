@@ -0,0 +1,266 @@
+import json
+import math
+import os
+import struct
+from array import array
+from collections import namedtuple
+
+__all__ = [
+    'Target',
+    'toolpath_targets',
+    'network_targets',
+    'export_targets',
+    'write_csv',
+    'write_jsonl',
+    'write_binary',
+    'read_binary',
+    'write_rapid',
+    'write_krl',
+]
+
+Target = namedtuple('Target', ['layer', 'index', 'node', 'x', 'y', 'z', 'qw', 'qx', 'qy', 'qz', 'velocity', 'distance'])
+"""One robot target: tool frame origin and orientation quaternion, velocity and nozzle distance of a path node."""
+
+BINARY_MAGIC = b'KCTP'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sH')
+BINARY_RECORD = struct.Struct('<IIi9d')
+
+
+def toolpath_targets(toolpath, layers=None):
+    """Streams the targets of a :class:`LayeredToolpath` layer by layer.
+
+    Only the tool origins of the current layer are computed at a time, and
+    no compas frames are created.
+
+    Args:
+        toolpath (:class:`LayeredToolpath`): The planned layers
+        layers (list): Layer numbers to export, all by default
+
+    Yields:
+        :class:`Target`
+    """
+    zaxes = toolpath.zaxes
+    quaternions = array('d')
+    for j in range(0, len(toolpath.xaxes), 3):
+        quaternions.extend(quaternion_from_axes(toolpath.xaxes[j:j + 3], toolpath.yaxes[j:j + 3], zaxes[j:j + 3]))
+    for n_layer in (range(toolpath.num_layers) if layers is None else layers):
+        origins = toolpath.tool_origins(n_layer)
+        offsets = toolpath.offsets(n_layer)
+        for i, node in enumerate(toolpath.path):
+            j = 3 * i
+            k = 4 * i
+            yield Target(n_layer, i, node, origins[j], origins[j + 1], origins[j + 2],
+                         quaternions[k], quaternions[k + 1], quaternions[k + 2], quaternions[k + 3], toolpath.velocities[i], -offsets[i])
+
+
+def network_targets(planner):
+    """Streams the targets of the layer last calculated with :meth:`SurfacePathPlanner.calculate_fabrication_parameters`.
+
+    Yields:
+        :class:`Target`
+    """
+    n_layer = (planner.layer_parameters or {}).get('n_layer', 0)
+    index = 0
+    for node in planner.network.path:
+        frame = planner.node_tool_frame(node)
+        if frame is None:
+            continue
+        qw, qx, qy, qz = quaternion_from_axes(frame.xaxis, frame.yaxis, frame.zaxis)
+        distance = distance_point_point(frame.point, planner.network.node_coordinates(node))
+        yield Target(n_layer, index, node, frame.point[0], frame.point[1], frame.point[2],
+                     qw, qx, qy, qz, planner.network.node_attribute(node, 'velocity'), distance)
+        index += 1
+
+
+def export_targets(targets, filepath, **kwargs):
+    """Writes targets in the format given by the file extension.
+
+    ``.csv``, ``.jsonl``, ``.bin``, ``.mod`` (ABB RAPID) and ``.src`` (KUKA KRL)
+    are supported. Keyword arguments go to the writer.
+
+    Returns:
+        int: Number of written targets
+    """
+    writers = {
+        '.csv': write_csv,
+        '.jsonl': write_jsonl,
+        '.bin': write_binary,
+        '.mod': write_rapid,
+        '.src': write_krl,
+    }
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension not in writers:
+        raise ValueError('Unknown toolpath format: {}'.format(extension))
+    return writers[extension](targets, filepath, **kwargs)
+
+
+def write_chunks(lines, f, chunk_size):
+    """Writes lines in chunks of ``chunk_size`` and returns how many were written."""
+    count = 0
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == chunk_size:
+            f.write(''.join(chunk))
+            count += len(chunk)
+            chunk = []
+    f.write(''.join(chunk))
+    return count + len(chunk)
+
+
+def write_csv(targets, filepath, chunk_size=1000, precision=6):
+    """Writes one row per target under a header of the :class:`Target` fields."""
+    row = ','.join(['{}', '{}', '{}'] + ['{:.%df}' % precision] * 9) + '\n'
+    with open(filepath, 'w') as f:
+        f.write(','.join(Target._fields) + '\n')
+        return write_chunks((row.format(*target) for target in targets), f, chunk_size)
+
+
+def write_jsonl(targets, filepath, chunk_size=1000):
+    """Writes one JSON object per target and line."""
+    with open(filepath, 'w') as f:
+        return write_chunks((json.dumps(target._asdict()) + '\n' for target in targets), f, chunk_size)
+
+
+def write_binary(targets, filepath, chunk_size=1000):
+    """Writes targets as fixed-size little-endian records after a short header.
+
+    The header holds ``BINARY_MAGIC`` and the format version, every record
+    the layer, index and node as integers followed by nine doubles, packed
+    with ``BINARY_RECORD``. Records can be read with :func:`read_binary` or
+    ``numpy.fromfile`` with a matching structured dtype.
+    """
+    count = 0
+    with open(filepath, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION))
+        chunk = []
+        for target in targets:
+            chunk.append(BINARY_RECORD.pack(*target))
+            if len(chunk) == chunk_size:
+                f.write(b''.join(chunk))
+                count += len(chunk)
+                chunk = []
+        f.write(b''.join(chunk))
+    return count + len(chunk)
+
+
+def read_binary(filepath, chunk_size=1000):
+    """Streams the targets of a file written by :func:`write_binary`."""
+    with open(filepath, 'rb') as f:
+        magic, version = BINARY_HEADER.unpack(f.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError('Not a toolpath file: {}'.format(filepath))
+        while True:
+            data = f.read(BINARY_RECORD.size * chunk_size)
+            if not data:
+                break
+            for offset in range(0, len(data), BINARY_RECORD.size):
+                yield Target(*BINARY_RECORD.unpack_from(data, offset))
+
+
+def write_rapid(targets, filepath, module='KnitcretePath', tool='tool0', wobj='wobj0', zone='z1',
+                scale=1000.0, velocity_scale=1.0, procedure_size=5000, chunk_size=1000):
+    """Writes an ABB RAPID module with one ``MoveL`` per target.
+
+    The moves are split into procedures of ``procedure_size`` targets, and the
+    ``main`` procedure calling them is written last, so the targets are not
+    counted beforehand.
+
+    Args:
+        scale (float): Factor from planner units to millimeters
+        velocity_scale (float): Factor from node velocities to mm/s
+    """
+    moves = [0]
+
+    def lines():
+        procedures = 0
+        for n, target in enumerate(targets):
+            if n % procedure_size == 0:
+                if procedures:
+                    yield '    ENDPROC\n\n'
+                procedures += 1
+                yield '    PROC path_{}()\n'.format(procedures)
+            yield ('        MoveL [[{:.3f},{:.3f},{:.3f}],[{:.6f},{:.6f},{:.6f},{:.6f}],[0,0,0,0],'
+                   '[9E9,9E9,9E9,9E9,9E9,9E9]],[{:.3f},500,5000,1000],{},{}\\WObj:={};\n').format(
+                target.x * scale, target.y * scale, target.z * scale,
+                target.qw, target.qx, target.qy, target.qz,
+                target.velocity * velocity_scale, zone, tool, wobj)
+            moves[0] += 1
+        if procedures:
+            yield '    ENDPROC\n\n'
+        yield '    PROC main()\n'
+        for n in range(1, procedures + 1):
+            yield '        path_{};\n'.format(n)
+        yield '    ENDPROC\n'
+
+    with open(filepath, 'w') as f:
+        f.write('MODULE {}\n'.format(module))
+        write_chunks(lines(), f, chunk_size)
+        f.write('ENDMODULE\n')
+    return moves[0]
+
+
+def write_krl(targets, filepath, name='knitcrete_path', scale=1000.0, velocity_scale=1.0, chunk_size=1000):
+    """Writes a KUKA KRL program with one ``LIN`` per target.
+
+    The orientation is written as KUKA A, B, C angles (rotations about Z, Y and
+    X in degrees) and the velocity as ``$VEL.CP`` in m/s before every move.
+
+    Args:
+        scale (float): Factor from planner units to millimeters
+        velocity_scale (float): Factor from node velocities to m/s
+    """
+    def lines():
+        for target in targets:
+            a, b, c = abc_from_quaternion(target.qw, target.qx, target.qy, target.qz)
+            yield '$VEL.CP = {:.4f}\n'.format(target.velocity * velocity_scale)
+            yield 'LIN {{X {:.3f}, Y {:.3f}, Z {:.3f}, A {:.4f}, B {:.4f}, C {:.4f}}} C_DIS\n'.format(
+                target.x * scale, target.y * scale, target.z * scale, a, b, c)
+
+    with open(filepath, 'w') as f:
+        f.write('DEF {}()\n'.format(name))
+        f.write('$APO.CDIS = 1.0\n')
+        count = write_chunks(lines(), f, chunk_size) // 2
+        f.write('END\n')
+    return count
+
+
+def distance_point_point(a, b):
+    return math.sqrt((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2)
+
+
+def quaternion_from_axes(xaxis, yaxis, zaxis):
+    """The unit quaternion ``(w, x, y, z)`` of the rotation with the given axes as matrix columns."""
+    m00, m10, m20 = xaxis[0], xaxis[1], xaxis[2]
+    m01, m11, m21 = yaxis[0], yaxis[1], yaxis[2]
+    m02, m12, m22 = zaxis[0], zaxis[1], zaxis[2]
+    trace = m00 + m11 + m22
+    if trace > 0:
+        s = 0.5 / math.sqrt(trace + 1.0)
+        q = (0.25 / s, (m21 - m12) * s, (m02 - m20) * s, (m10 - m01) * s)
+    elif m00 > m11 and m00 > m22:
+        s = 2.0 * math.sqrt(1.0 + m00 - m11 - m22)
+        q = ((m21 - m12) / s, 0.25 * s, (m01 + m10) / s, (m02 + m20) / s)
+    elif m11 > m22:
+        s = 2.0 * math.sqrt(1.0 + m11 - m00 - m22)
+        q = ((m02 - m20) / s, (m01 + m10) / s, 0.25 * s, (m12 + m21) / s)
+    else:
+        s = 2.0 * math.sqrt(1.0 + m22 - m00 - m11)
+        q = ((m10 - m01) / s, (m02 + m20) / s, (m12 + m21) / s, 0.25 * s)
+    if q[0] < 0:
+        q = tuple(-value for value in q)
+    return q
+
+
+def abc_from_quaternion(w, x, y, z):
+    """KUKA A, B, C angles in degrees, the intrinsic Z-Y'-X'' Euler angles of a quaternion."""
+    m00 = 1 - 2 * (y * y + z * z)
+    m10 = 2 * (x * y + w * z)
+    m20 = 2 * (x * z - w * y)
+    m21 = 2 * (y * z + w * x)
+    m22 = 1 - 2 * (x * x + y * y)
+    a = math.atan2(m10, m00)
+    b = math.atan2(-m20, math.sqrt(m00 * m00 + m10 * m10))
+    c = math.atan2(m21, m22)
+    return math.degrees(a), math.degrees(b), math.degrees(c)
@@ -0,0 +1,111 @@
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    # IronPython inside Rhino
+    np = None
+
+__all__ = ['Workspace']
+
+
+class Workspace(object):
+    """Reach envelope of the robot and nozzle limits, checked for all tool frames of a plan at once.
+
+    A tool frame is feasible if its origin lies inside at least one of the
+    envelopes (anywhere if there are none), its z-axis is tilted at most
+    ``max_tilt`` degrees from ``down``, and the nozzle is at least
+    ``min_distance`` away from the surface. The checks run on arrays of
+    origins and axes, so whole plans are screened in milliseconds before a
+    robot simulation.
+
+    Args:
+        max_tilt (float): Largest angle in degrees between the tool z-axis and ``down``, None for no limit
+        min_distance (float): Smallest distance between the nozzle and the surface, None for no limit
+        down (list): Direction of an untilted nozzle
+    """
+
+    def __init__(self, max_tilt=None, min_distance=None, down=(0.0, 0.0, -1.0)):
+        if np is None:
+            raise ImportError('Workspace checks require NumPy')
+        self.max_tilt = max_tilt
+        self.min_distance = min_distance
+        self.down = np.asarray(down, dtype=float) / np.linalg.norm(down)
+        self.boxes = []
+        self.cylinders = []
+
+    def add_box(self, minimum, maximum):
+        """Adds an axis-aligned box envelope between two corners."""
+        self.boxes.append((np.asarray(minimum, dtype=float), np.asarray(maximum, dtype=float)))
+        return self
+
+    def add_cylinder(self, base, axis, radius, height, min_radius=0.0):
+        """Adds a cylinder envelope, e.g. around a robot base, optionally hollow.
+
+        Args:
+            base (list): Center of the bottom disc
+            axis (list): Direction from the bottom to the top disc
+            radius (float): Largest distance from the axis
+            height (float): Distance between the bottom and the top disc
+            min_radius (float): Smallest distance from the axis
+        """
+        axis = np.asarray(axis, dtype=float)
+        self.cylinders.append((np.asarray(base, dtype=float), axis / np.linalg.norm(axis), radius, height, min_radius))
+        return self
+
+    def inside(self, points):
+        """Whether each point of an ``(..., 3)`` array lies in at least one envelope."""
+        points = np.asarray(points, dtype=float)
+        if not self.boxes and not self.cylinders:
+            return np.ones(points.shape[:-1], dtype=bool)
+        inside = np.zeros(points.shape[:-1], dtype=bool)
+        for minimum, maximum in self.boxes:
+            inside |= ((points >= minimum) & (points <= maximum)).all(axis=-1)
+        for base, axis, radius, height, min_radius in self.cylinders:
+            vectors = points - base
+            heights = vectors.dot(axis)
+            radial = np.linalg.norm(vectors - heights[..., None] * axis, axis=-1)
+            inside |= (heights >= 0) & (heights <= height) & (radial >= min_radius) & (radial <= radius)
+        return inside
+
+    def check(self, origins, zaxes, distances=None):
+        """Flags the violations of every limit separately.
+
+        Args:
+            origins (array-like): Tool frame origins, ``(..., 3)``
+            zaxes (array-like): Tool frame z-axes, broadcastable to ``origins``
+            distances (array-like): Nozzle distances to the surface, ``origins.shape[:-1]``
+
+        Returns:
+            dict: ``'envelope'``, ``'tilt'`` and ``'distance'`` boolean masks, True where violated
+        """
+        origins = np.asarray(origins, dtype=float)
+        shape = origins.shape[:-1]
+        violations = {'envelope': ~self.inside(origins)}
+        if self.max_tilt is None:
+            violations['tilt'] = np.zeros(shape, dtype=bool)
+        else:
+            zaxes = np.asarray(zaxes, dtype=float)
+            cosines = zaxes.dot(self.down) / np.linalg.norm(zaxes, axis=-1)
+            violations['tilt'] = np.broadcast_to(cosines < math.cos(math.radians(self.max_tilt)), shape)
+        if self.min_distance is None or distances is None:
+            violations['distance'] = np.zeros(shape, dtype=bool)
+        else:
+            violations['distance'] = np.broadcast_to(np.asarray(distances, dtype=float) < self.min_distance, shape)
+        return violations
+
+    def violations(self, origins, zaxes, distances=None):
+        """True for every tool frame that violates any limit, see :meth:`check`."""
+        masks = list(self.check(origins, zaxes, distances).values())
+        return masks[0] | masks[1] | masks[2]
+
+    def check_toolpath(self, toolpath, layers=None):
+        """Flags the infeasible tool frames of all layers of a :class:`LayeredToolpath`.
+
+        Returns:
+            numpy.ndarray: Boolean mask of shape ``(len(layers), len(path))``
+        """
+        origins = toolpath.tool_origins_numpy(layers)
+        zaxes = np.frombuffer(toolpath.zaxes, dtype=float).reshape(-1, 3)
+        base = np.frombuffer(toolpath.origins, dtype=float).reshape(-1, 3)
+        return self.violations(origins, zaxes, np.linalg.norm(origins - base[None, :, :], axis=-1))
@@ -0,0 +1,42 @@
+import json
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KNITTING_FOLDER = os.path.join(HERE, '..', '..', 'src', 'knitting')
+# The planner grids are shared with the unit tests
+TESTS_FOLDER = os.path.dirname(HERE)
+
+for folder in (KNITTING_FOLDER, TESTS_FOLDER):
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+
+def benchmark_sizes(all_sizes, variable, default):
+    """Returns the sizes up to the maximum set in the environment variable."""
+    max_size = int(os.environ.get(variable, default))
+    return [size for size in all_sizes if size <= max_size]
+
+
+def load_thresholds(filename):
+    with open(os.path.join(HERE, filename), 'r') as f:
+        return json.load(f)
+
+
+def record_throughput(benchmark, items, unit):
+    """Stores the throughput of the last benchmark run in its extra info."""
+    if benchmark.stats is None:
+        # benchmarks are disabled, the function only ran once untimed
+        return None
+    throughput = items / benchmark.stats.stats.mean
+    benchmark.extra_info[unit] = items
+    benchmark.extra_info['{}_per_second'.format(unit)] = throughput
+    return throughput
+
+
+@pytest.fixture
+def enforce_thresholds():
+    """Whether machine-specific limits are checked, only when BENCHMARK_ENFORCE_THRESHOLDS=1."""
+    return os.environ.get('BENCHMARK_ENFORCE_THRESHOLDS', '0') != '0'
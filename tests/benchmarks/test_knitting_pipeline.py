@@ -0,0 +1,150 @@
+"""Benchmarks of the knitting pattern pipeline in ``src/knitting/cli.py``.
+
+Run with ``pytest tests/benchmarks/test_knitting_pipeline.py``. Synthetic
+square patterns from 100x100 up to ``KNIT_BENCHMARK_MAX_SIZE`` pixels per side
+(default 200, up to 8000) are timed per stage and end to end. The throughput
+of each run is stored in the benchmark extra info as pixels/s. The floors in
+``knitting_thresholds.json`` were measured on one machine, so they are only
+checked with ``BENCHMARK_ENFORCE_THRESHOLDS=1``.
+"""
+import os
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+np = pytest.importorskip('numpy')
+cli = pytest.importorskip('cli')
+
+from conftest import KNITTING_FOLDER  # noqa: E402
+from conftest import benchmark_sizes  # noqa: E402
+from conftest import load_thresholds  # noqa: E402
+from conftest import record_throughput  # noqa: E402
+
+SIZES = benchmark_sizes([100, 200, 500, 1000, 2000, 4000, 8000], 'KNIT_BENCHMARK_MAX_SIZE', 200)
+THRESHOLDS = load_thresholds('knitting_thresholds.json')
+SOURCE_KEY = 'front_back'
+TARGET_KEY = 'transfer'
+
+
+@pytest.fixture(scope='module')
+def operations_map():
+    return cli.get_dictionary_from_file(os.path.join(KNITTING_FOLDER, 'input', 'color_settings.json'))
+
+
+@pytest.fixture(scope='module')
+def unit():
+    return np.loadtxt(os.path.join(KNITTING_FOLDER, 'input', 'pattern0.txt'), dtype=str)
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: '{0}x{0}'.format(size))
+def pattern(request, operations_map, unit):
+    size = request.param
+    str_ops_matrix = cli.tessellate_with_unit(unit, size, size)
+    rgb_matrix = np.asarray(cli.generate_image(operations_map, str_ops_matrix))
+    return {
+        'size': size,
+        'pixels': size * size,
+        'str_ops_matrix': [list(row) for row in str_ops_matrix],
+        'rgb_matrix': rgb_matrix,
+    }
+
+
+@pytest.fixture(scope='module')
+def mask_hsv_matrix(pattern):
+    size = pattern['size']
+    levels = [float(10 * (10 * x // size)) for x in range(size)]
+    return [[(0.0, 0.0, value) for value in levels] for _ in range(size)]
+
+
+def check_throughput(benchmark, name, pixels, enforce):
+    throughput = record_throughput(benchmark, pixels, 'pixels')
+    if enforce and throughput is not None:
+        assert throughput >= THRESHOLDS[name], '{} ran at {:.0f} pixels/s, below the {:.0f} pixels/s floor'.format(
+            name, throughput, THRESHOLDS[name])
+
+
+def copy_matrix(str_ops_matrix):
+    return ([list(row) for row in str_ops_matrix], ), {}
+
+
+def test_tessellate_with_unit(benchmark, unit, pattern, enforce_thresholds):
+    size = pattern['size']
+    benchmark(cli.tessellate_with_unit, unit, size, size)
+    check_throughput(benchmark, 'tessellate_with_unit', pattern['pixels'], enforce_thresholds)
+
+
+def test_generate_image(benchmark, operations_map, pattern, enforce_thresholds):
+    benchmark.pedantic(cli.generate_image, args=(operations_map, pattern['str_ops_matrix']), rounds=3)
+    check_throughput(benchmark, 'generate_image', pattern['pixels'], enforce_thresholds)
+
+
+def test_get_str_ops_matrix_from_rgb(benchmark, operations_map, pattern, enforce_thresholds):
+    benchmark.pedantic(cli.get_str_ops_matrix_from_rgb, args=(operations_map, pattern['rgb_matrix']), rounds=1)
+    check_throughput(benchmark, 'get_str_ops_matrix_from_rgb', pattern['pixels'], enforce_thresholds)
+
+
+def test_process_row(benchmark, pattern, enforce_thresholds):
+    def process_rows(str_ops_matrix):
+        return list(cli.process_ops_matrix_per_row(1.0, 0.0, str_ops_matrix, SOURCE_KEY, TARGET_KEY))
+
+    benchmark.pedantic(process_rows, args=(pattern['str_ops_matrix'], ), rounds=3)
+    check_throughput(benchmark, 'process_row', pattern['pixels'], enforce_thresholds)
+
+
+def test_process_attractor(benchmark, pattern, enforce_thresholds):
+    size = pattern['size']
+    benchmark.pedantic(cli.process_attractor,
+                       args=(40, (0.5, 0.5), SOURCE_KEY, TARGET_KEY, size, size, pattern['str_ops_matrix']),
+                       rounds=1)
+    check_throughput(benchmark, 'process_attractor', pattern['pixels'], enforce_thresholds)
+
+
+def test_process_ops_matrix_with_mask(benchmark, pattern, mask_hsv_matrix, enforce_thresholds):
+    def process(str_ops_matrix):
+        return cli.process_ops_matrix_with_mask(str_ops_matrix, mask_hsv_matrix, SOURCE_KEY, TARGET_KEY)
+
+    benchmark.pedantic(process, setup=lambda: copy_matrix(pattern['str_ops_matrix']), rounds=3)
+    check_throughput(benchmark, 'process_ops_matrix_with_mask', pattern['pixels'], enforce_thresholds)
+
+
+@pytest.mark.parametrize('method', ['nearest', 'bilinear'])
+def test_resample_density_matrix(benchmark, pattern, method, enforce_thresholds):
+    # A mask at a third of the pattern resolution
+    size = pattern['size']
+    mask = np.linspace(0.0, 100.0, (size // 3) ** 2).reshape(size // 3, size // 3)
+    density_matrix = benchmark.pedantic(cli.resample_density_matrix, args=(mask, size, size, method), rounds=3)
+    check_throughput(benchmark, 'resample_density_matrix', pattern['pixels'], enforce_thresholds)
+    assert density_matrix.shape == (size, size)
+    assert density_matrix.min() >= mask.min() and density_matrix.max() <= mask.max()
+
+
+def test_generate_from_source_end_to_end(benchmark, operations_map, unit, pattern, enforce_thresholds):
+    size = pattern['size']
+
+    def generate():
+        return cli.render_sheet(operations_map, unit, size, size)
+
+    benchmark.pedantic(generate, rounds=3)
+    check_throughput(benchmark, 'generate_from_source', pattern['pixels'], enforce_thresholds)
+
+
+def test_generate_rle_from_source_end_to_end(benchmark, operations_map, unit, pattern, enforce_thresholds):
+    size = pattern['size']
+
+    def generate():
+        return cli.render_sheet(operations_map, unit, size, size, 'rle')
+
+    rle_pattern = benchmark.pedantic(generate, rounds=3)
+    check_throughput(benchmark, 'generate_rle_from_source', pattern['pixels'], enforce_thresholds)
+    assert len(rle_pattern.rows) <= len(unit)
+    assert (rle_pattern.decode() == pattern['str_ops_matrix']).all()
+
+
+def test_post_process_with_attractor_end_to_end(benchmark, operations_map, pattern, enforce_thresholds):
+    def post_process():
+        str_ops_matrix = cli.get_str_ops_matrix_from_rgb(operations_map, pattern['rgb_matrix'])
+        processed = cli.process_ops_matrix_with_attractor(str_ops_matrix, 40, (0.5, 0.5), SOURCE_KEY, TARGET_KEY)
+        return cli.generate_image(operations_map, processed)
+
+    benchmark.pedantic(post_process, rounds=1)
+    check_throughput(benchmark, 'post_process_with_attractor', pattern['pixels'], enforce_thresholds)
@@ -0,0 +1,367 @@
+"""Benchmarks of :class:`robotic_knitcrete.SurfacePathPlanner` on synthetic surfaces.
+
+Parametric quad grids (planar, cylindrical and doubly curved) from
+``tests/grids.py`` are built with ``PlannerMesh.from_vertices_and_faces`` in
+the same vertex and face order as ``PlannerMesh.from_surface``, so no Rhino or
+Grasshopper definition is needed.
+
+Run the timings with ``pytest tests/benchmarks/test_surface_path_planner.py``;
+resolutions go up to ``PLANNER_BENCHMARK_MAX_RESOLUTION`` faces per side
+(default 32). ``test_scaling`` fits the exponent ``k`` of ``time ~ faces**k``
+per stage and fails when it exceeds the limits in
+``planner_thresholds.json``, so quadratic hot spots show up early. Wall-clock
+fits are noisy on shared machines, so it only runs with
+``BENCHMARK_ENFORCE_THRESHOLDS=1``. Run the module as a script to print the
+scaling curves and write them to JSON::
+
+    python tests/benchmarks/test_surface_path_planner.py --max-resolution 64 --output scaling.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('compas')
+pytest.importorskip('pytest_benchmark')
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from conftest import benchmark_sizes  # noqa: E402
+from conftest import load_thresholds  # noqa: E402
+from grids import cylindrical, doubly_curved, planar, planned, planner_for, quad_grid  # noqa: E402
+
+WORKERS = [workers for workers in (1, 2, 4, 8) if workers <= (os.cpu_count() or 1)]
+RESOLUTIONS = benchmark_sizes([8, 16, 32, 64, 128, 256], 'PLANNER_BENCHMARK_MAX_RESOLUTION', 32)
+ORIENTATIONS = ['x', 'y', 'z']
+MODES = {
+    'default': (False, False),
+    'alternate': (True, False),
+    'inverse': (False, True),
+    'alternate_inverse': (True, True),
+}
+
+
+SURFACES = {
+    'planar': planar,
+    'cylindrical': cylindrical,
+    'doubly_curved': doubly_curved,
+}
+
+
+# ==============================================================================
+# Stages
+# ==============================================================================
+
+# Every stage sets up a fresh planner and returns the call to be timed.
+
+def stage_set_network_nodes(mesh):
+    planner = planner_for(mesh, with_nodes=False)
+    return planner.set_network_nodes
+
+
+def stage_lowest_axis_path(mesh, orientation, alternate, inverse):
+    planner = planner_for(mesh)
+
+    def run():
+        return planner.lowest_axis_path(orientation, alternate, inverse)
+    return run
+
+
+def stage_calculate_fabrication_parameters(mesh):
+    planner = planned(mesh)
+    return lambda: planner.calculate_fabrication_parameters(2, 1, 1.0)
+
+
+def time_stage(stage, *args):
+    """Times a single call of a stage on a freshly set up planner."""
+    func = stage(*args)
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def scaling_exponent(faces, times):
+    """Least-squares slope of ``log(time)`` over ``log(faces)``."""
+    xs = [math.log(f) for f in faces]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    x_mean = sum(xs) / len(xs)
+    y_mean = sum(ys) / len(ys)
+    numerator = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    denominator = sum((x - x_mean) ** 2 for x in xs)
+    return numerator / denominator
+
+
+def scaling_curves(resolutions, surfaces=None):
+    """Times every stage per surface and resolution and fits its scaling exponent."""
+    stages = {
+        'set_network_nodes': (stage_set_network_nodes, ()),
+        'calculate_fabrication_parameters': (stage_calculate_fabrication_parameters, ()),
+    }
+    for orientation in ORIENTATIONS:
+        for mode, (alternate, inverse) in MODES.items():
+            name = 'lowest_axis_path[{}-{}]'.format(orientation, mode)
+            stages[name] = (stage_lowest_axis_path, (orientation, alternate, inverse))
+
+    curves = {}
+    for surface_name in (surfaces or sorted(SURFACES)):
+        meshes = [quad_grid(SURFACES[surface_name], resolution) for resolution in resolutions]
+        faces = [mesh.number_of_faces() for mesh in meshes]
+        for stage_name, (stage, args) in stages.items():
+            times = [time_stage(stage, mesh, *args) for mesh in meshes]
+            curves.setdefault(surface_name, {})[stage_name] = {
+                'faces': faces,
+                'seconds': times,
+                'exponent': scaling_exponent(faces, times) if len(faces) > 1 else None,
+            }
+    return curves
+
+
+# ==============================================================================
+# Benchmarks
+# ==============================================================================
+
+@pytest.fixture(scope='module', params=sorted(SURFACES))
+def surface(request):
+    return request.param
+
+
+@pytest.fixture(scope='module', params=RESOLUTIONS, ids=lambda r: '{0}x{0}'.format(r))
+def mesh(request, surface):
+    return quad_grid(SURFACES[surface], request.param)
+
+
+def test_set_network_nodes(benchmark, mesh):
+    def setup():
+        return (planner_for(mesh, with_nodes=False), ), {}
+
+    benchmark.pedantic(lambda planner: planner.set_network_nodes(), setup=setup, rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+
+
+@pytest.mark.parametrize('orientation', ORIENTATIONS)
+@pytest.mark.parametrize('mode', sorted(MODES))
+def test_lowest_axis_path(benchmark, mesh, orientation, mode):
+    alternate, inverse = MODES[mode]
+
+    def setup():
+        return (planner_for(mesh), ), {}
+
+    def run(planner):
+        return planner.lowest_axis_path(orientation, alternate, inverse)
+
+    network, interruptions = benchmark.pedantic(run, setup=setup, rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+    benchmark.extra_info['path_length'] = len(network.path)
+    benchmark.extra_info['interruptions'] = interruptions
+
+
+def test_calculate_fabrication_parameters(benchmark, mesh):
+    planner = planned(mesh)
+    benchmark.pedantic(planner.calculate_fabrication_parameters, args=(2, 1, 1.0), rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+
+
+def test_calculate_fabrication_parameters_batched(benchmark, mesh):
+    planner = planner_for(mesh)
+    planner.set_batch_frames()
+    planner.lowest_axis_path('x')
+    benchmark.pedantic(planner.calculate_fabrication_parameters, args=(2, 1, 1.0), rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+
+
+@pytest.mark.parametrize('processes', [1, None], ids=['serial', 'parallel'])
+def test_plan_regions(benchmark, mesh, processes):
+    # Skipping the middle row and column of faces leaves four regions
+    planner = planner_for(mesh)
+    nu = int(round(math.sqrt(mesh.number_of_faces())))
+    planner.set_face_skip([key for key in mesh.faces() if nu // 2 in divmod(key, nu)])
+    planner.replan()
+
+    network, interruptions = benchmark.pedantic(planner.plan_regions, kwargs={'processes': processes}, rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+    benchmark.extra_info['regions'] = len(planner.regions())
+    assert interruptions >= len(planner.regions()) - 1
+
+
+@pytest.fixture(scope='module')
+def region_planner():
+    # Every 16th row and column of a 64x64 doubly curved grid skipped leaves 16 regions
+    mesh = quad_grid(doubly_curved, 64)
+    planner = planner_for(mesh)
+    planner.set_face_skip([key for key in mesh.faces() if any(i % 16 == 15 for i in divmod(key, 64))])
+    planner.replan()
+    return planner
+
+
+def time_plan_regions(planner, workers, rounds=3):
+    """Best wall time of planning the regions with warm worker processes."""
+    planner.plan_regions(processes=workers)
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        planner.plan_regions(processes=workers)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.parametrize('workers', WORKERS)
+def test_plan_regions_workers(benchmark, region_planner, workers):
+    # Warm up the shared pool, so worker start-up is not timed
+    region_planner.plan_regions(processes=workers)
+    benchmark.pedantic(region_planner.plan_regions, kwargs={'processes': workers}, rounds=3)
+    benchmark.extra_info['workers'] = workers
+    benchmark.extra_info['cpus'] = os.cpu_count()
+    benchmark.extra_info['regions'] = len(region_planner.regions())
+
+
+@pytest.mark.skipif(len(WORKERS) < 2, reason='needs at least two CPUs to run regions in parallel')
+def test_plan_regions_speedup(region_planner, record_property):
+    # Shared CI machines make the speedup too noisy to assert, it is only recorded
+    assert len(region_planner.regions()) == 16
+    serial = time_plan_regions(region_planner, 1)
+    record_property('plan_regions_serial_seconds', serial)
+    for workers in WORKERS[1:]:
+        record_property('plan_regions_speedup_{}_workers'.format(workers),
+                        serial / time_plan_regions(region_planner, workers))
+
+
+def test_optimize_jumps(benchmark, mesh):
+    # A Hilbert order around every tenth face skipped has many scattered jumps
+    from robotic_knitcrete import SpaceFillingCurveEngine
+    planner = planner_for(mesh)
+    planner.skipped_faces.update(range(0, mesh.number_of_faces(), 10))
+    planner.plan_path(SpaceFillingCurveEngine('hilbert'))
+    order = list(planner.network.path)
+
+    def setup():
+        planner.reset_path()
+        planner.connect_path(order)
+        return (), {}
+
+    report = benchmark.pedantic(planner.optimize_jumps, setup=setup, rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+    benchmark.extra_info['travel_before'] = report['before']['travel']
+    benchmark.extra_info['travel_after'] = report['after']['travel']
+    assert sorted(planner.network.path) == sorted(order)
+    assert report['before']['interruptions'] > 0
+    assert report['after']['travel'] <= report['before']['travel']
+
+
+def test_coarsened(benchmark, mesh):
+    coarse = benchmark.pedantic(mesh.coarsened, rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+    benchmark.extra_info['coarse_faces'] = coarse.number_of_faces()
+    assert coarse.number_of_faces() <= mesh.number_of_faces()
+    assert all(len(coarse.face_vertices(key)) == 4 for key in coarse.faces())
+    area = sum(mesh.face_area(key) for key in mesh.faces())
+    assert sum(coarse.face_area(key) for key in coarse.faces()) == pytest.approx(area, rel=1e-2)
+    # The coarse grid is still conforming, so the walk reaches every face
+    planner = planner_for(coarse)
+    network, interruptions = planner.lowest_axis_path('x')
+    assert len(network.path) == coarse.number_of_faces()
+
+
+def test_set_thickness_from_pattern(benchmark, mesh):
+    # The mapping itself is checked in tests/test_knit_pattern.py
+    pytest.importorskip('numpy')
+    from compas.colors import Color
+    planner = planner_for(mesh)
+    planner.set_color_map([Color.red(), Color.blue()])
+    nu = mesh.attributes['nu']
+    width = 10 * nu
+    pattern = [['transfer'] * (width // 2) + ['float'] * (width - width // 2) for _ in range(10 * nu)]
+    thicknesses = benchmark.pedantic(planner.set_thickness_from_pattern, args=(pattern, ), rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+    assert len(thicknesses) == mesh.number_of_faces()
+
+
+def test_geodesic_distances(benchmark, mesh):
+    pytest.importorskip('scipy')
+    planner = planner_for(mesh)
+    planner.geodesic_distances()
+    # Later source sets only cost the two back-substitutions
+    corner = min(mesh.vertices(), key=lambda key: sum(mesh.vertex_coordinates(key)))
+    distances = benchmark.pedantic(planner.geodesic_distances, args=([corner], ), rounds=3)
+    benchmark.extra_info['vertices'] = mesh.number_of_vertices()
+    # Accuracy is checked in tests/test_geodesic.py
+    assert distances.min() == pytest.approx(0.0, abs=1e-9)
+
+
+def test_path_metrics(benchmark, mesh):
+    planner = planned(mesh)
+    planner.calculate_fabrication_parameters(3, 1, 2.0)
+
+    def build():
+        planner.metrics = {}
+        return planner.path_metrics()
+
+    metrics = benchmark.pedantic(build, rounds=3)
+    benchmark.extra_info['faces'] = mesh.number_of_faces()
+    assert planner.path_metrics() is metrics
+
+    network = planner.network
+    path = network.path * 3
+    rate = planner.fabrication_parameters['material_flowrate'] / 60.0
+    volumes = [network.node_attribute(key, 'area') * network.node_attribute(key, 'thickness') for key in path]
+    moves = [2.0 * math.dist(network.node_coordinates(a), network.node_coordinates(b)) for a, b in zip(path, path[1:])]
+    jumps = [b not in network.node_attribute(a, 'neighbors') for a, b in zip(path, path[1:])]
+    n = len(network.path)
+    for start, stop in [(0, len(path)), (0, 1), (5, 5), (n - 3, n + 4), (n // 2, 2 * n + 7)]:
+        assert math.isclose(metrics.volume(start, stop), sum(volumes[start:stop]), rel_tol=1e-9)
+        assert math.isclose(metrics.time(start, stop), sum(volumes[start:stop]) / rate, rel_tol=1e-9)
+        assert math.isclose(metrics.length(start, stop), sum(moves[start:stop - 1]), rel_tol=1e-9, abs_tol=1e-12)
+        assert math.isclose(metrics.jump_length(start, stop),
+                            sum(d for d, jump in zip(moves[start:stop - 1], jumps[start:stop - 1]) if jump),
+                            rel_tol=1e-9, abs_tol=1e-12)
+        assert metrics.jumps(start, stop) == sum(jumps[start:stop - 1])
+
+    report = metrics.layer_report()
+    assert [layer['start'] for layer in report] == [0, n, 2 * n]
+    assert math.isclose(sum(layer['length'] for layer in report), sum(moves))
+    assert math.isclose(report[-1]['cumulative_volume'], metrics.volume())
+    starts = metrics.batches(metrics.volume() / 4.5)
+    assert len(starts) >= 5 and starts[0] == 0
+    assert all(metrics.volume(a, b) <= metrics.volume() / 4.5 for a, b in zip(starts, starts[1:] + [len(path)]))
+
+    planner.set_fabrication_parameters(material_flowrate=250.0)
+    assert math.isclose(planner.path_metrics().time(), 2 * metrics.time())
+
+
+@pytest.mark.skipif(len(RESOLUTIONS) < 3, reason='needs at least three resolutions to fit a curve')
+def test_scaling(enforce_thresholds):
+    if not enforce_thresholds:
+        pytest.skip('set BENCHMARK_ENFORCE_THRESHOLDS=1 to check the scaling limits')
+    thresholds = load_thresholds('planner_thresholds.json')
+    curves = scaling_curves(RESOLUTIONS, ['doubly_curved'])
+    failures = []
+    for stage_name, curve in curves['doubly_curved'].items():
+        limit = thresholds.get(stage_name.split('[')[0])
+        if limit is not None and curve['exponent'] > limit:
+            failures.append('{} scales with faces**{:.2f} (limit {:.2f})'.format(stage_name, curve['exponent'], limit))
+    assert not failures, '\n'.join(failures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prints the scaling curves of the SurfacePathPlanner stages.')
+    parser.add_argument('--max-resolution', type=int, default=64)
+    parser.add_argument('--surface', action='append', choices=sorted(SURFACES))
+    parser.add_argument('--output', help='Path to write the curves to as JSON')
+    args = parser.parse_args(argv)
+
+    resolutions = [r for r in [8, 16, 32, 64, 128, 256] if r <= args.max_resolution]
+    curves = scaling_curves(resolutions, args.surface)
+    for surface_name, stages in curves.items():
+        print(surface_name)
+        for stage_name, curve in stages.items():
+            timings = '  '.join('{}:{:.4f}s'.format(f, t) for f, t in zip(curve['faces'], curve['seconds']))
+            print('  {:<45} k={:.2f}  {}'.format(stage_name, curve['exponent'] or 0.0, timings))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(curves, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
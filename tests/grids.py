@@ -0,0 +1,56 @@
+"""Small quad grids and planners shared by the planner unit tests and benchmarks."""
+import math
+
+from robotic_knitcrete import PlannerMesh
+from robotic_knitcrete import SurfacePathPlanner
+
+
+def planar(u, v):
+    return [u, v, 0.0]
+
+
+def cylindrical(u, v):
+    return [math.cos(math.pi * u), 2.0 * v, math.sin(math.pi * u)]
+
+
+def doubly_curved(u, v):
+    return [u, v, 0.3 * math.sin(math.pi * u) * math.sin(math.pi * v)]
+
+
+def quad_grid(surface, nu, nv=None):
+    """Creates a quad mesh sampling ``surface(u, v)`` on a ``nu`` x ``nv`` grid."""
+    nv = nv or nu
+    vertices = [surface(float(i) / nu, float(j) / nv) for i in range(nu + 1) for j in range(nv + 1)]
+    faces = [[
+        i * (nv + 1) + j,
+        (i + 1) * (nv + 1) + j,
+        (i + 1) * (nv + 1) + j + 1,
+        i * (nv + 1) + j + 1
+    ] for i in range(nu) for j in range(nv)]
+    mesh = PlannerMesh.from_vertices_and_faces(vertices, faces)
+    mesh.attributes.update({'nu': nu, 'nv': nv})
+    for key in mesh.faces():
+        mesh.face_attributes(key, ['u', 'v'], divmod(key, nv))
+    return mesh
+
+
+def paint(mesh, rgb255=(255, 0, 0), vertices=None):
+    """Colors vertices of a mesh, all of them by default."""
+    for vertex in mesh.vertices() if vertices is None else vertices:
+        mesh.vertex_attributes(vertex, ['r', 'g', 'b'], rgb255)
+    return mesh
+
+
+def planner_for(mesh, with_nodes=True):
+    planner = SurfacePathPlanner()
+    planner.set_quad_mesh(mesh)
+    planner.set_thickness_map([0.010, 0.020])
+    if with_nodes:
+        planner.set_network_nodes()
+    return planner
+
+
+def planned(mesh, orientation='x', alternate=False, inverse=False):
+    planner = planner_for(mesh)
+    planner.lowest_axis_path(orientation, alternate, inverse)
+    return planner
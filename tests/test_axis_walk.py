@@ -0,0 +1,58 @@
+import pytest
+
+from grids import cylindrical, doubly_curved, planner_for, quad_grid
+
+
+def dict_walk(planner, current, orientation, alternate=False):
+    """The walk over neighbor dicts that the CSR walk replaced, kept as a reference."""
+    network = planner.network
+    n = 0
+    for _ in planner.mesh.faces():
+        network.path.append(current)
+        neighbornodes = {}
+        for i in network.node_attribute(key=current, name='neighbors'):
+            if len(network.connected_edges(key=i)) == 0:
+                if network.node_attribute(key=i, name='skip') == False and alternate == True:  # noqa: E712
+                    neighbornodes.update({i: network.node_attribute(key=i, name=orientation)})
+                elif alternate == False:  # noqa: E712
+                    neighbornodes.update({i: network.node_attribute(key=i, name=orientation)})
+        if neighbornodes != {}:
+            if len(list(neighbornodes.keys())) > 2:
+                following = list(neighbornodes.keys())[
+                    list(neighbornodes.values()).index(sorted(list(neighbornodes.values()))[1])]
+            else:
+                following = list(neighbornodes.keys())[
+                    list(neighbornodes.values()).index(min(list(neighbornodes.values())))]
+            if alternate == True:  # noqa: E712
+                for k in list(neighbornodes.keys()):
+                    if k != following:
+                        network.node_attribute(key=k, name='skip', value=True)
+            planner.add_edge(current, following)
+        else:
+            if network.number_of_nodes() - 1 != network.number_of_edges():
+                following = planner.move_to_closest(current)
+                if following == current:
+                    return n
+                planner.add_edge(current, following)
+                n += 1
+        current = following
+    return n
+
+
+@pytest.mark.parametrize('surface', [cylindrical, doubly_curved], ids=['cylindrical', 'doubly_curved'])
+@pytest.mark.parametrize('orientation', ['x', 'y', 'z'])
+@pytest.mark.parametrize('alternate, inverse', [(False, False), (True, False), (False, True), (True, True)],
+                         ids=['default', 'alternate', 'inverse', 'alternate_inverse'])
+def test_csr_walk_matches_dict_walk(surface, orientation, alternate, inverse):
+    mesh = quad_grid(surface, 9, 7)
+    paths = []
+    for walk in ('csr', 'dict'):
+        planner = planner_for(mesh)
+        current = planner.start_node(orientation, alternate, inverse)
+        if walk == 'csr':
+            n = planner.axis_walk(current, orientation, alternate)
+        else:
+            n = dict_walk(planner, current, orientation, alternate)
+        skips = sorted(key for key in planner.network.nodes() if planner.network.node_attribute(key, 'skip'))
+        paths.append((list(planner.network.path), n, sorted(planner.network.edges()), skips))
+    assert paths[0] == paths[1]
@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from robotic_knitcrete import FrameArray  # noqa: E402
+
+from grids import cylindrical, doubly_curved, planned, quad_grid  # noqa: E402
+
+TOLERANCE = 1e-9
+
+
+def frame_rows(frame):
+    return [list(frame.point), list(frame.xaxis), list(frame.yaxis), list(frame.zaxis)]
+
+
+@pytest.mark.parametrize('surface', [cylindrical, doubly_curved], ids=['cylindrical', 'doubly_curved'])
+def test_batched_frames_match_node_frames(surface):
+    mesh = quad_grid(surface, 9, 7)
+    planner = planned(mesh)
+    planner.calculate_fabrication_parameters(3, 2, 1.5)
+    batched = planned(mesh)
+    batched.set_batch_frames()
+    batched.calculate_fabrication_parameters(3, 2, 1.5)
+
+    nodes = list(planner.network.path)
+    assert nodes == batched.network.path
+    frames = batched.frame_array()
+    tool_frames = batched.tool_frames
+    for node in nodes:
+        expected = frame_rows(planner.network.node_attribute(node, 'frame'))
+        row = frames.index[node]
+        actual = [frames.origins[row], frames.xaxes[row], frames.yaxes[row], frames.zaxes[row]]
+        assert np.allclose(actual, expected, rtol=0.0, atol=TOLERANCE)
+        assert np.allclose(frame_rows(batched.node_frame(node)), expected, rtol=0.0, atol=TOLERANCE)
+        assert np.allclose(frame_rows(batched.node_tool_frame(node)),
+                           frame_rows(planner.network.node_attribute(node, 'tool_frame')), rtol=0.0, atol=TOLERANCE)
+    assert np.allclose(tool_frames.origins[tool_frames.rows(nodes)],
+                       [planner.network.node_attribute(node, 'tool_frame').point for node in nodes],
+                       rtol=0.0, atol=TOLERANCE)
+
+
+def test_normals_facing_up_are_flipped_down():
+    frames = FrameArray.from_normals(['up', 'down'], [[0, 0, 0], [1, 0, 0]], [[0, 0, 2.0], [0.0, 0.6, -0.8]])
+    assert np.allclose(frames.zaxes, [[0, 0, -1], [0.0, 0.6, -0.8]])
+    assert np.allclose(np.einsum('nij,nkj->nik', frames.orientations, frames.orientations), np.eye(3))
+
+
+def test_assign_overwrites_and_appends_rows():
+    frames = FrameArray.from_normals([0, 1], [[0, 0, 0], [1, 0, 0]], [[0, 0, -1], [0, 0, -1]])
+    other = FrameArray.from_normals([1, 2], [[5, 0, 0], [6, 0, 0]], [[1, 0, -1], [0, 1, -1]])
+    frames.assign([1, 2], other.origins, other.orientations)
+    assert frames.keys == [0, 1, 2]
+    assert np.allclose(frames.origins, [[0, 0, 0], [5, 0, 0], [6, 0, 0]])
+    assert np.allclose(frames.orientations[1:], other.orientations)
@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+
+from robotic_knitcrete import GeodesicSolver  # noqa: E402
+
+from grids import planar, planner_for, quad_grid  # noqa: E402
+
+N = 30
+
+
+def euclidean(mesh, sources):
+    points = [mesh.vertex_coordinates(key) for key in sources]
+    return [min(math.hypot(x - p[0], y - p[1]) for p in points) for x, y, _ in
+            (mesh.vertex_coordinates(key) for key in mesh.vertices())]
+
+
+@pytest.mark.parametrize('sources, tolerance', [
+    (lambda mesh: [N // 2 * (N + 1) + N // 2], 0.04),
+    (lambda mesh: [key for key in mesh.vertices() if mesh.vertex_coordinates(key)[0] == 0.0], 0.02),
+], ids=['center', 'boundary_line'])
+def test_planar_distances_are_euclidean(sources, tolerance):
+    mesh = quad_grid(planar, N)
+    sources = sources(mesh)
+    distances = GeodesicSolver(mesh).distances(sources)
+    assert distances.shape == (mesh.number_of_vertices(), )
+    assert distances[sources].min() == pytest.approx(0.0, abs=1e-9)
+    assert np.abs(distances - euclidean(mesh, sources)).max() < tolerance
+
+
+def test_distances_need_a_source():
+    with pytest.raises(ValueError):
+        GeodesicSolver(quad_grid(planar, 4)).distances([])
+
+
+def test_the_solver_is_dropped_when_the_mesh_changes():
+    mesh = quad_grid(planar, 10)
+    planner = planner_for(mesh, with_nodes=False)
+    corner = 0
+    before = planner.geodesic_distances([corner])
+    solver = planner.geodesic_solver
+    assert solver is not None
+    planner.geodesic_distances([corner])
+    assert planner.geodesic_solver is solver
+
+    # Stretching the far column along x lengthens the distances to it
+    far = [key for key in mesh.vertices() if mesh.vertex_coordinates(key)[0] == 1.0]
+    for key in far:
+        x, y, z = mesh.vertex_coordinates(key)
+        planner.set_vertex_coordinates(key, [2.0, y, z])
+    assert planner.geodesic_solver is None
+    after = planner.geodesic_distances([corner])
+    assert planner.geodesic_solver is not solver
+    assert (after[far] > before[far] + 0.5).all()
+
+    planner.set_quad_mesh(quad_grid(planar, 4))
+    assert planner.geodesic_solver is None
+    assert planner.geodesic_distances([corner]).shape == (25, )
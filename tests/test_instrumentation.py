@@ -0,0 +1,58 @@
+import json
+
+from robotic_knitcrete.instrumentation import OFF, STATS, TRACE, Instrumentation
+
+
+def test_off_records_nothing():
+    instrumentation = Instrumentation(OFF, echo=True)
+    instrumentation.count('steps')
+    with instrumentation.timer('walk'):
+        pass
+    instrumentation.trace('step', node=1)
+    assert not instrumentation.enabled
+    assert instrumentation.data == {'level': OFF, 'counters': {}, 'timers': {}, 'events': []}
+
+
+def test_stats_counts_and_times_without_events():
+    instrumentation = Instrumentation(STATS)
+    instrumentation.count('steps')
+    instrumentation.count('steps', 4)
+    for _ in range(3):
+        with instrumentation.timer('walk'):
+            pass
+    instrumentation.trace('step', node=1)
+    data = instrumentation.data
+    assert data['counters'] == {'steps': 5}
+    assert data['timers']['walk']['calls'] == 3
+    assert data['timers']['walk']['seconds'] >= 0.0
+    assert data['events'] == []
+
+
+def test_timer_records_failing_blocks():
+    instrumentation = Instrumentation(STATS)
+    try:
+        with instrumentation.timer('walk'):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert instrumentation.timers['walk']['calls'] == 1
+
+
+def test_trace_keeps_and_echoes_events(capsys):
+    instrumentation = Instrumentation(TRACE, echo=True)
+    instrumentation.trace('step', node=7)
+    assert instrumentation.tracing
+    assert instrumentation.events == [{'event': 'step', 'node': 7}]
+    assert "'node': 7" in capsys.readouterr().out
+
+
+def test_reset_and_json(tmp_path):
+    instrumentation = Instrumentation(TRACE)
+    instrumentation.count('steps')
+    instrumentation.trace('start', node=0)
+    filepath = str(tmp_path / 'run.json')
+    instrumentation.to_json(filepath, pretty=True)
+    with open(filepath) as f:
+        assert json.load(f) == json.loads(instrumentation.to_jsonstring())
+    instrumentation.reset()
+    assert instrumentation.data['counters'] == {} and instrumentation.data['events'] == []
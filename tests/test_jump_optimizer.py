@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from robotic_knitcrete import BoustrophedonEngine, SpaceFillingCurveEngine
+from robotic_knitcrete.jump_optimizer import order_segments, path_segments, tour_length
+
+from grids import doubly_curved, planner_for, quad_grid
+
+
+def scattered_rows(planner, seed):
+    """Boustrophedon rows of a grid printed in a shuffled order, each a continuous segment."""
+    nv = planner.mesh.attributes['nv']
+    rows = [list(range(u * nv, (u + 1) * nv)) for u in range(planner.mesh.attributes['nu'])]
+    random.Random(seed).shuffle(rows)
+    return [key for n, row in enumerate(rows) for key in (row if n % 2 else reversed(row))]
+
+
+def optimized(planner, order):
+    planner.reset_path()
+    planner.connect_path(order)
+    return planner.optimize_jumps()
+
+
+def test_path_segments():
+    neighbors = {0: [1], 1: [0, 2], 2: [1], 3: [4], 4: [3]}
+    assert path_segments([0, 1, 2, 4, 3, 0], neighbors.get) == [[0, 1, 2], [4, 3], [0]]
+
+
+def test_order_segments_is_a_permutation_starting_with_the_first_segment():
+    rng = random.Random(1)
+    starts = [[rng.random(), rng.random(), 0.0] for _ in range(50)]
+    ends = [[x + rng.random() * 0.1, y, z] for x, y, z in starts]
+    tour = order_segments(starts, ends)
+    assert tour[0] == (0, False)
+    assert sorted(segment for segment, _ in tour) == list(range(50))
+    assert tour_length(tour, starts, ends) <= tour_length([(i, False) for i in range(50)], starts, ends)
+
+
+def test_order_segments_keeps_a_short_given_order():
+    # A line of segments already in order, the nearest-neighbor chain cannot do better
+    starts = [[float(i), 0.0, 0.0] for i in range(10)]
+    ends = [[i + 0.5, 0.0, 0.0] for i in range(10)]
+    assert order_segments(starts, ends) == [(i, False) for i in range(10)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_scattered_rows_get_shorter(seed):
+    planner = planner_for(quad_grid(doubly_curved, 16))
+    order = scattered_rows(planner, seed)
+    report = optimized(planner, order)
+    assert sorted(planner.network.path) == sorted(order)
+    assert planner.network.number_of_edges() == len(order) - 1
+    assert report['after']['travel'] < 0.5 * report['before']['travel']
+    assert report['after']['interruptions'] <= report['before']['interruptions']
+    assert report['after'] == planner.path_report()
+
+
+@pytest.mark.parametrize('engine', [SpaceFillingCurveEngine('hilbert'), SpaceFillingCurveEngine('morton'),
+                                    BoustrophedonEngine('v')], ids=lambda engine: engine.name)
+@pytest.mark.parametrize('seed', range(3))
+def test_travel_never_increases(engine, seed):
+    planner = planner_for(quad_grid(doubly_curved, 14, 11))
+    planner.skipped_faces.update(random.Random(seed).sample(range(154), 25))
+    planner.plan_path(engine)
+    path = list(planner.network.path)
+    report = optimized(planner, path)
+    assert sorted(planner.network.path) == sorted(path)
+    assert report['after']['travel'] <= report['before']['travel'] + 1e-9
+    assert report['after']['nodes'] == report['before']['nodes']
+
+
+def test_jump_free_path_is_unchanged():
+    planner = planner_for(quad_grid(doubly_curved, 8))
+    planner.plan_path(BoustrophedonEngine('u'))
+    path = list(planner.network.path)
+    report = optimized(planner, path)
+    assert planner.network.path == path
+    assert report['before'] == report['after']
@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from compas.colors import Color  # noqa: E402
+
+from robotic_knitcrete import PlannerMesh  # noqa: E402
+from robotic_knitcrete.knit_pattern import operation_counts, operation_density, pattern_face_index  # noqa: E402
+
+from grids import planar, planner_for, quad_grid  # noqa: E402
+
+
+def test_pattern_columns_run_along_u():
+    # Faces of quad_grid are numbered u * nv + v
+    mesh = quad_grid(planar, 2, 3)
+    index = pattern_face_index(mesh, 4, 3)
+    assert index.tolist() == [[0, 0, 3, 3], [1, 1, 4, 4], [2, 2, 5, 5]]
+
+
+def test_transposed_pattern_rows_run_along_u():
+    mesh = quad_grid(planar, 2, 3)
+    index = pattern_face_index(mesh, 3, 4, transpose=True)
+    assert index.shape == (4, 3)
+    assert index.tolist() == [[0, 1, 2], [0, 1, 2], [3, 4, 5], [3, 4, 5]]
+    assert pattern_face_index(mesh, 3, 2, transpose=True).tolist() == pattern_face_index(mesh, 2, 3).T.tolist()
+
+
+def test_coarsened_faces_get_the_pixels_of_the_cells_they_cover():
+    # Kept u lines 0, 1 and 4: the second face spans three of the four fine columns
+    mesh = quad_grid(planar, 2, 1)
+    mesh.attributes.update({'u_lines': [0, 1, 4], 'v_lines': [0, 2]})
+    index = pattern_face_index(mesh, 8, 2)
+    assert index.tolist() == [[0, 0, 1, 1, 1, 1, 1, 1]] * 2
+
+
+def test_coarsened_mesh_matches_its_fine_grid():
+    fine = quad_grid(planar, 8, 4)
+    coarse = fine.coarsened(max_span=3)
+    assert coarse.attributes['u_lines'] == [0, 3, 6, 8]
+    covered = fine.covered_faces(coarse)
+    fine_index = pattern_face_index(fine, 16, 8)
+    coarse_index = pattern_face_index(coarse, 16, 8)
+    for key, faces in covered.items():
+        assert set(fine_index[coarse_index == key].tolist()) == set(faces)
+
+
+def test_pixels_off_the_mapped_faces():
+    mesh = quad_grid(planar, 2, 2)
+    index = pattern_face_index(mesh, 2, 2, face_keys=[3, 0])
+    assert index.tolist() == [[1, -1], [-1, 0]]
+    with pytest.raises(ValueError):
+        pattern_face_index(PlannerMesh.from_vertices_and_faces(*mesh.to_vertices_and_faces()), 2, 2)
+
+
+def test_operation_counts_and_density():
+    index = np.array([[0, 0, 1], [-1, 1, 1]])
+    pattern = [['transfer', 'knit', 'transfer'], ['transfer', 'tuck', 'knit']]
+    operations, counts = operation_counts(index, pattern, 3)
+    assert operations == ['knit', 'transfer', 'tuck']
+    assert counts.tolist() == [[1, 1, 0], [1, 1, 1], [0, 0, 0]]
+    assert operation_density(operations, counts).tolist() == pytest.approx([0.5, 1.0 / 3, 0.0])
+    assert operation_density(operations, counts, ('tuck', 'transfer')).tolist() == pytest.approx([0.5, 2.0 / 3, 0.0])
+    assert operation_density(operations, counts, ('miss', )).tolist() == [0.0, 0.0, 0.0]
+    with pytest.raises(ValueError):
+        operation_counts(index, pattern[:1], 3)
+
+
+def test_set_thickness_from_pattern():
+    # Transfers on the first half of the pattern columns, which run along u
+    mesh = quad_grid(planar, 6, 4)
+    planner = planner_for(mesh)
+    planner.set_color_map([Color.red(), Color.blue()])
+    pattern = [['transfer'] * 30 + ['float'] * 30 for _ in range(40)]
+    thicknesses = planner.set_thickness_from_pattern(pattern)
+    for key, thickness in zip(mesh.faces(), thicknesses.tolist()):
+        assert thickness == (0.020 if mesh.face_uv(key)[0] < 3 else 0.010)
+    assert list(planner.pattern_indices) == [(60, 40, False)]
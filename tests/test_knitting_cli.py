@@ -0,0 +1,354 @@
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('click')
+pytest.importorskip('PIL')
+pytest.importorskip('pandas')
+
+from click.testing import CliRunner  # noqa: E402
+
+KNITTING_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'knitting')
+if KNITTING_FOLDER not in sys.path:
+    sys.path.insert(0, KNITTING_FOLDER)
+
+import cli  # noqa: E402
+
+COLOR_SETTINGS = os.path.join(KNITTING_FOLDER, 'input', 'color_settings.json')
+PATTERN_TEXT = os.path.join(KNITTING_FOLDER, 'input', 'pattern0.txt')
+PATTERN_EXCEL = os.path.join(KNITTING_FOLDER, 'input', 'pattern1.xlsx')
+
+
+def invoke(*args, **kwargs):
+    result = CliRunner().invoke(cli.cli, [str(arg) for arg in args], catch_exceptions=False, **kwargs)
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def list_files(folder):
+    return sorted(os.path.relpath(os.path.join(root, name), folder)
+                  for root, _, names in os.walk(folder) for name in names)
+
+
+def test_generate_from_source_jobs(tmp_path):
+    outputs = {}
+    for jobs in (1, 2):
+        output_dir = tmp_path / 'jobs{}'.format(jobs)
+        invoke('generate-from-source', PATTERN_EXCEL, '--color-settings', COLOR_SETTINGS,
+               '--image-width', 30, '--image-height', 20, '--output-dir', output_dir, '--jobs', jobs)
+        outputs[jobs] = dict((name, (output_dir / name).read_bytes()) for name in list_files(str(output_dir)))
+
+    assert sorted(outputs[1]) == [os.path.join('30x20', 'pattern1-Sheet1.bmp'),
+                                  os.path.join('30x20', 'pattern1-Sheet2.bmp')]
+    assert outputs[1] == outputs[2]
+
+
+@pytest.mark.parametrize('memory', [False, True], ids=['time', 'memory'])
+def test_profile_report(tmp_path, memory):
+    profile_dir = tmp_path / 'profiles'
+    args = ['--profile', '--profile-dir', profile_dir]
+    if memory:
+        args.append('--profile-memory')
+    invoke(*(args + ['generate-from-source', PATTERN_TEXT, '--color-settings', COLOR_SETTINGS,
+                     '--image-width', 40, '--image-height', 40, '--output-dir', tmp_path / 'output']))
+
+    reports = list(profile_dir.glob('generate-from-source_*.json'))
+    assert len(reports) == 1
+    report = json.loads(reports[0].read_text())
+    assert report['memory_traced'] is memory
+    assert [stage['name'] for stage in report['stages']] == ['load', 'render']
+    assert report['stages'][1]['pixels'] == 1600
+    assert all((stage['peak_memory_bytes'] is not None) is memory for stage in report['stages'])
+
+
+def test_profile_from_environment(tmp_path):
+    env = {'KNIT_PROFILE': '1', 'KNIT_PROFILE_DIR': str(tmp_path / 'profiles')}
+    invoke('generate-from-source', PATTERN_TEXT, '--color-settings', COLOR_SETTINGS,
+           '--output-dir', tmp_path / 'output', env=env)
+    assert len(list((tmp_path / 'profiles').glob('generate-from-source_*.json'))) == 1
+
+
+@pytest.fixture
+def mask_inputs(tmp_path):
+    """Two rendered patterns of different sizes and a gradient mask."""
+    from PIL import Image
+    invoke('generate-from-source', PATTERN_EXCEL, '--color-settings', COLOR_SETTINGS,
+           '--image-width', 30, '--image-height', 20, '--output-dir', tmp_path / 'patterns')
+    invoke('generate-from-source', PATTERN_TEXT, '--color-settings', COLOR_SETTINGS,
+           '--image-width', 24, '--image-height', 36, '--output-dir', tmp_path / 'patterns')
+    patterns = sorted(str(path) for path in (tmp_path / 'patterns').glob('*/*.bmp'))
+    mask_path = str(tmp_path / 'mask.png')
+    gradient = np.tile(np.linspace(0, 255, 50).astype(np.uint8), (40, 1))
+    Image.fromarray(gradient).save(mask_path)
+    return patterns, mask_path
+
+
+def operation_counts(filepath):
+    operations_map = cli.get_dictionary_from_file(COLOR_SETTINGS)
+    str_ops_matrix = cli.get_str_ops_matrix(operations_map, cli.extract_pattern_matrix(filepath))
+    return collections.Counter(operation for row in str_ops_matrix for operation in row)
+
+
+def run_jobs(server, requests):
+    async def submit():
+        return await asyncio.gather(*(server.handle_request(json.dumps(request).encode()) for request in requests))
+    try:
+        return asyncio.run(submit())
+    finally:
+        server.executor.shutdown()
+
+
+def test_job_server_runs_mask_jobs_concurrently(tmp_path, mask_inputs):
+    patterns, mask_path = mask_inputs
+    expected = []
+    for n, pattern in enumerate(patterns):
+        output_dir = tmp_path / 'cli{}'.format(n)
+        invoke('post-process', 'with-mask', pattern, mask_path, '--color-settings', COLOR_SETTINGS,
+               '--output-dir', output_dir)
+        expected.extend(operation_counts(str(path)) for path in output_dir.glob('post-processed/*.bmp'))
+
+    requests = [{'id': n, 'command': 'with-mask',
+                 'args': {'filepath': pattern, 'mask_path': mask_path, 'color_settings': COLOR_SETTINGS,
+                          'output_dir': str(tmp_path / 'server')}} for n, pattern in enumerate(patterns)]
+    responses = run_jobs(cli.JobServer(jobs=2), requests)
+    assert [response['id'] for response in responses] == list(range(len(patterns)))
+    assert all(response['ok'] for response in responses), responses
+    outputs = [response['outputs'][0] for response in responses]
+    assert len(set(outputs)) == len(patterns)
+    # Transfers are placed at random among pixels of the same mask level, so compare their numbers
+    assert [operation_counts(output) for output in outputs] == expected
+    assert all(counts['transfer'] for counts in expected)
+
+
+def test_job_server_resamples_masks_off_the_event_loop(tmp_path, mask_inputs, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    patterns, mask_path = mask_inputs
+    threads = []
+    resample = cli.resample_density_matrix
+
+    def recorded(*args):
+        threads.append(threading.current_thread())
+        return resample(*args)
+
+    monkeypatch.setattr(cli, 'resample_density_matrix', recorded)
+    server = cli.JobServer()
+    server.executor.shutdown()
+    server.executor = ThreadPoolExecutor(max_workers=2)
+    requests = [{'id': n, 'command': 'with-mask',
+                 'args': {'filepath': patterns[0], 'mask_path': mask_path, 'color_settings': COLOR_SETTINGS,
+                          'output_dir': str(tmp_path / 'server')}} for n in range(2)]
+    responses = run_jobs(server, requests)
+    assert all(response['ok'] for response in responses), responses
+    assert threads and threading.main_thread() not in threads
+
+
+def thread_server():
+    from concurrent.futures import ThreadPoolExecutor
+    server = cli.JobServer()
+    server.executor.shutdown()
+    server.executor = ThreadPoolExecutor(max_workers=4)
+    return server
+
+
+def test_job_server_computes_each_key_once():
+    calls = []
+    release = threading.Event()
+
+    def compute(value):
+        calls.append(value)
+        release.wait(10)
+        if value < 0:
+            raise ValueError(value)
+        return value * 2
+
+    async def requests():
+        loop = asyncio.get_running_loop()
+        futures = [asyncio.ensure_future(server.cached(('key', value), compute, value)) for value in (1, 1, 2, 1)]
+        await asyncio.sleep(0.1)
+        # The first request for a key is still running while the others arrive
+        await loop.run_in_executor(None, release.set)
+        values = await asyncio.gather(*futures)
+        failures = await asyncio.gather(*(server.cached(('key', -1), compute, -1) for _ in range(2)),
+                                        return_exceptions=True)
+        # Failed calls are not cached
+        retried = await asyncio.gather(server.cached(('key', -1), compute, -1), return_exceptions=True)
+        return values, failures, retried
+
+    server = thread_server()
+    try:
+        values, failures, retried = asyncio.run(requests())
+    finally:
+        server.executor.shutdown()
+    assert values == [2, 2, 4, 2]
+    assert all(isinstance(failure, ValueError) for failure in failures + retried)
+    assert calls == [1, 2, -1, -1]
+    assert len(server.cache) == 2
+
+
+def test_job_server_forgets_finished_requests(monkeypatch):
+    import gc
+    import weakref
+    server = thread_server()
+    created = []
+    ensure_future = asyncio.ensure_future
+
+    def recorded(coroutine):
+        task = ensure_future(coroutine)
+        created.append(weakref.ref(task))
+        return task
+
+    class Writer:
+        def __init__(self):
+            self.lines = []
+            self.closed = False
+
+        def write(self, data):
+            self.lines.extend(data.decode().splitlines())
+
+        async def drain(self):
+            pass
+
+        def close(self):
+            self.closed = True
+
+    async def connection():
+        reader, writer = asyncio.StreamReader(), Writer()
+        handler = ensure_future(server.handle_connection(reader, writer))
+        for n in range(3):
+            reader.feed_data((json.dumps({'id': n, 'command': 'unknown'}) + '\n\n').encode())
+        while len(writer.lines) < 3:
+            await asyncio.sleep(0.01)
+        # Let the last request return and run its done callbacks
+        await asyncio.sleep(0.01)
+        gc.collect()
+        # The connection is still open, but its finished requests are gone
+        alive = [ref() is not None for ref in created]
+        reader.feed_eof()
+        await handler
+        return writer, alive
+
+    monkeypatch.setattr(cli.asyncio, 'ensure_future', recorded)
+    try:
+        writer, alive = asyncio.run(connection())
+    finally:
+        server.executor.shutdown()
+    assert sorted(json.loads(line)['id'] for line in writer.lines) == [0, 1, 2]
+    assert not any(json.loads(line)['ok'] for line in writer.lines)
+    assert writer.closed
+    # Only the last request is still bound to a local of the connection
+    assert len(alive) == 3 and not any(alive[:-1])
+
+
+def test_rle_pattern_round_trip(tmp_path):
+    rng = np.random.RandomState(3)
+    unit = np.array(['float', 'front_back', 'back_front', 'transfer'])[rng.randint(0, 4, (5, 7))]
+    matrix = cli.tessellate_with_unit(unit, 30, 23)
+    pattern = cli.encode_rle_pattern(matrix)
+    assert len(pattern.rows) == 5
+    assert (pattern.width, pattern.height) == (28, 20)
+
+    filepath = str(tmp_path / 'pattern.rle')
+    pattern.save(filepath)
+    loaded = cli.RLEPattern.load(filepath)
+    assert (loaded.operations, loaded.width, loaded.rows, loaded.order) == \
+        (pattern.operations, pattern.width, pattern.rows, pattern.order)
+    assert np.array_equal(loaded.decode(), matrix)
+    assert np.array_equal(cli.tessellate_rle_pattern(unit, 30, 23).decode(), matrix)
+
+
+def test_rle_pattern_skips_blank_lines(tmp_path):
+    pattern = cli.encode_rle_pattern([['float', 'transfer'], ['transfer', 'float'], ['float', 'transfer']])
+    filepath = tmp_path / 'pattern.rle'
+    pattern.save(str(filepath))
+    lines = filepath.read_text().splitlines()
+    # Edited by hand, with blank and whitespace-only lines between the records
+    filepath.write_text('\n'.join([lines[0], ''] + [line + '\n  \t' for line in lines[1:]]) + '\n\n')
+    loaded = cli.RLEPattern.load(str(filepath))
+    assert np.array_equal(loaded.decode(), pattern.decode())
+
+
+def test_unknown_input_formats_list_the_supported_ones(tmp_path):
+    import subprocess
+    filepath = tmp_path / 'pattern.csv'
+    filepath.write_text('float,transfer\n')
+    result = subprocess.run([sys.executable, os.path.join(KNITTING_FOLDER, 'cli.py'), 'generate-from-source',
+                             str(filepath), '--color-settings', COLOR_SETTINGS, '--output-dir', str(tmp_path)],
+                            capture_output=True, text=True, timeout=60)
+    assert 'Please use a .txt, .xlsx or .rle file' in result.stdout, result.stderr
+
+
+def test_rle_pattern_rejects_invalid_files(tmp_path):
+    filepath = tmp_path / 'pattern.rle'
+    filepath.write_text('KNITRLE 1\nsize 3 2\noperations back front\nrow 2:0 1:1\norder 1:0\n')
+    with pytest.raises(cli.InvalidPattern):
+        cli.RLEPattern.load(str(filepath))
+    filepath.write_text('BM\n')
+    with pytest.raises(cli.InvalidPattern):
+        cli.RLEPattern.load(str(filepath))
+
+    operations_map = cli.get_dictionary_from_file(COLOR_SETTINGS)
+    with pytest.raises(cli.UnknownKnitOperation):
+        cli.validate_rle_pattern(operations_map, cli.encode_rle_pattern([['float', 'knot']]))
+    with pytest.raises(cli.EmptyCellFound):
+        cli.validate_rle_pattern(operations_map, cli.encode_rle_pattern([['float', 'nan']]))
+
+
+def test_commands_read_rle_patterns(tmp_path):
+    for output_format in ('bmp', 'rle'):
+        invoke('generate-from-source', PATTERN_EXCEL, '--color-settings', COLOR_SETTINGS,
+               '--image-width', 30, '--image-height', 20, '--output-dir', tmp_path / output_format,
+               '--format', output_format)
+    bmp = str(tmp_path / 'bmp' / '30x20' / 'pattern1-Sheet1.bmp')
+    rle = str(tmp_path / 'rle' / '30x20' / 'pattern1-Sheet1.rle')
+    operations_map = cli.get_dictionary_from_file(COLOR_SETTINGS)
+    expected = cli.get_str_ops_matrix(operations_map, cli.extract_pattern_matrix(bmp))
+    assert cli.RLEPattern.load(rle).decode().tolist() == expected
+
+    # An .rle input renders the same image as the pattern it was encoded from,
+    # at its own size, as whole units of the sheet fit into 30x18 pixels
+    invoke('generate-from-source', rle, '--color-settings', COLOR_SETTINGS, '--output-dir', tmp_path / 'from_rle')
+    assert list_files(str(tmp_path / 'from_rle')) == [os.path.join('30x18', 'pattern1-Sheet1.bmp')]
+    assert (tmp_path / 'from_rle' / '30x18' / 'pattern1-Sheet1.bmp').read_bytes() == open(bmp, 'rb').read()
+
+    for filepath in (bmp, rle):
+        output_dir = tmp_path / 'per_row_{}'.format(cli.get_extension_from_path(filepath)[1:])
+        invoke('post-process', 'per-row', filepath, '--color-settings', COLOR_SETTINGS,
+               '--output-dir', output_dir, '--format', 'rle')
+    outputs = [list((tmp_path / name).glob('post-processed/*.rle')) for name in ('per_row_bmp', 'per_row_rle')]
+    assert [len(paths) for paths in outputs] == [1, 1]
+    patterns = [cli.RLEPattern.load(str(paths[0])) for paths in outputs]
+    assert [(pattern.width, pattern.height) for pattern in patterns] == [(30, 18), (30, 18)]
+    assert set(patterns[1].operations) <= set(operations_map)
+
+
+def mask_layout(seed=None):
+    rng = np.random.RandomState(0)
+    str_ops_matrix = np.where(rng.random_sample((30, 40)) < 0.7, 'front_back', 'float').tolist()
+    density_matrix = np.repeat(np.linspace(0, 100, 40)[None, :], 30, axis=0)
+    processed = cli.process_ops_matrix_with_density(str_ops_matrix, density_matrix, 'front_back', 'transfer', seed)
+    return tuple(map(tuple, processed))
+
+
+def test_mask_layouts_follow_the_seed():
+    assert mask_layout(seed=5) == mask_layout(seed=5)
+    random.seed(7)
+    first = mask_layout()
+    random.seed(7)
+    assert mask_layout() == first
+    assert mask_layout() != first
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='Needs forked workers')
+def test_forked_workers_place_transfers_differently():
+    with ProcessPoolExecutor(4, mp_context=multiprocessing.get_context('fork')) as executor:
+        layouts = list(executor.map(mask_layout, [None] * 4))
+    assert len(set(layouts)) == 4
@@ -0,0 +1,54 @@
+import pytest
+
+from grids import cylindrical, doubly_curved, planned, quad_grid
+
+NUM_LAYERS = 4
+SCALE = 1.5
+TOLERANCE = 1e-9
+
+
+def frame_rows(frame):
+    return [list(frame.point), list(frame.xaxis), list(frame.yaxis), list(frame.zaxis)]
+
+
+def assert_close(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a == pytest.approx(e, rel=0.0, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize('batch_frames', [False, True], ids=['node_frames', 'batch_frames'])
+@pytest.mark.parametrize('surface', [cylindrical, doubly_curved], ids=['cylindrical', 'doubly_curved'])
+def test_layers_match_fabrication_parameters_of_every_layer(surface, batch_frames):
+    planner = planned(quad_grid(surface, 7, 5))
+    planner.set_batch_frames(batch_frames)
+    planner.calculate_fabrication_parameters(NUM_LAYERS, 0, SCALE)
+    toolpath = planner.calculate_layers(NUM_LAYERS, SCALE)
+    assert toolpath.path == planner.network.path
+    all_origins = toolpath.tool_origins_numpy() if batch_frames else None
+
+    for n_layer in range(NUM_LAYERS):
+        # The frames set_node_distance builds for this layer
+        planner.calculate_fabrication_parameters(NUM_LAYERS, n_layer, SCALE)
+        expected = [frame_rows(planner.node_tool_frame(node)) for node in toolpath.path]
+        flat = [c for rows in expected for c in rows[0]]
+
+        assert_close(toolpath.tool_origins(n_layer), flat)
+        for rows, frame in zip(expected, toolpath.layer(n_layer)):
+            assert_close(sum(frame_rows(frame), []), sum(rows, []))
+        for i in (0, len(toolpath) // 2, len(toolpath) - 1):
+            assert_close(sum(frame_rows(toolpath.tool_frame(i, n_layer)), []), sum(expected[i], []))
+        if all_origins is not None:
+            assert_close(all_origins[n_layer].ravel().tolist(), flat)
+
+
+def test_layers_stream_in_order():
+    planner = planned(quad_grid(doubly_curved, 4))
+    toolpath = planner.calculate_layers(3, 1.0)
+    layers = [(n_layer, len(list(frames))) for n_layer, frames in toolpath.layers()]
+    assert layers == [(0, 16), (1, 16), (2, 16)]
+    assert [n_layer for n_layer, _ in toolpath.layers([2, 0])] == [2, 0]
+    # Layers move the nozzle away from the surface by one layer thickness each
+    first, second = toolpath.tool_origins(0), toolpath.tool_origins(1)
+    steps = [sum((a - b) ** 2 for a, b in zip(first[j:j + 3], second[j:j + 3])) ** 0.5 for j in range(0, len(first), 3)]
+    assert_close(steps, [t / 3 for t in toolpath.thicknesses])
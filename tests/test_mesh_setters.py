@@ -0,0 +1,92 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from compas.colors import Color  # noqa: E402
+
+from grids import doubly_curved, planar, planner_for, quad_grid  # noqa: E402
+
+
+def half_painted(nu=16):
+    """A planner with a face field, red (0.010) for u < nu / 2 and blue (0.020) beyond."""
+    mesh = quad_grid(planar, nu)
+    planner = planner_for(mesh, with_nodes=False)
+    planner.set_color_map([Color.red(), Color.blue()])
+    planner.paint_scalar_field([float(mesh.face_uv(key)[0] >= nu // 2) for key in mesh.faces()], on='face')
+    return planner
+
+
+def test_coarse_faces_keep_the_painted_thickness():
+    planner = half_painted()
+    coarse = planner.coarsen_mesh()
+    assert coarse.number_of_faces() < 16 * 16
+    planner.set_network_nodes()
+    planner.lowest_axis_path('x')
+    planner.calculate_fabrication_parameters(1, 1, 1.0)
+    thicknesses = {}
+    for key in coarse.faces():
+        thicknesses.setdefault(coarse.face_color(key).rgb255, set()).add(planner.network.node_attribute(key, 'thickness'))
+    assert thicknesses[0, 0, 255] == set([0.020])
+    assert thicknesses[255, 0, 0] == set([0.010])
+    assert sorted(set(planner.field_indices.values())) == [0, 255]
+
+
+def test_covered_faces_partition_the_fine_mesh():
+    fine = quad_grid(doubly_curved, 12, 10)
+    coarse = fine.coarsened(angle=20.0, color_tolerance=1.0, max_span=4)
+    covered = fine.covered_faces(coarse)
+    assert sorted(key for faces in covered.values() for key in faces) == list(range(120))
+    area = sum(fine.face_area(key) for key in covered[0])
+    assert coarse.face_area(0) == pytest.approx(area, rel=0.05)
+
+
+def flat_then_curved(u, v):
+    """Flat for v < 0.5, bending along u beyond."""
+    return [u, v, 0.3 * math.sin(math.pi * u) * max(0.0, 2 * v - 1) ** 2]
+
+
+def curved_then_flat(u, v):
+    """Bending along u for u > 0.5, flat for u < 0.5."""
+    return [u, v, 0.3 * math.sin(math.pi * max(0.0, 2 * u - 1))]
+
+
+def test_coarsening_only_drops_whole_lines():
+    # Across the split the flat half is merged into large faces
+    coarse = quad_grid(curved_then_flat, 16).coarsened(angle=5.0, max_span=8)
+    flat = [key for key in coarse.faces() if coarse.face_uv(key)[0] == 0]
+    assert coarse.attributes['u_lines'][:2] == [0, 8]
+    assert len(flat) == 2
+
+    # Along the split the u lines of the curved half run through the flat half
+    fine = quad_grid(flat_then_curved, 16)
+    coarse = fine.coarsened(angle=5.0, max_span=8)
+    assert coarse.attributes['u_lines'] == list(range(17))
+    assert coarse.attributes['v_lines'][:2] == [0, 8]
+    flat = [key for key in coarse.faces() if coarse.face_uv(key)[1] == 0]
+    covered = fine.covered_faces(coarse)
+    assert len(flat) == 16
+    assert all(len(covered[key]) == 8 for key in flat)
+    assert all(min(fine.face_normal(face)[2] for face in covered[key]) == pytest.approx(1.0) for key in flat)
+
+
+@pytest.mark.parametrize('setter', ['set_quad_mesh', 'coarsen_mesh'])
+def test_mesh_setters_reset_mesh_caches(setter):
+    planner = half_painted()
+    planner.set_batch_frames()
+    planner.set_network_nodes()
+    planner.lowest_axis_path('x')
+    planner.calculate_fabrication_parameters(1, 1, 1.0)
+    planner.face_adjacency()
+    assert planner.frames is not None and len(planner.node_index)
+
+    if setter == 'set_quad_mesh':
+        planner.set_quad_mesh(quad_grid(planar, 4))
+        assert planner.field_indices is None
+    else:
+        planner.coarsen_mesh()
+    assert planner.adjacency is None
+    assert planner.frames is None and planner.tool_frames is None
+    assert len(planner.node_index) == 0
+    assert planner.metrics == {} and planner.pattern_indices == {}
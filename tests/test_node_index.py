@@ -0,0 +1,75 @@
+from compas.datastructures import Network
+
+from robotic_knitcrete import NodeIndex
+
+from grids import cylindrical, planner_for, quad_grid
+
+
+def scan(network, conditions, orientation, func=0, idx=0):
+    """The linear scan of :meth:`SurfacePathPlanner.get_node`."""
+    nodes = list(network.nodes_where(conditions))
+    if not nodes:
+        return None
+    values = [network.node_attribute(key, orientation) for key in nodes]
+    value = [min, max, sorted][func](values)
+    if func == 2:
+        value = value[idx]
+    return nodes[values.index(value)]
+
+
+def grid_network():
+    network = Network()
+    network.update_default_node_attributes({'number_of_neighbors': 0})
+    for i in range(5):
+        for j in range(4):
+            # Equal coordinates on purpose, ties go to the first node
+            network.add_node(i * 4 + j, x=float(i // 2), y=float(j), z=0.0, number_of_neighbors=(i + j) % 3)
+    return network
+
+
+def test_queries_match_scan():
+    network = grid_network()
+    index = NodeIndex(network)
+    for key in network.nodes():
+        index.add(key)
+    assert len(index) == network.number_of_nodes()
+    for conditions in [{}, {'number_of_neighbors': 1}, {'number_of_neighbors': 7}]:
+        for orientation in 'xyz':
+            for func, idx in [(0, 0), (1, 0), (2, 3)]:
+                if func == 2 and len(list(network.nodes_where(conditions))) <= idx:
+                    continue
+                assert index.query(conditions, orientation, func, idx) == scan(network, conditions, orientation,
+                                                                                 func, idx)
+
+
+def test_updates_and_removals():
+    network = grid_network()
+    index = NodeIndex(network)
+    for key in network.nodes():
+        index.add(key)
+    # Build the sorted orders before editing, so they are updated in place
+    index.query({}, 'x')
+    index.query({'number_of_neighbors': 2}, 'y', 1)
+
+    network.node_attributes(7, ['x', 'number_of_neighbors'], [-1.0, 2])
+    index.update(7)
+    network.node_attribute(19, 'y', 10.0)
+    index.add(19)
+    index.remove(0)
+    network.delete_node(0)
+
+    assert 0 not in index and len(index) == network.number_of_nodes()
+    assert index.query({}, 'x') == scan(network, {}, 'x') == 7
+    assert index.query({'number_of_neighbors': 2}, 'y', 1) == scan(network, {'number_of_neighbors': 2}, 'y', 1)
+    assert index.query({'number_of_neighbors': 2}, 'x') == 7
+
+
+def test_planner_get_node_uses_index():
+    planner = planner_for(quad_grid(cylindrical, 6))
+    assert len(planner.node_index) == planner.network.number_of_nodes()
+    for kwargs in [{'number_of_neighbors': 2}, {'number_of_neighbors': 3, 'orientation': 'z', 'func': 1},
+                   {'orientation': 'y', 'func': 2, 'idx': 5}]:
+        conditions = dict((key, value) for key, value in kwargs.items() if key == 'number_of_neighbors')
+        expected = scan(planner.network, conditions, kwargs.get('orientation', 'x'), kwargs.get('func', 0),
+                        kwargs.get('idx', 0))
+        assert planner.get_node(**kwargs) == expected
@@ -0,0 +1,90 @@
+import pytest
+
+from robotic_knitcrete import BoustrophedonEngine, LowestAxisEngine, SpaceFillingCurveEngine
+from robotic_knitcrete.path_engines import hilbert_index, morton_index
+
+from grids import doubly_curved, planar, planner_for, quad_grid
+
+ENGINES = [
+    LowestAxisEngine('x'),
+    LowestAxisEngine('y', inverse=True),
+    BoustrophedonEngine('u'),
+    BoustrophedonEngine('v', reverse=True),
+    SpaceFillingCurveEngine('hilbert'),
+    SpaceFillingCurveEngine('morton', axes='xy'),
+    SpaceFillingCurveEngine('hilbert', order=12),
+]
+
+
+@pytest.mark.parametrize('engine', ENGINES, ids=lambda engine: engine.name)
+def test_engines_visit_every_node_once(engine):
+    planner = planner_for(quad_grid(doubly_curved, 20))
+    _, interruptions = planner.plan_path(engine)
+    path = planner.network.path
+    assert sorted(path) == list(range(400))
+    assert planner.network.number_of_edges() == len(path) - 1
+    assert interruptions == planner.count_interruptions()
+
+
+def test_alternate_walk_visits_unskipped_nodes_once():
+    # Alternate walks print every other row and skip the rows in between
+    planner = planner_for(quad_grid(doubly_curved, 20))
+    planner.plan_path(LowestAxisEngine('y', alternate=True))
+    path = planner.network.path
+    skipped = [key for key in planner.network.nodes() if planner.network.node_attribute(key, 'skip')]
+    assert len(set(path)) == len(path)
+    assert sorted(path + skipped) == list(range(400))
+
+
+@pytest.mark.parametrize('engine', ENGINES[2:], ids=lambda engine: engine.name)
+def test_engines_leave_out_skipped_faces(engine):
+    planner = planner_for(quad_grid(doubly_curved, 20))
+    skipped = set(range(40, 400, 7))
+    planner.skipped_faces.update(skipped)
+    planner.plan_path(engine)
+    assert sorted(planner.network.path) == sorted(set(range(400)) - skipped)
+
+
+def test_hilbert_order_is_continuous_on_a_matching_grid():
+    # 16x16 faces snap to their own cells of the 16x16 curve grid
+    planner = planner_for(quad_grid(planar, 16))
+    _, interruptions = planner.plan_path(SpaceFillingCurveEngine('hilbert'))
+    assert interruptions == 0
+
+
+@pytest.mark.parametrize('index', [hilbert_index, morton_index])
+def test_curve_indices_are_bijective(index):
+    assert sorted(index(3, x, y) for x in range(8) for y in range(8)) == list(range(64))
+
+
+def test_bucketed_order_matches_sorted_order():
+    planner = planner_for(quad_grid(doubly_curved, 13, 9))
+    keys = list(planner.network.nodes())
+    order = SpaceFillingCurveEngine('hilbert', axes='xy', order=5).order(planner)
+    # The sort the bucketing replaced, over the same 32x32 cells
+    points = [planner.network.node_coordinates(key) for key in keys]
+    scale = 31 / max(max(p[i] for p in points) - min(p[i] for p in points) for i in range(2))
+    cells = [hilbert_index(5, int((p[0] - min(q[0] for q in points)) * scale),
+                           int((p[1] - min(q[1] for q in points)) * scale)) for p in points]
+    assert order == [key for _, _, key in sorted(zip(cells, range(len(keys)), keys))]
+
+
+def test_select_path_keeps_the_lowest_cost_path():
+    mesh = quad_grid(doubly_curved, 12)
+    engines = [SpaceFillingCurveEngine('morton'), BoustrophedonEngine('u'), LowestAxisEngine('z'),
+               SpaceFillingCurveEngine('hilbert')]
+    costs = []
+    for engine in engines:
+        planner = planner_for(mesh)
+        planner.plan_path(engine)
+        report = planner.path_report()
+        costs.append((report['interruptions'], report['travel'], list(planner.network.path)))
+
+    planner = planner_for(mesh)
+    reports = planner.select_path(engines)
+    best = min(range(len(engines)), key=lambda i: costs[i][:2] + (i, ))
+    assert [report['engine'] for report in reports][0] == engines[best].name
+    assert sorted((report['interruptions'], report['travel']) for report in reports) == \
+        [(report['interruptions'], report['travel']) for report in reports]
+    assert planner.network.path == costs[best][2]
+    assert planner.count_interruptions() == costs[best][0]
@@ -0,0 +1,90 @@
+import pytest
+
+from robotic_knitcrete import PathMetrics
+
+# Three nodes in three layers, targets 0 to 8: a b c | a b c | a b c
+PATH = ['a', 'b', 'c']
+VOLUMES = [1.0, 2.0, 3.0]
+TIMES = [0.5, 1.0, 1.5]
+# a -> b is a move to a neighbor, b -> c a jump, and c -> a the return jump
+LENGTHS = [1.0, 2.0]
+JUMPS = [False, True]
+
+
+def metrics(return_jump=True, num_layers=3):
+    return PathMetrics(PATH, VOLUMES, TIMES, LENGTHS, JUMPS, 4.0, return_jump, num_layers)
+
+
+def test_ranges_run_across_layers():
+    m = metrics()
+    assert len(m) == 9
+    assert m.volume() == 18.0 and m.time() == 9.0
+    # Targets 2 and 3 are c of the first and a of the second layer
+    assert m.volume(2, 4) == 4.0
+    assert m.volume(1, 8) == 14.0
+    assert m.time(2, 4) == 2.0
+    assert m.volume(5, 5) == 0.0
+    assert m.volume(8, 9) == 3.0
+
+
+def test_travel_includes_the_return_jump():
+    m = metrics()
+    # 1 + 2, the return 4, then 1 + 2 again
+    assert m.length(0, 6) == 10.0
+    assert m.jump_length(0, 6) == 8.0
+    assert m.jumps(0, 6) == 3
+    assert m.length(2, 4) == 4.0 and m.jumps(2, 4) == 1
+    # Single targets and empty ranges have no travel
+    assert m.length(4, 5) == 0.0 and m.length(4, 4) == 0.0
+    assert m.length() == 3 * 3.0 + 2 * 4.0
+
+    close = metrics(return_jump=False)
+    assert close.length(0, 6) == 10.0
+    assert close.jump_length(0, 6) == 4.0
+    assert close.jumps(0, 6) == 2
+    assert close.jumps() == 3
+
+
+def test_target_at_volume():
+    m = metrics()
+    assert [m.target_at_volume(v) for v in [0.0, 0.5, 1.0, 2.9, 3.0, 6.0, 7.0, 17.9]] == [0, 0, 1, 1, 2, 3, 4, 8]
+    assert m.target_at_volume(18.0) == 9
+    assert m.target_at_volume(100.0) == 9
+    empty = PathMetrics(PATH, [0.0] * 3, [0.0] * 3, LENGTHS, JUMPS)
+    assert empty.target_at_volume(1.0) == 3
+
+
+def test_batches():
+    m = metrics()
+    assert m.batches(3.0) == [0, 2, 3, 5, 6, 8]
+    assert m.batches(6.0) == [0, 3, 6]
+    assert m.batches(100.0) == [0]
+    # Targets larger than the batch volume get a batch of their own
+    assert m.batches(1.5) == [0, 1, 2, 3, 4, 5, 6, 7, 8]
+    with pytest.raises(ValueError):
+        m.batches(0.0)
+
+
+def test_layer_report():
+    report = metrics().layer_report()
+    assert [layer['start'] for layer in report] == [0, 3, 6]
+    assert [layer['volume'] for layer in report] == [6.0, 6.0, 6.0]
+    # The return move is counted in the layer it leaves
+    assert [layer['length'] for layer in report] == [7.0, 7.0, 3.0]
+    assert [layer['jumps'] for layer in report] == [2, 2, 1]
+    assert [layer['cumulative_volume'] for layer in report] == [6.0, 12.0, 18.0]
+    assert [layer['cumulative_time'] for layer in report] == [3.0, 6.0, 9.0]
+
+
+def test_invalid_input():
+    m = metrics()
+    with pytest.raises(ValueError):
+        m.volume(4, 2)
+    with pytest.raises(IndexError):
+        m.volume(0, 10)
+    with pytest.raises(ValueError):
+        PathMetrics(PATH, VOLUMES, TIMES, LENGTHS, [False])
+    with pytest.raises(ValueError):
+        PathMetrics(PATH, VOLUMES, TIMES, LENGTHS + [1.0], JUMPS + [False])
+    with pytest.raises(ValueError):
+        PathMetrics(PATH, VOLUMES[:2], TIMES[:2], LENGTHS, JUMPS)
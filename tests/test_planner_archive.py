@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from compas.colors import Color  # noqa: E402
+
+from robotic_knitcrete import PlannerArchive, SurfacePathPlanner  # noqa: E402
+from robotic_knitcrete.toolpath_exporter import network_targets  # noqa: E402
+
+from grids import doubly_curved, planner_for, quad_grid  # noqa: E402
+
+NODE_ATTRIBUTES = ['x', 'y', 'z', 'skip', 'neighbors', 'thickness', 'velocity', 'distance']
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['node_frames', 'batch_frames'])
+def planner(request):
+    mesh = quad_grid(doubly_curved, 9, 7)
+    planner = planner_for(mesh, with_nodes=False)
+    planner.set_color_map([Color.red(), Color.blue()])
+    planner.paint_scalar_field([mesh.face_centroid(key)[0] for key in mesh.faces()], on='face')
+    planner.set_batch_frames(request.param)
+    planner.set_network_nodes()
+    planner.lowest_axis_path('x')
+    planner.calculate_fabrication_parameters(3, 2, 1.5)
+    return planner
+
+
+def open_files():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def frame_rows(frame):
+    return [list(frame.point), list(frame.xaxis), list(frame.yaxis), list(frame.zaxis)]
+
+
+def assert_same_targets(targets, expected):
+    # Frames are rebuilt from their saved axes, so quaternions may differ in the last digit
+    targets, expected = list(targets), list(expected)
+    assert [target[:3] for target in targets] == [target[:3] for target in expected]
+    assert np.allclose([target[3:] for target in targets], [target[3:] for target in expected], rtol=1e-12, atol=1e-12)
+
+
+def assert_same_planner(loaded, planner):
+    assert loaded.network.path == planner.network.path
+    assert sorted(loaded.network.edges()) == sorted(planner.network.edges())
+    for node in planner.network.nodes():
+        assert loaded.network.node_attributes(node, NODE_ATTRIBUTES) == \
+            planner.network.node_attributes(node, NODE_ATTRIBUTES)
+        assert np.allclose(frame_rows(loaded.node_tool_frame(node)), frame_rows(planner.node_tool_frame(node)))
+    assert list(loaded.mesh.vertices()) == list(planner.mesh.vertices())
+    assert [loaded.mesh.face_vertices(key) for key in loaded.mesh.faces()] == \
+        [planner.mesh.face_vertices(key) for key in planner.mesh.faces()]
+    assert loaded.mesh.attributes['nu'] == planner.mesh.attributes['nu']
+    assert loaded.field_indices == planner.field_indices
+    assert loaded.thickness_map == planner.thickness_map
+    assert loaded.layer_parameters == planner.layer_parameters
+    assert loaded.batch_frames == planner.batch_frames
+
+
+@pytest.mark.parametrize('filename', ['planner.npz', 'planner'], ids=['npz', 'directory'])
+def test_save_load_round_trip(tmp_path, planner, filename):
+    path = str(tmp_path / filename)
+    planner.save(path)
+    loaded = SurfacePathPlanner.load(path)
+    assert planner.field_indices
+    assert_same_planner(loaded, planner)
+    assert_same_targets(network_targets(loaded), network_targets(planner))
+
+
+@pytest.mark.parametrize('filename', ['planner.npz', 'planner'], ids=['npz', 'directory'])
+def test_archive_streams_the_saved_path(tmp_path, planner, filename):
+    path = str(tmp_path / filename)
+    planner.save(path)
+    archive = PlannerArchive.load(path)
+    if filename.endswith('.npz'):
+        assert not any(isinstance(column, np.memmap) for column in archive.columns.values())
+    else:
+        assert all(isinstance(column, np.memmap) for column in archive.columns.values())
+    assert archive.path.tolist() == planner.network.path
+    assert_same_targets(archive.targets(), network_targets(planner))
+    toolpath = archive.toolpath()
+    assert toolpath.path == planner.network.path
+    assert toolpath.num_layers == 3
+    assert np.allclose(np.reshape(toolpath.origins, (-1, 3)),
+                       [planner.node_frame(node).point for node in planner.network.path])
+    assert list(toolpath.velocities) == [planner.network.node_attribute(node, 'velocity')
+                                         for node in planner.network.path]
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='Counts open files through /proc')
+def test_loading_an_npz_archive_closes_it(tmp_path, planner):
+    path = str(tmp_path / 'planner.npz')
+    planner.save(path)
+    before = open_files()
+    for _ in range(5):
+        PlannerArchive.load(path)
+    assert open_files() == before
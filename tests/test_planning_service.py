@@ -0,0 +1,118 @@
+import json
+import threading
+
+import pytest
+
+from robotic_knitcrete.planning_service import PlanningClient, PlanningService, RequestHandler, ThreadingTCPServer
+
+from grids import doubly_curved, quad_grid
+
+MESH = quad_grid(doubly_curved, 8)
+LAYER = {'num_layers': 2, 'n_layer': 1, 'scale': 1.0}
+
+
+def mesh_params(mesh=MESH):
+    vertices, faces = mesh.to_vertices_and_faces()
+    return {'vertices': vertices, 'faces': faces, 'colors': [[255, 0, 0]] * len(vertices),
+            'attributes': {'nu': 8, 'nv': 8}}
+
+
+class Service(object):
+    """Sends requests through JSON like the socket handler does."""
+
+    def __init__(self):
+        self.service = PlanningService()
+        self.count = 0
+        self.session = self.request('open')['session']
+
+    def request(self, op, **params):
+        self.count += 1
+        message = {'id': self.count, 'op': op, 'session': getattr(self, 'session', None), 'params': params}
+        response = json.loads(json.dumps(self.service.handle(json.loads(json.dumps(message)))))
+        assert response['id'] == self.count
+        assert response['ok'], response.get('error')
+        return response['result']
+
+
+@pytest.fixture
+def service():
+    service = Service()
+    assert service.request('set_mesh', **mesh_params())
+    service.request('set_parameters', thickness_map=[0.010, 0.020], layer=LAYER)
+    return service
+
+
+def test_repeated_plan_recomputes_nothing(service):
+    first = service.request('plan')
+    assert first['stages'] == {'nodes': True, 'replan': False, 'path': True, 'fabrication': True}
+    assert len(first['path']) == 64
+    assert sorted(first['targets']) == sorted(str(node) for node in first['path'])
+
+    second = service.request('plan')
+    assert second['stages'] == {'nodes': False, 'replan': False, 'path': False, 'fabrication': False}
+    assert 'path' not in second
+    assert second['targets'] == {} and second['removed'] == []
+    assert second['report'] == first['report']
+
+    full = service.request('plan', full=True)
+    assert not any(full['stages'].values())
+    assert full['path'] == first['path'] and full['targets'] == first['targets']
+
+
+def test_resending_the_mesh_keeps_the_session(service):
+    first = service.request('plan')
+    assert not service.request('set_mesh', **mesh_params())
+    service.request('set_parameters', layer=LAYER)
+    second = service.request('plan')
+    assert not any(second['stages'].values())
+    assert second['targets'] == {}
+
+    service.request('set_parameters', layer=dict(LAYER, n_layer=2))
+    changed = service.request('plan')
+    assert changed['stages'] == {'nodes': False, 'replan': False, 'path': False, 'fabrication': True}
+    assert sorted(changed['targets']) == sorted(first['targets'])
+
+
+def test_deltas_only_send_what_changed(service):
+    first = service.request('plan')
+    vertex = MESH.face_vertices(27)[0]
+    faces = MESH.vertex_faces(vertex)
+    service.request('update_mesh', vertex_coordinates={vertex: [0.5, 0.5, 1.0]})
+    moved = service.request('plan')
+    assert moved['stages'] == {'nodes': False, 'replan': True, 'path': False, 'fabrication': False}
+    assert 'path' not in moved
+    assert sorted(int(node) for node in moved['targets']) == sorted(faces)
+    assert moved['removed'] == []
+
+    service.request('update_mesh', skip={'27': True})
+    skipped = service.request('plan')
+    assert skipped['removed'] == [27]
+    assert sorted(skipped['path']) == sorted(node for node in first['path'] if node != 27)
+
+
+def test_unknown_requests_fail_without_closing_the_service():
+    service = PlanningService()
+    assert service.handle({'id': 1, 'op': 'plan', 'session': 'missing'})['ok'] is False
+    assert service.handle({'id': 2, 'op': 'delete', 'session': None})['error'].startswith('ValueError')
+    session = service.handle({'id': 3, 'op': 'open', 'params': {'session': 'gh'}})['result']['session']
+    assert service.handle({'id': 4, 'op': 'plan', 'session': session})['error'].startswith('ValueError')
+    assert service.handle({'id': 5, 'op': 'sessions'})['result'] == {'sessions': ['gh']}
+
+
+def test_client_over_tcp():
+    server = ThreadingTCPServer(('127.0.0.1', 0), RequestHandler)
+    server.service = PlanningService()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        client = PlanningClient(*server.server_address, session='gh', timeout=10.0)
+        assert client.set_mesh(**mesh_params())
+        client.set_parameters(thickness_map=[0.010, 0.020], layer=LAYER)
+        assert len(client.plan()['targets']) == 64
+        assert client.plan()['targets'] == {}
+        client.close()
+        assert server.service.sessions == {}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,44 @@
+import types
+
+import pytest
+
+from robotic_knitcrete import region_planner
+
+from grids import doubly_curved, planner_for, quad_grid
+
+
+def crossed_planner():
+    """A 12x12 grid split into four regions by a skipped row and column."""
+    mesh = quad_grid(doubly_curved, 12)
+    planner = planner_for(mesh)
+    planner.set_face_skip([key for key in mesh.faces() if 5 in divmod(key, 12)])
+    planner.replan()
+    return planner
+
+
+@pytest.mark.parametrize('rhino', [
+    {'ProcessPoolExecutor': None},
+    {'sys': types.SimpleNamespace(platform='cli')},
+], ids=['no_pool', 'ironpython'])
+def test_regions_are_planned_serially_inside_rhino(monkeypatch, rhino):
+    planner = crossed_planner()
+    assert len(planner.regions()) == 4
+    planner.plan_regions(processes=1)
+    expected = list(planner.network.path)
+
+    for name, value in rhino.items():
+        monkeypatch.setattr(region_planner, name, value)
+    # IronPython 2.7 has no os.cpu_count either
+    monkeypatch.setattr(region_planner, 'os', types.SimpleNamespace())
+    assert not region_planner.worker_processes()
+    planner.plan_regions()
+    assert planner.network.path == expected
+    with pytest.raises(ImportError):
+        region_planner.shared_executor()
+
+
+def test_regions_cover_the_unskipped_faces():
+    planner = crossed_planner()
+    planner.plan_regions(processes=1)
+    assert sorted(planner.network.path) == sorted(set(range(144)) - planner.skipped_faces)
+    assert planner.network.number_of_edges() == len(planner.network.path) - 1
@@ -0,0 +1,86 @@
+import pytest
+
+from grids import doubly_curved, paint, planned, quad_grid
+
+
+def assert_connected_path(planner, nodes):
+    path = planner.network.path
+    assert sorted(path) == sorted(nodes)
+    assert planner.network.number_of_edges() == len(path) - 1
+    assert all(planner.network.has_edge(a, b) or planner.network.has_edge(b, a) for a, b in zip(path, path[1:]))
+
+
+def test_replan_skips_and_reinserts_faces():
+    planner = planned(quad_grid(doubly_curved, 8))
+    planner.calculate_fabrication_parameters(2, 1, 1.0)
+    thickness = planner.network.node_attribute(10, 'thickness')
+    skipped = [9, 10, 17]
+
+    planner.set_face_skip(skipped)
+    _, interruptions = planner.replan()
+    assert_connected_path(planner, [key for key in range(64) if key not in skipped])
+    assert interruptions == planner.count_interruptions()
+    assert all(planner.network.node_attribute(key, 'skip') for key in skipped)
+
+    planner.set_face_skip(skipped, skip=False)
+    planner.replan()
+    assert_connected_path(planner, range(64))
+    assert planner.network.node_attribute(10, 'thickness') == thickness
+    assert not planner.dirty_faces and not planner.skip_edits
+
+
+def test_replan_reads_edited_vertices():
+    mesh = quad_grid(doubly_curved, 8)
+    planner = planned(mesh)
+    planner.calculate_fabrication_parameters(2, 1, 1.0)
+    path = list(planner.network.path)
+
+    planner.set_vertex_coordinates(0, [0.0, 0.0, 1.0])
+    paint(mesh, (0, 0, 255), mesh.face_vertices(63))
+    planner.mark_dirty(mesh.vertex_faces(mesh.face_vertices(63)[0]))
+    planner.replan()
+
+    assert planner.network.path == path
+    assert planner.network.node_coordinates(0) == mesh.face_center(0)
+    assert planner.network.node_attribute(63, 'color').rgb255 == mesh.face_color(63).rgb255
+
+
+def painted(mesh):
+    """A planner whose thicknesses come from a face field, blue and 0.020 everywhere."""
+    from compas.colors import Color
+    planner = planned(mesh)
+    planner.set_color_map([Color.red(), Color.blue()])
+    planner.paint_scalar_field([1.0] * mesh.number_of_faces(), on='face', vmin=0.0)
+    planner.calculate_fabrication_parameters(1, 1, 1.0)
+    return planner
+
+
+def test_recolored_faces_lose_their_field_thickness():
+    pytest.importorskip('numpy')
+    mesh = quad_grid(doubly_curved, 8)
+    planner = painted(mesh)
+    assert set(planner.network.node_attribute(key, 'thickness') for key in range(64)) == set([0.020])
+
+    vertex = mesh.face_vertices(27)[0]
+    faces = mesh.vertex_faces(vertex)
+    planner.set_vertex_color(vertex, (255, 0, 0))
+    planner.replan()
+    lookup = planner.thickness_lookup()
+    for key in range(64):
+        thickness = planner.network.node_attribute(key, 'thickness')
+        if key in faces:
+            assert key not in planner.field_indices
+            assert thickness == planner.thickness_map[lookup[tuple(planner.node_color(key))]]
+            assert thickness != 0.020
+        else:
+            assert thickness == 0.020
+
+
+def test_new_thickness_map_drops_field_indices():
+    pytest.importorskip('numpy')
+    planner = painted(quad_grid(doubly_curved, 8))
+    planner.set_thickness_map([0.008, 0.010, 0.012, 0.014])
+    assert planner.field_indices is None
+    assert planner.dirty_faces == set(range(64))
+    planner.replan()
+    assert all(planner.network.node_attribute(key, 'thickness') in (0.008, 0.010, 0.012, 0.014) for key in range(64))
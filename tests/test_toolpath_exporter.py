@@ -0,0 +1,87 @@
+import json
+import math
+
+import pytest
+
+from robotic_knitcrete.toolpath_exporter import BINARY_HEADER, BINARY_RECORD, read_binary, toolpath_targets
+
+from grids import doubly_curved, planned, quad_grid
+
+NUM_LAYERS = 3
+
+
+@pytest.fixture(scope='module')
+def planner():
+    return planned(quad_grid(doubly_curved, 7, 5))
+
+
+@pytest.fixture(scope='module')
+def toolpath(planner):
+    return planner.calculate_layers(NUM_LAYERS, 1.0)
+
+
+def read_lines(filepath):
+    with open(filepath) as f:
+        return f.read().splitlines()
+
+
+def test_binary_round_trip(tmp_path, planner, toolpath):
+    filepath = str(tmp_path / 'path.bin')
+    # Chunks that do not divide the number of targets
+    count = planner.export_toolpath(filepath, toolpath, chunk_size=7)
+    targets = list(toolpath_targets(toolpath))
+    assert count == len(targets) == NUM_LAYERS * len(planner.network.path)
+    assert (tmp_path / 'path.bin').stat().st_size == BINARY_HEADER.size + count * BINARY_RECORD.size
+    assert list(read_binary(filepath, chunk_size=5)) == targets
+    assert all(abs(math.sqrt(t.qw ** 2 + t.qx ** 2 + t.qy ** 2 + t.qz ** 2) - 1.0) < 1e-9 for t in targets)
+
+
+def test_binary_rejects_other_files(tmp_path):
+    filepath = tmp_path / 'path.bin'
+    filepath.write_bytes(b'NOPE\x01\x00')
+    with pytest.raises(ValueError):
+        list(read_binary(str(filepath)))
+
+
+def test_text_formats_have_one_line_per_target(tmp_path, planner, toolpath):
+    n = NUM_LAYERS * len(planner.network.path)
+
+    assert planner.export_toolpath(str(tmp_path / 'path.csv'), toolpath, chunk_size=7) == n
+    lines = read_lines(str(tmp_path / 'path.csv'))
+    assert lines[0].split(',')[:3] == ['layer', 'index', 'node']
+    assert len(lines) == n + 1
+
+    assert planner.export_toolpath(str(tmp_path / 'path.jsonl'), toolpath, chunk_size=7) == n
+    records = [json.loads(line) for line in read_lines(str(tmp_path / 'path.jsonl'))]
+    assert len(records) == n
+    assert [record['node'] for record in records] == planner.network.path * NUM_LAYERS
+    assert [record['layer'] for record in records] == sorted(list(range(NUM_LAYERS)) * len(planner.network.path))
+
+    assert planner.export_toolpath(str(tmp_path / 'path.mod'), toolpath, procedure_size=40) == n
+    lines = read_lines(str(tmp_path / 'path.mod'))
+    assert sum(line.strip().startswith('MoveL') for line in lines) == n
+    procedures = int(math.ceil(n / 40.0))
+    assert sum(line.strip().startswith('PROC path_') for line in lines) == procedures
+    assert lines[0] == 'MODULE KnitcretePath' and lines[-1] == 'ENDMODULE'
+
+    assert planner.export_toolpath(str(tmp_path / 'path.src'), toolpath) == n
+    lines = read_lines(str(tmp_path / 'path.src'))
+    assert sum(line.startswith('LIN ') for line in lines) == n
+    assert sum(line.startswith('$VEL.CP') for line in lines) == n
+    assert lines[0] == 'DEF knitcrete_path()' and lines[-1] == 'END'
+
+
+def test_network_targets_of_the_last_layer(tmp_path):
+    planner = planned(quad_grid(doubly_curved, 6))
+    planner.calculate_fabrication_parameters(NUM_LAYERS, 2, 1.0)
+    assert planner.export_toolpath(str(tmp_path / 'layer.bin')) == len(planner.network.path)
+    targets = list(read_binary(str(tmp_path / 'layer.bin')))
+    assert [target.node for target in targets] == planner.network.path
+    assert set(target.layer for target in targets) == set([2])
+    assert planner.export_toolpath(str(tmp_path / 'layer.jsonl')) == len(planner.network.path)
+    assert len(read_lines(str(tmp_path / 'layer.jsonl'))) == len(planner.network.path)
+
+
+def test_unknown_format(tmp_path, planner, toolpath):
+    with pytest.raises(ValueError):
+        planner.export_toolpath(str(tmp_path / 'path.txt'), toolpath)
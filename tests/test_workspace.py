@@ -0,0 +1,105 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from robotic_knitcrete import Workspace  # noqa: E402
+
+from grids import cylindrical, doubly_curved, planned, quad_grid  # noqa: E402
+
+DOWN = [0.0, 0.0, -1.0]
+
+
+def tilted(degrees):
+    return [math.sin(math.radians(degrees)), 0.0, -math.cos(math.radians(degrees))]
+
+
+def test_box_envelopes_include_their_faces():
+    workspace = Workspace().add_box([0.0, 0.0, 0.0], [1.0, 2.0, 1.0])
+    points = [[0.5, 1.0, 0.5], [1.0, 2.0, 0.0], [1.1, 1.0, 0.5], [0.5, -0.1, 0.5]]
+    assert workspace.inside(points).tolist() == [True, True, False, False]
+    workspace.add_box([1.0, 1.0, 0.0], [2.0, 2.0, 1.0])
+    assert workspace.inside(points).tolist() == [True, True, True, False]
+    assert Workspace().inside(np.zeros((2, 3, 3))).shape == (2, 3)
+
+
+def test_hollow_cylinder_envelope():
+    # The axis does not need to be a unit vector
+    workspace = Workspace().add_cylinder([1.0, 0.0, 0.0], [0.0, 0.0, 3.0], 2.0, 1.0, min_radius=0.5)
+    points = [
+        [2.5, 0.0, 0.5],   # inside
+        [1.0, 1.9, 1.0],   # on the top disc
+        [1.2, 0.0, 0.5],   # in the hollow core
+        [3.5, 0.0, 0.5],   # beyond the radius
+        [2.5, 0.0, 1.5],   # above
+        [2.5, 0.0, -0.5],  # below
+    ]
+    assert workspace.inside(points).tolist() == [True, True, False, False, False, False]
+    solid = Workspace().add_cylinder([1.0, 0.0, 0.0], [0.0, 0.0, 1.0], 2.0, 1.0)
+    assert solid.inside(points).tolist() == [True, True, True, False, False, False]
+
+
+def test_tilt_and_distance_are_flagged_separately():
+    workspace = Workspace(max_tilt=30, min_distance=0.05).add_box([-1.0] * 3, [1.0] * 3)
+    origins = [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 2.0], [0.0, 0.0, 0.0]]
+    zaxes = [DOWN, tilted(40), tilted(20), [0.0, 0.0, -2.0]]
+    violations = workspace.check(origins, zaxes, [0.1, 0.1, 0.1, 0.01])
+    assert violations['envelope'].tolist() == [False, False, True, False]
+    assert violations['tilt'].tolist() == [False, True, False, False]
+    assert violations['distance'].tolist() == [False, False, False, True]
+    assert workspace.violations(origins, zaxes, [0.1, 0.1, 0.1, 0.01]).tolist() == [False, True, True, True]
+
+    # Without distances, or without limits, nothing but the envelope is checked
+    assert not workspace.check(origins, zaxes)['distance'].any()
+    unlimited = Workspace().check(origins, zaxes, [0.1, 0.1, 0.1, 0.01])
+    assert not (unlimited['envelope'] | unlimited['tilt'] | unlimited['distance']).any()
+
+
+def test_one_zaxis_is_broadcast_to_all_layers():
+    workspace = Workspace(max_tilt=10, down=[0.0, 0.0, -2.0])
+    mask = workspace.violations(np.zeros((3, 4, 3)), tilted(15))
+    assert mask.shape == (3, 4) and mask.all()
+    assert not Workspace(max_tilt=20).violations(np.zeros((3, 4, 3)), tilted(15)).any()
+
+
+@pytest.mark.parametrize('surface', [cylindrical, doubly_curved], ids=['cylindrical', 'doubly_curved'])
+def test_check_toolpath(surface):
+    planner = planned(quad_grid(surface, 8, 6))
+    planner.set_batch_frames()
+    toolpath = planner.calculate_layers(4, 1.0)
+    # A box around the whole surface only leaves the tilt limit to violate
+    workspace = Workspace(max_tilt=30).add_box([-10.0, -10.0, -10.0], [10.0, 10.0, 10.0])
+    mask = planner.check_workspace(workspace, toolpath)
+    assert mask.shape == (4, len(toolpath))
+    zaxes = [toolpath.zaxes[3 * i:3 * i + 3] for i in range(len(toolpath))]
+    tilt = [math.degrees(math.acos(max(-1.0, min(1.0, -z[2])))) > 30 for z in zaxes]
+    if surface is doubly_curved:
+        assert any(tilt) and not all(tilt)
+    assert mask.tolist() == [tilt] * 4
+    assert not Workspace().check_toolpath(toolpath).any()
+    assert planner.check_workspace(workspace, toolpath, [3, 1]).tolist() == [tilt] * 2
+
+    # Every layer moves the nozzle a quarter thickness further from the surface,
+    # so a limit between the second and third layer of a node splits its layers
+    i = len(toolpath) // 2
+    min_distance = toolpath.distances[i] + 1.5 / 4 * toolpath.thicknesses[i]
+    mask = Workspace(min_distance=min_distance).check_toolpath(toolpath)
+    assert mask[:, i].tolist() == [True, True, False, False]
+    assert mask[0].sum() >= mask[1].sum() >= mask[2].sum() >= mask[3].sum()
+
+
+@pytest.mark.parametrize('batch_frames', [False, True], ids=['node_frames', 'batch_frames'])
+def test_check_workspace_of_the_calculated_layer(batch_frames):
+    planner = planned(quad_grid(doubly_curved, 8, 6))
+    planner.set_batch_frames(batch_frames)
+    workspace = Workspace(max_tilt=40, min_distance=0.0).add_box([-5.0, -5.0, -5.0], [0.5, 5.0, 5.0])
+    with pytest.raises(ValueError):
+        planner.check_workspace(workspace)
+    toolpath = planner.calculate_layers(3, 1.5)
+    for n_layer in range(3):
+        planner.calculate_fabrication_parameters(3, n_layer, 1.5)
+        mask = planner.check_workspace(workspace)
+        assert mask.shape == (len(planner.network.path), )
+        assert mask.tolist() == workspace.check_toolpath(toolpath, [n_layer])[0].tolist()
+    assert mask.any() and not mask.all()